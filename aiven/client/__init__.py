@@ -3,4 +3,5 @@
 # This file is under the Apache License, Version 2.0.
 # See the file `LICENSE` for details.
 
+from . import timing  # noqa, imported first to time the remaining imports
 from .client import AivenClient  # noqa
@@ -4,24 +4,33 @@
 # See the file `LICENSE` for details.
 
 from __future__ import print_function
-from aiven.client import envdefault, pretty
+from aiven.client import envdefault, fileutil, filterexpr, pretty, timing
 import aiven.client.client
 import argparse
 import errno
 import json as jsonlib
 import logging
-import os
 import requests.exceptions
 import sys
+import time
 
 ARG_LIST_PROP = "_arg_list"
 LOG_FORMAT = "%(levelname)s\t%(message)s"
+LOG_LEVELS = ["debug", "info", "warning", "error"]
 
 
 class UserError(Exception):
     """User error"""
 
 
+def command_words(func_name):
+    """Return the command line words of a command method name, e.g. ["service", "list"]"""
+    cat_name, _, cmd = func_name.partition("_")
+    if not cmd:
+        return [cat_name]
+    return [cat_name, cmd.replace("_", "-")]
+
+
 def arg(*args, **kwargs):
     def wrap(func):
         arg_list = getattr(func, ARG_LIST_PROP, None)
@@ -37,17 +46,32 @@ def arg(*args, **kwargs):
 
 
 class Config(dict):
+    """Configuration file contents
+
+    save() re-reads the file under a lock and applies only the keys set or
+    deleted since it was loaded, so concurrent invocations changing
+    different keys, or the same key, do not lose each other's updates."""
+    _DELETED = object()
+
     def __init__(self, file_path):
         dict.__init__(self)
         self.file_path = file_path
+        self._changes = {}
         self.load()
 
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._changes[key] = value
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._changes[key] = self._DELETED
+
     def load(self):
         self.clear()
         try:
-            with open(self.file_path) as fp:
-                self.update(jsonlib.load(fp))
-        except IOError as ex:
+            dict.update(self, fileutil.read_json(self.file_path))
+        except (IOError, OSError) as ex:
             if ex.errno == errno.ENOENT:
                 return
 
@@ -57,14 +81,15 @@ class Config(dict):
             raise UserError("Invalid JSON in configuration file {!r}".format(self.file_path))
 
     def save(self):
-        config_dir = os.path.dirname(self.file_path)
-        if not os.path.isdir(config_dir):
-            os.makedirs(config_dir)
-            os.chmod(config_dir, 0o700)
-
-        with open(self.file_path, "w") as fp:
-            os.chmod(fp.name, 0o600)
-            jsonlib.dump(self, fp, sort_keys=True, indent=4)
+        with fileutil.locked(self.file_path):
+            changes, self._changes = self._changes, {}
+            self.load()
+            for key, value in changes.items():
+                if value is self._DELETED:
+                    self.pop(key, None)
+                else:
+                    dict.__setitem__(self, key, value)
+            fileutil.write_atomic(self.file_path, jsonlib.dumps(self, sort_keys=True, indent=4))
 
 
 class CommandLineTool(object):
@@ -76,9 +101,15 @@ class CommandLineTool(object):
         self.parser = argparse.ArgumentParser(prog=name)
         self.parser.add_argument("--config", help="config file location %(default)r",
                                  default=envdefault.AIVEN_CLIENT_CONFIG)
+        self.parser.add_argument("--log-format", choices=["text", "json"], default=envdefault.AIVEN_LOG_FORMAT,
+                                 help="Log format [AIVEN_LOG_FORMAT], json also logs phase timings of the "
+                                 "invocation, default %(default)r")
+        self.parser.add_argument("--log-level", choices=LOG_LEVELS, default=envdefault.AIVEN_LOG_LEVEL,
+                                 help="Log level [AIVEN_LOG_LEVEL], default %(default)r")
         self.subparsers = self.parser.add_subparsers(title="command categories", dest="command",
                                                      help="", metavar="")
         self.args = None
+        self.timer = timing.PhaseTimer()
 
     def add_cmd(self, func):
         """Add a parser for a single command method call"""
@@ -117,8 +148,13 @@ class CommandLineTool(object):
             if getattr(func, ARG_LIST_PROP, None) is not None:
                 add_func(func)
 
+    def add_plugin_commands(self, argv):
+        """Override in sub-class"""
+        pass
+
     def parse_args(self, args=None):
         self.extend_commands(self)
+        self.add_plugin_commands(sys.argv[1:] if args is None else args)
         args = self.parser.parse_args(args=args)
         for ext in self._extensions:
             ext.args = args
@@ -130,9 +166,59 @@ class CommandLineTool(object):
     def expected_errors(self):
         return []
 
+    def invocation_stats(self):
+        """Override in sub-class to add fields to the invocation log record"""
+        return {}
+
+    def configure_logging(self):
+        root = logging.getLogger()
+        root.setLevel(getattr(logging, self.args.log_level.upper()))
+        if self.args.log_format == "json":
+            for handler in root.handlers:
+                handler.setFormatter(timing.JsonFormatter())
+
+    def log_invocation(self, status):
+        """Log a record of the command, its phase timings and exit status in json log format"""
+        if self.args.log_format != "json":
+            return
+        func = getattr(self.args, "func", None)
+        record = {
+            "event": "invocation",
+            "command": " ".join(command_words(func.__name__)) if func else None,
+            "project": getattr(self.args, "project", None),
+            "exit_status": int(status or 0),
+            "requests": 0,
+            "api_request_time": 0.0,
+        }
+        phases = {name: self.timer.get(name) for name in ["import", "parse", "config", "auth", "api"]}
+        stats = self.invocation_stats()
+        # "api" is the wall clock time requests were in flight; "api_request_time" sums the durations of
+        # concurrent requests and can exceed it
+        phases["api"] += stats.pop("api", 0.0)
+        phases["render"] = max(0.0, self.timer.get("command") - phases["auth"] - phases["api"])
+        record.update(stats)
+        record["api_request_time"] = round(record["api_request_time"], 6)
+        record["phases"] = {name: round(seconds, 6) for name, seconds in phases.items()}
+        # main() records the import phase, measured from when the package started loading
+        started = timing.IMPORT_STARTED if self.timer.get("import") else self.timer.started
+        record["duration"] = round(self.timer.clock() - started, 6)
+        log = logging.getLogger("avn.invocation")
+        log.setLevel(logging.INFO)  # emitted regardless of --log-level
+        log.info("%s exited with status %s", record["command"], record["exit_status"], extra={"fields": record})
+
     def print_response(self, result, json=True, format=None,   # pylint: disable=redefined-builtin
-                       drop_fields=None, table_layout=None, single_item=False):
+                       drop_fields=None, table_layout=None, single_item=False, fields=None):
         """print request response in chosen format"""
+        if fields is not None and format is None:
+            # project before flattening so that unselected fields are never formatted
+            if single_item:
+                result = filterexpr.project(result, fields)
+            else:
+                result = [filterexpr.project(item, fields) for item in result]
+            horizontal = [f for f in fields if not f.endswith("*")]
+            vertical = [f for f in fields if f.endswith("*")]
+            table_layout = [horizontal] + vertical if horizontal else None
+
         if format is not None:
             for item in result:
                 print(format.format(**item))
@@ -145,22 +231,31 @@ class CommandLineTool(object):
             pretty.print_table(result, drop_fields=drop_fields, table_layout=table_layout)
 
     def run(self, args=None):
-        self.parse_args(args=args)
-        self.config = Config(self.args.config)
-        expected_errors = [requests.exceptions.ConnectionError, UserError, aiven.client.client.Error]
-        for ext in self._extensions:  # note: _extensions includes self
-            expected_errors.extend(ext.expected_errors())
-            ext.config = self.config
+        with self.timer.phase("parse"):
+            self.parse_args(args=args)
+        self.configure_logging()
+        status = 1
         try:
-            return self.run_actual()
-        except tuple(expected_errors) as ex:  # pylint: disable=catching-non-exception
-            # nicer output on "expected" errors
-            err = "command failed: {0.__class__.__name__}: {0}".format(ex)
-            self.log.error(err)
-            return 1
-        except KeyboardInterrupt:
-            self.log.error("*** terminated by keyboard ***")
-            return 2
+            with self.timer.phase("config"):
+                self.config = Config(self.args.config)
+            expected_errors = [requests.exceptions.ConnectionError, UserError, aiven.client.client.Error]
+            for ext in self._extensions:  # note: _extensions includes self
+                expected_errors.extend(ext.expected_errors())
+                ext.config = self.config
+            try:
+                with self.timer.phase("command"):
+                    status = self.run_actual()
+            except tuple(expected_errors) as ex:  # pylint: disable=catching-non-exception
+                # nicer output on "expected" errors
+                err = "command failed: {0.__class__.__name__}: {0}".format(ex)
+                self.log.error(err)
+                status = 1
+            except KeyboardInterrupt:
+                self.log.error("*** terminated by keyboard ***")
+                status = 2
+        finally:
+            self.log_invocation(status)
+        return status
 
     def run_actual(self):
         func = getattr(self.args, "func", None)
@@ -172,7 +267,7 @@ class CommandLineTool(object):
         return func()
 
     def main(self):
-        # TODO: configurable log level
+        self.timer.add("import", time.time() - timing.IMPORT_STARTED)
         logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
         logging.getLogger("requests").setLevel(logging.WARNING)
         sys.exit(self.run())
@@ -0,0 +1,163 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Record HTTP exchanges to a cassette file and replay them offline
+
+A cassette is a gzip compressed file of JSON lines, one per request, with
+the request method, path and parameters, the response status, headers and
+body and the time the request took.  Credentials are redacted both from
+requests and responses.  Every record is written as its own gzip member so
+that the file stays readable even if the process is interrupted.
+"""
+
+from .compression import compress
+import base64
+import gzip
+import json
+import re
+import requests
+import requests.adapters
+import requests.structures
+import threading
+import time
+
+try:
+    from urllib.parse import urlsplit, parse_qsl  # pylint: disable=no-name-in-module,import-error
+except ImportError:
+    # python 2.x
+    from urlparse import urlsplit, parse_qsl  # pylint: disable=import-error
+
+try:
+    string_types = basestring  # pylint: disable=undefined-variable
+except NameError:
+    # python 3.x
+    string_types = str
+
+REDACTED = "REDACTED"
+_SECRET_KEY_RE = re.compile(r"password|passwd|token|secret|authorization|cvc|card\[number\]|stripe|private|"
+                            r"access_cert|(?:^|_)key$", re.IGNORECASE)
+_URI_CREDENTIALS_RE = re.compile(r"(://[^:/@\s]+:)[^@/\s]+@")
+_PRIVATE_KEY_RE = re.compile(r"-----BEGIN ([A-Z ]*)PRIVATE KEY-----.*?-----END \1PRIVATE KEY-----", re.DOTALL)
+_SKIPPED_HEADERS = {"authorization", "set-cookie", "content-encoding", "content-length", "transfer-encoding"}
+
+
+def redact(value):
+    """Return a copy of a decoded JSON value with credentials replaced"""
+    if isinstance(value, dict):
+        return {key: REDACTED if _SECRET_KEY_RE.search(key) and value[key] else redact(value[key])
+                for key in value}
+    elif isinstance(value, list):
+        return [redact(item) for item in value]
+    elif isinstance(value, string_types):
+        value = _PRIVATE_KEY_RE.sub(REDACTED, value)
+        return _URI_CREDENTIALS_RE.sub(r"\1" + REDACTED + "@", value)
+    return value
+
+
+def _encode_body(content, content_type):
+    if not content:
+        return {}
+    if content_type and content_type.startswith("application/json"):
+        try:
+            return {"json": redact(json.loads(content.decode("utf-8")))}
+        except ValueError:
+            pass
+    try:
+        return {"text": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(entry):
+    if "json" in entry:
+        return json.dumps(entry["json"]).encode("utf-8")
+    elif "text" in entry:
+        return entry["text"].encode("utf-8")
+    elif "base64" in entry:
+        return base64.b64decode(entry["base64"])
+    return b""
+
+
+def _request_key(method, path, params):
+    return method, path, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+
+class CassetteRecorder(object):
+    """Append request/response records to a cassette file"""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        with open(self.path, "wb"):
+            pass  # start a new cassette
+
+    def record(self, method, url, params, body, response, elapsed):
+        entry = {
+            "method": method,
+            "path": urlsplit(url).path,
+            "params": params or {},
+            "elapsed": round(elapsed, 6),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {k.lower(): v for k, v in response.headers.items() if k.lower() not in _SKIPPED_HEADERS},
+            "response": _encode_body(response.content, response.headers.get("content-type")),
+        }
+        if isinstance(body, dict):
+            entry["request"] = {"json": redact(body)}
+        line = (json.dumps(entry, separators=(",", ":"), sort_keys=True) + "\n").encode("utf-8")
+        with self.lock:
+            with open(self.path, "ab") as fp:
+                fp.write(compress(line, "gzip"))
+
+
+def load(path):
+    """Return the list of records in a cassette file"""
+    with gzip.open(path, "rb") as fp:
+        return [json.loads(line.decode("utf-8")) for line in fp if line.strip()]
+
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    """requests transport adapter serving responses from a cassette
+
+    Responses to identical requests are served in recorded order, wrapping
+    around once exhausted.  Each response is delayed by its recorded
+    duration divided by `speed`; a speed of 0 disables delays."""
+    def __init__(self, path, speed=1.0, sleep=time.sleep):
+        requests.adapters.BaseAdapter.__init__(self)
+        self.speed = speed
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.exchanges = {}
+        self.positions = {}
+        for entry in load(path):
+            key = _request_key(entry["method"], entry["path"], entry["params"])
+            self.exchanges.setdefault(key, []).append(entry)
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ,unused-argument
+        url = urlsplit(request.url)
+        key = _request_key(request.method, url.path, dict(parse_qsl(url.query)))
+        with self.lock:
+            entries = self.exchanges.get(key)
+            if not entries:
+                raise requests.exceptions.ConnectionError(
+                    "No recorded response for {} {} in cassette".format(request.method, request.url), request=request)
+            position = self.positions.get(key, 0)
+            self.positions[key] = (position + 1) % len(entries)
+        entry = entries[position]
+        if self.speed:
+            self.sleep(entry["elapsed"] / self.speed)
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.headers = requests.structures.CaseInsensitiveDict(entry["headers"])
+        response._content = _decode_body(entry["response"])  # pylint: disable=protected-access
+        response._content_consumed = True  # pylint: disable=protected-access
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
@@ -4,25 +4,19 @@
 # See the file `LICENSE` for details.
 
 from __future__ import print_function
-from . import argx, client
+from . import argx, client, completion, compression, filecache, fileutil, parallel, plugins, progress, querystats
 from aiven.client import envdefault
 from aiven.client.cliarg import arg
 import errno
 import getpass
 import json as jsonlib
 import os
+import re
 import requests
 import time
 
 
-PLUGINS = []
-
-
-try:
-    from aiven.admin import plugin as adminplugin  # pylint: disable=import-error,no-name-in-module
-    PLUGINS.append(adminplugin)
-except ImportError:
-    pass
+SERVICE_TYPES_CACHE_TTL = 3600
 
 try:
     raw_input_func = raw_input  # pylint: disable=undefined-variable
@@ -31,6 +25,10 @@ except NameError:
     raw_input_func = input
 
 
+class UserConfigSchemaError(argx.UserError):
+    """User configuration not accepted by the service type schema, which may be out of date"""
+
+
 def convert_str_to_value(schema, str_value):
     if "string" in schema["type"]:
         return str_value
@@ -60,9 +58,10 @@ class AivenCLI(argx.CommandLineTool):
     def __init__(self):
         argx.CommandLineTool.__init__(self, "avn")
         self.client = None
-        for plugin in PLUGINS:
-            plugincli = plugin.ClientPlugin()
-            self.extend_commands(plugincli)
+        self.plugins = plugins.PluginRegistry()
+
+    def add_plugin_commands(self, argv):
+        self.plugins.extend(self, argv)
 
     def add_args(self, parser):
         parser.add_argument("--auth-ca", help="CA certificate to use [AIVEN_CA_CERT], default %(default)r",
@@ -70,8 +69,33 @@ class AivenCLI(argx.CommandLineTool):
         parser.add_argument("--auth-token",
                             help="Client auth token to use [AIVEN_AUTH_TOKEN], [AIVEN_CREDENTIALS_FILE]",
                             default=envdefault.AIVEN_AUTH_TOKEN)
+        parser.add_argument("--compress", choices=compression.available_methods(),
+                            help="Compress request bodies larger than {} bytes".format(compression.DEFAULT_THRESHOLD))
+        parser.add_argument("--connect-timeout", type=float, metavar="SECONDS",
+                            help="HTTP connect timeout [AIVEN_CONNECT_TIMEOUT], default %(default)r",
+                            default=envdefault.AIVEN_CONNECT_TIMEOUT)
+        parser.add_argument("--http-pool-size", type=int, metavar="N",
+                            help="Maximum number of pooled HTTP connections [AIVEN_HTTP_POOL_SIZE], default %(default)r",
+                            default=envdefault.AIVEN_HTTP_POOL_SIZE)
+        parser.add_argument("--no-keep-alive", action="store_true", default=False,
+                            help="Close HTTP connections after every request")
+        parser.add_argument("--progress", choices=progress.MODES, default=envdefault.AIVEN_PROGRESS,
+                            help="Progress of long running operations on stderr: a status line on a terminal, "
+                            "otherwise periodic JSON lines [AIVEN_PROGRESS], default %(default)r")
+        parser.add_argument("--rate-limit", type=float, metavar="N",
+                            help="Send at most N API requests per second (default: adapt to API throttling)")
+        parser.add_argument("--read-timeout", type=float, metavar="SECONDS",
+                            help="HTTP read timeout [AIVEN_READ_TIMEOUT], default %(default)r",
+                            default=envdefault.AIVEN_READ_TIMEOUT)
+        parser.add_argument("--record", metavar="FILE",
+                            help="Record HTTP requests and responses into a cassette file")
+        parser.add_argument("--replay", metavar="FILE",
+                            help="Serve HTTP responses from a recorded cassette file instead of the API")
+        parser.add_argument("--replay-speed", type=float, default=1.0, metavar="FACTOR",
+                            help="Replay speed relative to the recorded timing, 0 for no delays (default: %(default)s)")
         parser.add_argument("--show-http", help="Show HTTP requests and responses", action="store_true")
-        parser.add_argument("--url", help="Server base url default %(default)r",
+        parser.add_argument("--url", help="Server base url, or a comma separated list of equivalent endpoints to "
+                            "pick the fastest one from [AIVEN_WEB_URL], default %(default)r",
                             default=envdefault.AIVEN_WEB_URL or "https://api.aiven.io")
 
     def enter_password(self, prompt, var="AIVEN_PASSWORD", confirm=False):
@@ -94,6 +118,16 @@ class AivenCLI(argx.CommandLineTool):
             return self.args.project
         return self.config.get("default_project")
 
+    def start_progress(self, operation, items=None, total_bytes=None):
+        """Return a progress.Progress reporter for a long running operation"""
+        return progress.Progress(operation, items=items, total_bytes=total_bytes, mode=self.args.progress)
+
+    def filter_results(self, items):
+        """Apply the compiled --filter expression to a list of result dicts"""
+        if not self.args.filter:
+            return items
+        return [item for item in items if self.args.filter(item)]
+
     @arg.email
     def user_login(self):
         """Login as a user"""
@@ -111,17 +145,26 @@ class AivenCLI(argx.CommandLineTool):
     @arg("filename", help="Name of the file to download", nargs="+")
     def data_download(self):
         """Download a data file from a project"""
-        for filename in self.args.filename:
-            result = self.client.download_data(project=self.get_project(), filename=filename)
-            print(result)
+        with self.start_progress("download", items=len(self.args.filename)) as status:
+            for filename in self.args.filename:
+                result = self.client.download_data(project=self.get_project(), filename=filename,
+                                                   progress=status.advance)
+                status.done()
+                status.clear_line()
+                print(result)
 
     @arg.project
     @arg("filename", help="Name of the file to upload", nargs="+")
     def data_upload(self):
         """Upload a data file to a project"""
-        for filename in self.args.filename:
-            result = self.client.upload_data(project=self.get_project(), filename=filename)
-            print(result)
+        total_bytes = sum(os.path.getsize(filename) for filename in self.args.filename if os.path.isfile(filename))
+        with self.start_progress("upload", items=len(self.args.filename), total_bytes=total_bytes) as status:
+            for filename in self.args.filename:
+                result = self.client.upload_data(project=self.get_project(), filename=filename,
+                                                 progress=status.advance)
+                status.done()
+                status.clear_line()
+                print(result)
 
     @arg.project
     @arg("filename", help="Name of the file to delete", nargs="+")
@@ -131,23 +174,178 @@ class AivenCLI(argx.CommandLineTool):
             result = self.client.delete_data(project=self.get_project(), filename=filename)
             print(result)
 
+    @arg.project
+    @arg("local_dir", help="Local directory to synchronize")
+    @arg("--download", action="store_true", default=False,
+         help="Download project data files into the local directory (default: upload local files)")
+    @arg("--delete", action="store_true", default=False, help="Delete files that do not exist on the source side")
+    @arg("--dry-run", action="store_true", default=False, help="Only show what would be transferred")
+    @arg.workers
+    def data_sync(self):
+        """Synchronize project data files with a local directory"""
+        from . import datasync
+        project = self.get_project()
+        local_dir = self.args.local_dir
+        if not os.path.isdir(local_dir):
+            raise argx.UserError("Local directory {!r} does not exist".format(local_dir))
+
+        manifest = datasync.SyncManifest(project, local_dir)
+        local = datasync.scan_local(local_dir, manifest)
+        remote = datasync.remote_files(self.client.list_data(project=project))
+        if self.args.download:
+            transfer, removed = datasync.plan_download(local, remote, manifest, delete=self.args.delete)
+        else:
+            transfer, removed = datasync.plan_upload(local, remote, manifest, delete=self.args.delete)
+
+        action = "download" if self.args.download else "upload"
+        self.log.info("%d files to %s, %d to delete, %d unchanged",
+                      len(transfer), action, len(removed), len(set(local) | set(remote)) - len(transfer) - len(removed))
+        if self.args.dry_run:
+            for name in transfer:
+                print("{} {}".format(action, name))
+            for name in removed:
+                print("delete {}".format(name))
+            return
+
+        sizes = remote if self.args.download else local
+        status = self.start_progress(action, items=len(transfer) + len(removed),
+                                     total_bytes=sum(sizes[name]["size"] or 0 for name in transfer))
+
+        def sync_file(name):
+            path = os.path.join(local_dir, name)
+            if self.args.download:
+                content = self.client.download_data(project=project, filename=name, progress=status.advance)
+                fileutil.write_atomic(path, content, mode=0o644)
+                st = os.stat(path)
+                manifest.local[name] = {"size": st.st_size, "mtime": st.st_mtime, "md5": datasync.file_md5(path)}
+                return {"size": st.st_size, "md5": manifest.local[name]["md5"]}
+            self.client.upload_data(project=project, filename=path, progress=status.advance)
+            return {"size": local[name]["size"], "md5": local[name]["md5"]}
+
+        def remove_file(name):
+            if self.args.download:
+                os.unlink(os.path.join(local_dir, name))
+            else:
+                self.client.delete_data(project=project, filename=name)
+            manifest.remote.pop(name, None)
+
+        failed = 0
+        with status:
+            for name, synced, error in parallel.map_concurrently(sync_file, transfer, self.args.workers, progress=status):
+                if error is not None:
+                    failed += 1
+                    self.log.error("%s: %s failed: %s", name, action, error)
+                else:
+                    manifest.remote[name] = synced
+                    self.log.info("%s: %sed", name, action)
+            for name, _, error in parallel.map_concurrently(remove_file, removed, self.args.workers, progress=status):
+                if error is not None:
+                    failed += 1
+                    self.log.error("%s: delete failed: %s", name, error)
+                else:
+                    self.log.info("%s: deleted", name)
+
+        manifest.local = datasync.scan_local(local_dir, manifest)
+        manifest.save()
+        if failed:
+            raise argx.UserError("{} of {} file operations failed".format(failed, len(transfer) + len(removed)))
+
     @arg.project
     @arg.json
     @arg("-n", "--limit", type=int, default=100, help="Get up to N rows of logs")
+    @arg("--archive", metavar="DIR", help="Append new log entries to an archive in DIR instead of printing them")
+    @arg("--follow", type=float, metavar="SECONDS", help="With --archive, keep archiving new entries every SECONDS")
     def logs(self):
         """View project logs"""
-        msgs = self.client.get_logs(project=self.get_project(), limit=self.args.limit)
+        if self.args.archive:
+            return self._archive_logs()
+        if self.args.follow:
+            raise argx.UserError("--follow requires --archive")
         if self.args.json:
+            msgs = self.client.get_logs(project=self.get_project(), limit=self.args.limit)
             print(jsonlib.dumps(msgs, indent=4, sort_keys=True))
         else:
-            for log_msg in msgs:
+            for log_msg in self.client.iter_logs(project=self.get_project(), limit=self.args.limit):
+                print("{time:<27}  {msg}".format(**log_msg))
+
+    def _archive_logs(self):
+        from . import logarchive
+        project = self.get_project()
+        archive = logarchive.LogArchive(self.args.archive, project)
+        try:
+            while True:
+                try:
+                    msgs = self.client.get_logs(project=project, limit=self.args.limit)
+                except (client.Error, requests.exceptions.ConnectionError) as ex:
+                    if not self.args.follow:
+                        raise
+                    self.log.warning("%s: fetching logs failed, retrying: %s", project, ex)
+                    msgs = []
+                archived_before = archive.last_batch() is not None
+                added = archive.append(msgs)
+                if added and added == len(msgs) and archived_before:
+                    self.log.warning("%s: none of the %d fetched log entries were archived before, entries may "
+                                     "have been missed; increase --limit or archive more often", project, added)
+                self.log.info("%s: archived %d new log entries", project, added)
+                if not self.args.follow:
+                    return
+                time.sleep(self.args.follow)
+        except KeyboardInterrupt:
+            pass
+
+    @arg.project
+    @arg("pattern", nargs="?", help="Show only entries whose message contains PATTERN")
+    @arg("-E", "--regex", action="store_true", default=False, help="PATTERN is a regular expression")
+    @arg("-i", "--ignore-case", action="store_true", default=False, help="Ignore case when matching PATTERN")
+    @arg("--archive", metavar="DIR", required=True, help="Archive directory written by 'avn logs --archive'")
+    @arg("--since", default="1d", help="Start of period as ISO 8601 UTC time or age, e.g. '12h' (default: %(default)s)")
+    @arg("--until", default="now", help="End of period (default: %(default)s)")
+    @arg.json
+    def log_search(self):
+        """Search project logs archived with 'avn logs --archive'"""
+        from . import logarchive, statsarchive
+        try:
+            now = time.time()
+            since = statsarchive.parse_time(self.args.since, now)
+            until = statsarchive.parse_time(self.args.until, now)
+        except ValueError as ex:
+            raise argx.UserError(str(ex))
+
+        match = None
+        text = None
+        pattern = self.args.pattern
+        if pattern is not None:
+            if self.args.regex or self.args.ignore_case:
+                try:
+                    regex = re.compile(pattern if self.args.regex else re.escape(pattern),
+                                       re.IGNORECASE if self.args.ignore_case else 0)
+                except re.error as ex:
+                    raise argx.UserError("Invalid regular expression {!r}: {}".format(pattern, ex))
+                match = regex.search
+            else:
+                text = pattern
+
+                def contains(msg):
+                    return pattern in msg
+                match = contains
+
+        archive = logarchive.LogArchive(self.args.archive, self.get_project())
+        entries = archive.search(since=since, until=until, match=match, text=text)
+        if self.args.json:
+            print(jsonlib.dumps(list(entries), indent=4, sort_keys=True))
+        else:
+            for log_msg in entries:
                 print("{time:<27}  {msg}".format(**log_msg))
 
     @arg.project
+    @arg.filter
+    @arg.fields
     @arg.json
+    @arg.cache_ttl
     def cloud_list(self):
         """List cloud types"""
-        self.print_response(self.client.get_clouds(project=self.get_project()), json=self.args.json)
+        clouds = self.filter_results(self.client.get_clouds(project=self.get_project()))
+        self.print_response(clouds, json=self.args.json, fields=self.args.fields)
 
     def collect_user_config_options(self, obj_def, prefix=""):
         opts = {}
@@ -231,29 +429,65 @@ class AivenCLI(argx.CommandLineTool):
     @arg.project
     @arg("name", nargs="*", default=[], help="Service name")
     @arg.service_type
+    @arg.filter
+    @arg.fields
     @arg("--format", help="Format string for output, e.g. '{service_name} {service_uri}'")
     @arg.verbose
     @arg.json
+    @arg("--watch", type=float, metavar="SECONDS",
+         help="Keep the list on screen, refreshing it every SECONDS and highlighting state changes")
+    @arg.cache_ttl
     def service_list(self):
         """List services"""
-        services = self.client.get_services(project=self.get_project())
-        if self.args.service_type is not None:
-            services = [s for s in services if s["service_type"] == self.args.service_type]
-        if self.args.name:
-            services = [s for s in services if s["service_name"] in self.args.name]
+        if self.args.watch:
+            return self._watch_services()
+        if self.args.format and not self.args.cache_ttl:
+            # formatted output is printed line by line so services can be printed as they are received
+            services = self.client.iter_services(project=self.get_project())
+        else:
+            services = self.client.get_services(project=self.get_project())
+        services = self._select_services(services)
+        if not self.args.format:
+            services = list(services)
 
         layout = self.SERVICE_LAYOUT[:]
         if self.args.verbose:
             layout.extend(self.EXT_SERVICE_LAYOUT)
 
         self.print_response(services, format=self.args.format, json=self.args.json,
-                            table_layout=layout)
+                            table_layout=layout, fields=self.args.fields)
+
+    def _select_services(self, services):
+        """Lazily apply the service type, name and --filter selections of service list"""
+        if self.args.service_type is not None:
+            services = (s for s in services if s["service_type"] == self.args.service_type)
+        if self.args.name:
+            services = (s for s in services if s["service_name"] in self.args.name)
+        if self.args.filter:
+            services = (s for s in services if self.args.filter(s))
+        return services
+
+    def _watch_services(self):
+        from . import watch
+        if self.args.json or self.args.format or self.args.fields or self.args.verbose:
+            raise argx.UserError("--watch cannot be combined with --json, --format, --fields or --verbose")
+        project = self.get_project()
+        table = watch.WatchTable(self.SERVICE_LAYOUT[0], key="service_name", highlight=["state"])
+        try:
+            while True:
+                services = list(self._select_services(self.client.get_services(project=project)))
+                table.update(services, status="Every {}s: avn service list, updated {}".format(
+                    self.args.watch, time.strftime("%H:%M:%S")))
+                time.sleep(self.args.watch)
+        except KeyboardInterrupt:
+            print()
 
     @arg.project
     @arg("name", help="Service name")
     @arg("--format", help="Format string for output, e.g. '{service_name} {service_uri}'")
     @arg.verbose
     @arg.json
+    @arg.cache_ttl
     def service_get(self):
         """Show a single service"""
         service = self.client.get_service(project=self.get_project(), service_name=self.args.name)
@@ -265,6 +499,99 @@ class AivenCLI(argx.CommandLineTool):
         self.print_response(service, format=self.args.format, json=self.args.json,
                             table_layout=layout, single_item=True)
 
+    def _diff_services(self, targets, service_type):
+        """Return {(project, service): service} for targets, or all services of the current project"""
+        from . import inventory
+        if self.args.inventory:
+            if not os.path.exists(inventory.INVENTORY_PATH):
+                raise argx.UserError("No inventory found, run 'avn inventory sync' first")
+            inv = inventory.Inventory()
+            try:
+                projects = sorted(set(target[0] for target in targets)) or [self.get_project()]
+                _, rows = inv.query("SELECT project, raw FROM services WHERE project IN ({})".format(
+                    ", ".join("?" for _ in projects)), projects)
+            finally:
+                inv.close()
+            services = {}
+            for row in rows:
+                service = jsonlib.loads(row["raw"])
+                services[(row["project"], service["service_name"])] = service
+        elif targets:
+            def fetch(target):
+                return self.client.get_service(project=target[0], service_name=target[1])
+
+            services = {}
+            with self.start_progress("fetch services", items=len(targets)) as status:
+                fetched = parallel.map_concurrently(fetch, targets, self.args.workers, progress=status)
+            for target, service, error in fetched:
+                if error is not None:
+                    raise argx.UserError("{}/{}: failed to fetch service: {}".format(target[0], target[1], error))
+                services[target] = service
+        else:
+            project = self.get_project()
+            services = {(project, s["service_name"]): s for s in self.client.get_services(project=project)}
+
+        if targets:
+            missing = [target for target in targets if target not in services]
+            if missing:
+                raise argx.UserError("Service(s) not found: {}".format(
+                    ", ".join("{}/{}".format(*target) for target in missing)))
+            return {target: services[target] for target in targets}
+        return {key: service for key, service in services.items()
+                if service_type is None or service["service_type"] == service_type}
+
+    @arg.project
+    @arg("name", nargs="*", default=[],
+         help="Services as SERVICE or PROJECT/SERVICE (default: all services in project)")
+    @arg.service_type
+    @arg("--reference", help="List settings that differ from this SERVICE or PROJECT/SERVICE")
+    @arg("--outliers", action="store_true", help="List services whose settings differ from most services")
+    @arg("--all", dest="all_keys", action="store_true", help="Include settings that are the same on all services")
+    @arg("--inventory", action="store_true", help="Compare the local inventory snapshot instead of live services")
+    @arg.workers
+    @arg.json
+    def service_diff(self):
+        """Compare plan, cloud and user configuration of services"""
+        from . import configdiff
+        project = self.get_project()
+        targets = []
+        for name in self.args.name:
+            service_project, _, service = name.rpartition("/")
+            targets.append((service_project or project, service))
+        reference = None
+        if self.args.reference:
+            service_project, _, service = self.args.reference.rpartition("/")
+            reference = (service_project or project, service)
+            if targets and reference not in targets:
+                targets.insert(0, reference)
+
+        services = self._diff_services(targets, self.args.service_type)
+        if reference is not None and reference not in services:
+            raise argx.UserError("Reference service {}/{} not found".format(*reference))
+        if len(services) < 2:
+            raise argx.UserError("At least two services are needed for comparison, found {}".format(len(services)))
+
+        # services of a single project are labelled by name only
+        single_project = len(set(key[0] for key in services)) == 1
+
+        def label(key):
+            return key[1] if single_project else "{}/{}".format(*key)
+
+        matrix = configdiff.ConfigMatrix()
+        for key in targets or sorted(services):
+            matrix.add(label(key), configdiff.service_config(services[key]))
+
+        if reference is not None:
+            result = matrix.drift(label(reference))
+            layout = [["key", "service", "value", "reference_value"]]
+        elif self.args.outliers:
+            result = matrix.outliers()
+            layout = [["key", "service", "value", "majority_value", "majority_count"]]
+        else:
+            result = matrix.matrix(sorted(matrix.keys) if self.args.all_keys else None)
+            layout = [["key"] + matrix.services]
+        self.print_response(result, json=self.args.json, table_layout=layout)
+
     @arg.project
     @arg("name", help="Service name")
     @arg("--format", help="Format string for output, e.g. '{service_name} {service_uri}'")
@@ -291,18 +618,176 @@ class AivenCLI(argx.CommandLineTool):
 
     @arg.project
     @arg("name", help="Service name")
+    @arg.filter
+    @arg.fields
     @arg("--format", help="Format string for output, e.g. '{calls} {total_time}'")
     @arg.verbose
     @arg.json
     def service_queries(self):
         """List PostgreSQL service query statistics"""
         queries = self.client.get_pg_service_query_stats(project=self.get_project(), service=self.args.name)
+        queries = self.filter_results(queries)
         layout = [["query", "max_time", "stddev_time", "min_time", "mean_time", "rows", "calls", "total_time"]]
         if self.args.verbose:
             layout.extend(["dbid", "userid", "queryid", "shared_blks_read", "local_blks_read", "local_blks_hit",
                            "local_blks_written", "local_blks_dirtied", "shared_blks_hit",
                            "shared_blks_dirtied", "shared_blks_written",
                            "blk_read_time", "blk_write_time", "temp_blks_read", "temp_blks_written"])
+        self.print_response(queries, format=self.args.format, json=self.args.json, table_layout=layout,
+                            fields=self.args.fields)
+
+    def _fleet_services(self, names, service_type):
+        """Return a list of (project, service) tuples for names given as SERVICE or PROJECT/SERVICE,
+        or all services of `service_type` in the current project if no names were given"""
+        project = self.get_project()
+        if not names:
+            return [(project, s["service_name"]) for s in self.client.get_services(project=project)
+                    if s["service_type"] == service_type]
+
+        targets = []
+        for name in names:
+            service_project, _, service = name.rpartition("/")
+            targets.append((service_project or project, service))
+        return targets
+
+    @arg.project
+    @arg("name", nargs="*", default=[],
+         help="Services as SERVICE or PROJECT/SERVICE (default: all PostgreSQL services in project)")
+    @arg("--order-by", choices=querystats.ORDER_BY, default="total_time", help="Sort order (default: %(default)s)")
+    @arg("-n", "--limit", type=int, default=20, help="Show top N queries (default: %(default)s)")
+    @arg("--format", help="Format string for output, e.g. '{services} {total_time} {query}'")
+    @arg.workers
+    @arg.verbose
+    @arg.json
+    def service_queries_top(self):
+        """List top PostgreSQL queries aggregated across services"""
+        targets = self._fleet_services(self.args.name, service_type="pg")
+        if not targets:
+            raise argx.UserError("No PostgreSQL services found")
+
+        def fetch(target):
+            return self.client.get_pg_service_query_stats(project=target[0], service=target[1])
+
+        aggregate = querystats.QueryStatsAggregate()
+        failed = 0
+        with self.start_progress("fetch query statistics", items=len(targets)) as status:
+            results = parallel.map_concurrently(fetch, targets, self.args.workers, progress=status)
+        for (project, service), stats, error in results:
+            if error is not None:
+                failed += 1
+                self.log.warning("%s/%s: failed to fetch query statistics: %s", project, service, error)
+                continue
+            aggregate.add("{}/{}".format(project, service), stats)
+
+        if failed == len(targets):
+            raise argx.UserError("Failed to fetch query statistics from all {} services".format(failed))
+
+        queries = aggregate.top(self.args.limit, order_by=self.args.order_by)
+        layout = [["query", "services", "calls", "total_time", "mean_time", "max_time", "blocks_read", "rows"]]
+        if self.args.verbose:
+            layout.extend(["shared_blks_hit", "shared_blks_read", "local_blks_read", "temp_blks_read",
+                           "blk_read_time", "blk_write_time"])
+        self.print_response(queries, format=self.args.format, json=self.args.json, table_layout=layout)
+
+    @arg.project
+    @arg("name", nargs="*", default=[],
+         help="Services as SERVICE or PROJECT/SERVICE (default: all PostgreSQL services in project)")
+    @arg("--reset", action="store_true", help="Reset query statistics of the services that were archived")
+    @arg("--archive", metavar="DIR", help="Archive directory (default: 'querystats' in the configuration directory)")
+    @arg.workers
+    @arg.json
+    def service_queries_snapshot(self):
+        """Archive PostgreSQL query statistics of services locally, optionally resetting them"""
+        from . import statsarchive
+        targets = self._fleet_services(self.args.name, service_type="pg")
+        if not targets:
+            raise argx.UserError("No PostgreSQL services found")
+
+        def fetch(target):
+            return self.client.get_pg_service_query_stats(project=target[0], service=target[1])
+
+        archive = statsarchive.QueryStatsArchive(self.args.archive)
+        entries = []
+        result = []
+        with self.start_progress("snapshot query statistics", items=len(targets)) as status:
+            fetched = parallel.map_concurrently(fetch, targets, self.args.workers, progress=status)
+        for (project, service), stats, error in fetched:
+            if error is not None:
+                self.log.warning("%s/%s: failed to fetch query statistics: %s", project, service, error)
+                result.append({"project": project, "service": service, "queries": 0, "status": "failed"})
+                continue
+            entries.append(archive.append(project, service, stats))
+
+        # counters are only reset for services whose snapshot was stored
+        resets = {}
+        if self.args.reset:
+            def reset(entry):
+                return self.client.get_pg_service_query_stats_reset(project=entry["project"], service=entry["service"])
+
+            with self.start_progress("reset query statistics", items=len(entries)) as status:
+                reset_results = parallel.map_concurrently(reset, entries, self.args.workers, progress=status)
+            for entry, _, error in reset_results:
+                if error is not None:
+                    self.log.warning("%s/%s: failed to reset query statistics: %s",
+                                     entry["project"], entry["service"], error)
+                resets[(entry["project"], entry["service"])] = error is None
+
+        for entry in entries:
+            entry["reset"] = resets.get((entry["project"], entry["service"]), False)
+            result.append({"project": entry["project"], "service": entry["service"], "queries": entry["queries"],
+                           "status": "archived, reset" if entry["reset"] else "archived"})
+        archive.commit(entries)
+
+        result.sort(key=lambda item: (item["project"], item["service"]))
+        self.print_response(result, json=self.args.json, table_layout=[["project", "service", "queries", "status"]])
+        if not entries or (self.args.reset and not all(resets.values())):
+            return 1
+
+    @arg.project
+    @arg("name", nargs="*", default=[],
+         help="Services as SERVICE or PROJECT/SERVICE (default: all archived services)")
+    @arg("--since", default="1d", help="Start of period as ISO 8601 UTC time or age, e.g. '12h' (default: %(default)s)")
+    @arg("--until", default="now", help="End of period (default: %(default)s)")
+    @arg("--compare-since", help="Start of a period to compare with, e.g. '2d'")
+    @arg("--compare-until", help="End of the period to compare with (default: start of the period)")
+    @arg("--order-by", choices=querystats.ORDER_BY, default="total_time", help="Sort order (default: %(default)s)")
+    @arg("-n", "--limit", type=int, default=20, help="Show top N queries (default: %(default)s)")
+    @arg("--archive", metavar="DIR", help="Archive directory (default: 'querystats' in the configuration directory)")
+    @arg("--format", help="Format string for output, e.g. '{calls} {total_time} {query}'")
+    @arg.json
+    def service_queries_history(self):
+        """List top PostgreSQL queries of a period from the local query statistics archive"""
+        from . import statsarchive
+        try:
+            now = time.time()
+            start = statsarchive.parse_time(self.args.since, now)
+            end = statsarchive.parse_time(self.args.until, now)
+            compare_start = compare_end = None
+            if self.args.compare_since:
+                compare_start = statsarchive.parse_time(self.args.compare_since, now)
+                compare_end = statsarchive.parse_time(self.args.compare_until, now) if self.args.compare_until else start
+        except ValueError as ex:
+            raise argx.UserError(str(ex))
+
+        services = None
+        if self.args.name:
+            services = set(self._fleet_services(self.args.name, service_type="pg"))
+        archive = statsarchive.QueryStatsArchive(self.args.archive)
+        aggregate, count = archive.period(start, end, services=services)
+        if not count:
+            raise argx.UserError("No snapshots archived in {!r} for the period".format(archive.path))
+
+        queries = aggregate.top(self.args.limit, order_by=self.args.order_by)
+        layout = [["query", "services", "calls", "total_time", "mean_time", "max_time", "blocks_read", "rows"]]
+        if compare_start is not None:
+            baseline, _ = archive.period(compare_start, compare_end, services=services)
+            for query in queries:
+                before = baseline.find(query["query"]) or {"calls": 0, "total_time": 0.0}
+                query["compare_calls"] = before["calls"]
+                query["compare_total_time"] = before["total_time"]
+                query["total_time_change"] = query["total_time"] - before["total_time"]
+            layout = [["query", "services", "calls", "compare_calls", "total_time", "compare_total_time",
+                       "total_time_change", "mean_time", "blocks_read"]]
         self.print_response(queries, format=self.args.format, json=self.args.json, table_layout=layout)
 
     @arg.project
@@ -310,33 +795,38 @@ class AivenCLI(argx.CommandLineTool):
     @arg.timeout
     def service_wait(self):
         """Wait service to reach the 'RUNNING' state"""
+        from . import provision
         start_time = time.time()
         report_interval = 30.0
         next_report = start_time + report_interval
-        last = {}
-        while True:
-            all_running = True
-            for service in self.args.service:
-                info = self.client.get_service(project=self.get_project(), service_name=service)
-                if info["state"] != last.get(service):
-                    self.log.info("Service %r state is now %r", service, info["state"])
-                last[service] = info["state"]
-                if info["state"] != "RUNNING":
-                    all_running = False
-
-            if all_running:
-                self.log.info("Service(s) RUNNING: %s", ", ".join(self.args.service))
-                return
-
-            if self.args.timeout is not None and (time.time() - start_time) > self.args.timeout:
-                self.log.error("Timeout waiting for service(s) to start")
-                return 1
-
-            if time.time() >= next_report:
-                next_report = time.time() + report_interval
-                self.log.info("Waiting for services to start")
-
-            time.sleep(3.0)
+        project = self.get_project()
+        tracker = provision.StateTracker(lambda: self.client.get_services(project=project), self.args.service,
+                                         log=self.log)
+        with self.start_progress("wait for RUNNING", items=len(self.args.service)) as status:
+            while True:
+                states = tracker.poll()
+                missing = [service for service in self.args.service if service not in states]
+                if missing:
+                    raise argx.UserError("Service(s) not found in project {!r}: {}".format(
+                        project, ", ".join(missing)))
+                running = sum(1 for service in self.args.service if states[service] == "RUNNING")
+                status.update(done=running)
+
+                if running == len(self.args.service):
+                    status.close()
+                    self.log.info("Service(s) RUNNING: %s", ", ".join(self.args.service))
+                    return
+
+                if self.args.timeout is not None and (time.time() - start_time) > self.args.timeout:
+                    status.close()
+                    self.log.error("Timeout waiting for service(s) to start")
+                    return 1
+
+                if time.time() >= next_report:
+                    next_report = time.time() + report_interval
+                    self.log.info("Waiting for services to start")
+
+                time.sleep(3.0)
 
     @arg.project
     @arg.force
@@ -360,25 +850,50 @@ class AivenCLI(argx.CommandLineTool):
                 if user_input != name:
                     raise argx.UserError("Not confirmed by user. Aborting termination.")
 
-        for name in self.args.name:
-            self.client.delete_service(project=self.get_project(), service=name)
-            self.log.info("%s: terminated", name)
-
-    def create_user_config(self, project, service_type, config_vars):
-        """Convert a list of ["foo.bar='baz'"] to {"foo": {"bar": "baz"}}"""
+        with self.start_progress("terminate", items=len(self.args.name)) as status:
+            for name in self.args.name:
+                self.client.delete_service(project=self.get_project(), service=name)
+                status.done()
+                self.log.info("%s: terminated", name)
+
+    def get_service_types(self, project, max_age=SERVICE_TYPES_CACHE_TTL):
+        """Return service type definitions, from the local cache if at most max_age seconds old"""
+        cache = filecache.FileCache()
+        cache_key = ["service_types", self.args.url, project]
+        service_types = cache.get(cache_key, max_age=max_age) if max_age else None
+        if service_types is None:
+            service_types = self.client.get_service_types(project=project)
+            cache.set(cache_key, service_types)
+        return service_types
+
+    def create_user_config(self, project, service_type, config_vars, current_config=None):
+        """Convert a list of ["foo.bar='baz'"] to {"foo": {"bar": "baz"}}
+
+        The result merged on top of current_config is validated against the
+        service type's user_config_schema before anything is sent to the API."""
         if not config_vars:
             return {}
 
-        service_types = self.client.get_service_types(project=project)
         try:
-            service_def = service_types[service_type]
+            return self._build_user_config(self.get_service_types(project), service_type, config_vars,
+                                           current_config)
+        except UserConfigSchemaError:
+            # the cached schema may be out of date, retry with a fresh one before giving up
+            return self._build_user_config(self.get_service_types(project, max_age=0), service_type, config_vars,
+                                           current_config)
+
+    def _service_def(self, service_types, service_type):
+        try:
+            return service_types[service_type]
         except KeyError:
-            raise argx.UserError("Unknown service type {!r}, available options: {}".format(
+            raise UserConfigSchemaError("Unknown service type {!r}, available options: {}".format(
                 service_type, ", ".join(service_types)))
 
+    def _build_user_config(self, service_types, service_type, config_vars, current_config):
+        service_def = self._service_def(service_types, service_type)
         options = self.collect_user_config_options(service_def["user_config_schema"])
         user_config = {}
-        for key_value in self.args.user_config:
+        for key_value in config_vars:
             try:
                 key, value = key_value.split("=", 1)
             except ValueError:
@@ -392,8 +907,8 @@ class AivenCLI(argx.CommandLineTool):
                 opt_schema = options.get(generic_key)
 
             if not opt_schema:
-                raise argx.UserError("Unsupported option {!r}, available options: {}"
-                                     .format(key, ", ".join(options) or "none"))
+                raise UserConfigSchemaError("Unsupported option {!r}, available options: {}"
+                                            .format(key, ", ".join(options) or "none"))
 
             try:
                 value = convert_str_to_value(opt_schema, value)
@@ -408,8 +923,26 @@ class AivenCLI(argx.CommandLineTool):
 
             conf[parts[-1]] = value
 
+        self._validate_user_config(service_types, service_type, user_config, current_config)
         return user_config
 
+    def _validate_user_config(self, service_types, service_type, user_config, current_config=None):
+        from . import schema
+        service_def = self._service_def(service_types, service_type)
+        validate = schema.compile_schema(service_def["user_config_schema"])
+        errors = validate(schema.merge(current_config or {}, user_config), "user_config")
+        if errors:
+            raise UserConfigSchemaError("Invalid user configuration for service type {!r}:\n{}".format(
+                service_type, "\n".join("  {}: {}".format(path, message) for path, message in errors)))
+
+    def validate_user_config(self, project, service_type, user_config):
+        """Check a user_config dict against the service type's user_config_schema"""
+        try:
+            self._validate_user_config(self.get_service_types(project), service_type, user_config)
+        except UserConfigSchemaError:
+            # the cached schema may be out of date, retry with a fresh one before giving up
+            self._validate_user_config(self.get_service_types(project, max_age=0), service_type, user_config)
+
     @arg.project
     @arg("name", help="Service name")
     @arg("--group-name", help="service group", default="default")
@@ -441,7 +974,7 @@ class AivenCLI(argx.CommandLineTool):
                 plan=plan,
                 cloud=self.args.cloud,
                 group_name=self.args.group_name,
-                user_config=self.create_user_config(project, self.args.service_type, self.args.user_config))
+                user_config=self.create_user_config(project, service_type, self.args.user_config))
         except client.Error as ex:
             print(ex.response)
             if not self.args.no_fail_if_exists or ex.response.status_code != 409:
@@ -449,6 +982,48 @@ class AivenCLI(argx.CommandLineTool):
 
             self.log.info("service '%s/%s' already exists", project, self.args.name)
 
+    @arg.project
+    @arg("-f", "--file", dest="manifest", required=True,
+         help="Manifest of services to create, JSON or YAML (see 'pydoc aiven.client.provision')")
+    @arg("--no-fail-if-exists", action="store_true", default=False,
+         help="do not fail if a service already exists")
+    @arg("--timeout", type=int, default=1800, help="Wait for up to N seconds (default: %(default)s)")
+    @arg("--wait", action="store_true", default=False,
+         help="Wait for every service to reach RUNNING (default: only those other services depend on)")
+    @arg.workers
+    @arg.json
+    def service_create_many(self):
+        """Create services from a manifest, concurrently and in dependency order"""
+        from . import provision
+        try:
+            manifest_project, specs = provision.load_manifest(self.args.manifest)
+        except (IOError, provision.ManifestError) as ex:
+            raise argx.UserError("Failed to load manifest: {}".format(ex))
+        project = manifest_project or self.get_project()
+        # check every configuration before creating anything
+        for spec in specs:
+            self.validate_user_config(project, spec["service_type"], spec["user_config"])
+
+        def create(spec):
+            return self.client.create_service(project=project, service=spec["name"],
+                                              service_type=spec["service_type"], plan=spec["plan"],
+                                              cloud=spec["cloud"], group_name=spec["group_name"],
+                                              user_config=spec["user_config"])
+
+        with self.start_progress("create services", items=len(specs)) as status:
+            provisioner = provision.Provisioner(
+                specs, create=create, list_services=lambda: self.client.get_services(project=project),
+                exists=lambda ex: isinstance(ex, client.Error) and ex.status == 409,
+                no_fail_if_exists=self.args.no_fail_if_exists, workers=self.args.workers,
+                timeout=self.args.timeout, wait=self.args.wait, log=self.log, progress=status)
+            results = provisioner.run()
+        summary = [{"project": project, "service_name": spec["name"], "depends_on": spec["depends_on"],
+                    "result": results.get(spec["name"], "")} for spec in specs]
+        self.print_response(summary, json=self.args.json,
+                            table_layout=["service_name", "result", "depends_on"])
+        if any(not result.startswith(("created", "exists")) for result in results.values()):
+            return 1
+
     def _get_powered(self):
         if self.args.power_on and self.args.power_off:
             raise argx.UserError("Only one of --power-on or --power-off can be specified")
@@ -473,7 +1048,8 @@ class AivenCLI(argx.CommandLineTool):
         project = self.get_project()
         service = self.client.get_service(project=project, service_name=self.args.name)
         plan = self.args.plan or service["plan"]
-        user_config = self.create_user_config(project, service["service_type"], self.args.user_config)
+        user_config = self.create_user_config(project, service["service_type"], self.args.user_config,
+                                              current_config=service.get("user_config"))
         try:
             self.client.update_service(
                 cloud=self.args.cloud,
@@ -488,6 +1064,73 @@ class AivenCLI(argx.CommandLineTool):
             print(ex.response.text)
             raise argx.UserError("Service '{}/{}' update failed".format(project, self.args.name))
 
+    @arg.workers
+    @arg.json
+    def inventory_sync(self):
+        """Update the local inventory database of projects, services, users and cards"""
+        from . import inventory
+        inv = inventory.Inventory()
+        counts = {}
+
+        def add_counts(entity, result):
+            total = counts.setdefault(entity, {"entity": entity, "added": 0, "updated": 0, "removed": 0,
+                                               "unchanged": 0})
+            for key in ["added", "updated", "removed", "unchanged"]:
+                total[key] += result[key]
+
+        try:
+            projects = self.client.get_projects()
+            add_counts("projects", inv.sync_projects(projects))
+
+            def fetch(project_name):
+                services = self.client.get_services(project=project_name)
+                try:
+                    users = self.client.list_project_users(project=project_name)
+                except client.Error as ex:
+                    self.log.warning("%s: failed to fetch project users: %s", project_name, ex)
+                    users = None
+                return services, users
+
+            project_names = [project["project_name"] for project in projects]
+            with self.start_progress("sync projects", items=len(project_names)) as status:
+                fetched = parallel.map_concurrently(fetch, project_names, self.args.workers, progress=status)
+            for project_name, result, error in fetched:
+                if error is not None:
+                    # keep the previous snapshot of the project rather than dropping its services
+                    self.log.warning("%s: failed to fetch services: %s", project_name, error)
+                    continue
+                services, users = result
+                add_counts("services", inv.sync_services(project_name, services))
+                if users is not None:
+                    add_counts("project_users", inv.sync_project_users(project_name, users))
+
+            add_counts("cards", inv.sync_cards(self.client.get_cards()))
+        finally:
+            inv.close()
+
+        result = [counts[entity] for entity in ["projects", "services", "project_users", "cards"] if entity in counts]
+        self.print_response(result, json=self.args.json,
+                            table_layout=["entity", "added", "updated", "removed", "unchanged"])
+
+    @arg("sql", help="SQL query, e.g. \"SELECT project, service_name FROM services WHERE plan = 'business-4' "
+         "AND cloud_name = 'google-europe-west1'\"")
+    @arg("--param", action="append", default=[], help="Value for a ? placeholder in the query")
+    @arg.json
+    def inventory_query(self):
+        """Query the local inventory database (tables: projects, services, project_users, cards)"""
+        from . import inventory
+        import sqlite3
+        if not os.path.exists(inventory.INVENTORY_PATH):
+            raise argx.UserError("No inventory found, run 'avn inventory sync' first")
+        inv = inventory.Inventory()
+        try:
+            columns, rows = inv.query(self.args.sql, self.args.param)
+        except sqlite3.Error as ex:
+            raise argx.UserError("Inventory query failed: {}".format(ex))
+        finally:
+            inv.close()
+        self.print_response(rows, json=self.args.json, table_layout=columns or None)
+
     @arg("name", help="Project name")
     @arg.cloud
     def project_switch(self):
@@ -534,6 +1177,7 @@ class AivenCLI(argx.CommandLineTool):
 
     @arg.json
     @arg.project
+    @arg.cache_ttl
     def project_details(self):
         """Show project details"""
         project_name = self.get_project()
@@ -543,15 +1187,20 @@ class AivenCLI(argx.CommandLineTool):
                             json=self.args.json,
                             table_layout=["project_name", "default_cloud", "credit_card"])
 
+    @arg.filter
+    @arg.fields
     @arg.json
+    @arg.cache_ttl
     def project_list(self):
         """List projects"""
         projects = self.client.get_projects()
         for project in projects:
             project["credit_card"] = self._project_credit_card(project)
+        projects = self.filter_results(projects)
         self.print_response(projects,
                             json=self.args.json,
-                            table_layout=["project_name", "default_cloud", "credit_card"])
+                            table_layout=["project_name", "default_cloud", "credit_card"],
+                            fields=self.args.fields)
 
     @arg.project
     @arg("--card-id", help="Card ID")
@@ -621,25 +1270,14 @@ class AivenCLI(argx.CommandLineTool):
         self._write_auth_token_file(token=result["token"], email=self.args.email)
 
     def _write_auth_token_file(self, token, email):
-        with self._open_auth_token_file(mode="w") as fp:
-            fp.write(jsonlib.dumps({"auth_token": token, "user_email": email}))
-            aiven_credentials_filename = fp.name
-        os.chmod(aiven_credentials_filename, 0o600)
+        aiven_credentials_filename = self._auth_token_file_path()
+        with fileutil.locked(aiven_credentials_filename):
+            fileutil.write_atomic(aiven_credentials_filename, jsonlib.dumps({"auth_token": token, "user_email": email}))
         self.log.info("Aiven credentials written to: %s", aiven_credentials_filename)
 
-    def _open_auth_token_file(self, mode="r"):
+    def _auth_token_file_path(self):
         default_token_file_path = os.path.join(envdefault.AIVEN_CONFIG_DIR, "aiven-credentials.json")
-        auth_token_file_path = (os.environ.get("AIVEN_CREDENTIALS_FILE")
-                                or default_token_file_path)
-        try:
-            return open(auth_token_file_path, mode)
-        except IOError as ex:
-            if ex.errno == errno.ENOENT and mode == "w":
-                aiven_dir = os.path.dirname(auth_token_file_path)
-                os.makedirs(aiven_dir)
-                os.chmod(aiven_dir, 0o700)
-                return open(auth_token_file_path, mode)
-            raise
+        return os.environ.get("AIVEN_CREDENTIALS_FILE") or default_token_file_path
 
     def _get_auth_token(self):
         token = self.args.auth_token
@@ -647,39 +1285,103 @@ class AivenCLI(argx.CommandLineTool):
             return token
 
         try:
-            with self._open_auth_token_file() as fp:
-                return jsonlib.load(fp)["auth_token"]
-        except IOError as ex:
+            return fileutil.read_json(self._auth_token_file_path())["auth_token"]
+        except (IOError, OSError) as ex:
             if ex.errno == errno.ENOENT:
                 return None
             raise
 
+    def invocation_stats(self):
+        stats = {}
+        if hasattr(self.args, "project") and self.config is not None:
+            stats["project"] = self.get_project()
+        if self.client:
+            request_stats = self.client.request_stats()
+            stats["requests"] = request_stats["requests"]
+            stats["api"] = request_stats["busy_time"]
+            stats["api_request_time"] = request_stats["request_time"]
+            stats["transfer"] = self.client.transfer_stats.as_dict()
+        return stats
+
     def pre_run(self, func):
         self.client = client.AivenClient(base_url=self.args.url,
-                                         show_http=self.args.show_http)
+                                         show_http=self.args.show_http,
+                                         rate_limit=self.args.rate_limit,
+                                         pool_size=self.args.http_pool_size,
+                                         connect_timeout=self.args.connect_timeout,
+                                         read_timeout=self.args.read_timeout,
+                                         keep_alive=not self.args.no_keep_alive,
+                                         compression=self.args.compress,
+                                         record_to=self.args.record,
+                                         replay_from=self.args.replay,
+                                         replay_speed=self.args.replay_speed)
         # Always set CA if we have anything set at the command line or in the env
         if self.args.auth_ca is not None:
             self.client.set_ca(self.args.auth_ca)
-        if func == self.user_create:
-            # "user create" doesn't use authentication (yet)
+        # writes always invalidate results cached by read commands run with --cache-ttl
+        self.client.set_response_cache(filecache.FileCache(), ttl=getattr(self.args, "cache_ttl", 0))
+        if func in (self.user_create, self.completion_script, self.inventory_query, self.service_queries_history,
+                    self.log_search) or (func == self.service_diff and self.args.inventory):
+            # "user create" doesn't use authentication (yet), the others only read local files
             return
 
         # "user login" does not use client token everything else does
         if func != self.user_login:
-            auth_token = self._get_auth_token()
+            with self.timer.phase("auth"):
+                auth_token = self._get_auth_token()
             if auth_token:
                 self.client.set_auth_token(auth_token)
-            else:
+            elif not self.args.replay:
                 raise argx.UserError("auth_token is required for all commands")
 
+    @arg.filter
+    @arg.fields
     @arg.json
     @arg.verbose
+    @arg.cache_ttl
     def card_list(self):
         """List credit cards"""
         layout = [["card_id", "name", "country", "exp_year", "exp_month", "last4"]]
         if self.args.verbose:
             layout.append("address_*")
-        self.print_response(self.client.get_cards(), json=self.args.json, table_layout=layout)
+        cards = self.filter_results(self.client.get_cards())
+        self.print_response(cards, json=self.args.json, table_layout=layout, fields=self.args.fields)
+
+    @arg("shell", choices=["bash", "zsh"], help="Shell to generate the completion script for")
+    def completion_script(self):
+        """Print a shell completion script, e.g. 'source <(avn completion script bash)'"""
+        if self.args.shell == "zsh":
+            print(completion.zsh_script(self.parser, prog=self.parser.prog))
+        else:
+            print(completion.bash_script(self.parser, prog=self.parser.prog))
+
+    @arg.project
+    @arg("kind", nargs="*", default=[],
+         help="Cached value kinds to refresh: {} (default: all)".format(", ".join(completion.KINDS)))
+    def completion_refresh(self):
+        """Refresh the shell completion cache"""
+        kinds = set(self.args.kind or completion.KINDS)
+        unknown = kinds - set(completion.KINDS)
+        if unknown:
+            raise argx.UserError("Unknown completion kind(s) {}, expected one of {}".format(
+                ", ".join(sorted(unknown)), ", ".join(completion.KINDS)))
+
+        if "projects" in kinds:
+            completion.write_values("projects", [p["project_name"] for p in self.client.get_projects()])
+
+        project = self.get_project()
+        if not project:
+            return
+        if "services" in kinds:
+            services = self.client.get_services(project=project)
+            completion.write_values("services", [s["service_name"] for s in services], project=self.args.project)
+        if "clouds" in kinds:
+            completion.write_values("clouds", [c["cloud_name"] for c in self.client.get_clouds(project=project)])
+        if kinds & {"service_types", "plans", "user_config"}:
+            service_types = self.client.get_service_types(project=project)
+            values = completion.service_type_values(service_types, self.collect_user_config_options)
+            for kind, kind_values in values.items():
+                completion.write_values(kind, kind_values)
 
     def _card_get_stripe_token(self,
                                stripe_publishable_key,
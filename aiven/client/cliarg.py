@@ -4,11 +4,31 @@
 # See the file `LICENSE` for details.
 
 from .argx import arg
+from .filterexpr import compile_filter, parse_fields, FilterError
+from .parallel import DEFAULT_WORKERS
+import argparse
 import os
 
+
+def _expression_type(parse):
+    def convert(text):
+        try:
+            return parse(text)
+        except FilterError as ex:
+            raise argparse.ArgumentTypeError(str(ex))
+    return convert
+
+
+arg.cache_ttl = arg("--cache-ttl", type=float, default=0, metavar="SECONDS",
+                    help="Reuse results of the same API requests made within SECONDS by earlier commands "
+                    "(default: no caching)")
 arg.card_id = arg("--card-id", help="Card ID")
 arg.cloud = arg("--cloud", help="Cloud to use (see 'cloud list' command)")
 arg.email = arg("email", help="User email address")
+arg.fields = arg("--fields", type=_expression_type(parse_fields),
+                 help="Comma separated list of fields to output, e.g. 'service_name,user_config.pg_version'")
+arg.filter = arg("--filter", type=_expression_type(compile_filter),
+                 help="Filter expression, e.g. 'state!=RUNNING and plan~business-*'")
 arg.force = arg("-f", "--force", help="Force action without interactive confirmation",
                 action="store_true", default=False)
 arg.json = arg("--json", help="Raw json output", action="store_true", default=False)
@@ -19,3 +39,5 @@ arg.timeout = arg("--timeout", type=int, help="Wait for up to N seconds (default
 arg.user_config = arg("-c", dest="user_config", action="append", default=[],
                       help="User configuration: KEY=JSON_VALUE")
 arg.verbose = arg("-v", "--verbose", help="Verbose output", action="store_true", default=False)
+arg.workers = arg("--workers", type=int, default=DEFAULT_WORKERS,
+                  help="Number of concurrent API requests (default: %(default)s)")
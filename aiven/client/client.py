@@ -8,56 +8,259 @@ try:
 except ImportError:
     __version__ = "UNKNOWN"
 
+from .cassette import CassetteRecorder, ReplayAdapter
+from .compression import compress, CompressingReader, ACCEPT_ENCODING, DEFAULT_THRESHOLD, TransferStats
+from .endpoints import DEFAULT_PROBE_INTERVAL, DEFAULT_PROBE_TIMEOUT, EndpointSelector, parse_urls
+from .filecache import FileCache
+from .jsonstream import ArrayScanner, StreamError
+from .models import Project, QueryStat, Service, ServiceType
+from .progress import CountingReader
+from .ratelimit import parse_retry_after, RateLimiter
+import hashlib
 import json
 import logging
 import os
 import requests
+import requests.adapters
+import requests.structures
+import threading
+import time
+
+try:
+    from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+except ImportError:
+    # requests < 2.16 bundles its own urllib3
+    from requests.packages.urllib3.exceptions import ConnectTimeoutError, NewConnectionError  # pylint: disable=import-error
 
 
 AUTHORIZATION_CODE_CREATE_USER = "sudo createuser"  # TODO: remove
+SYSTEM_CA_BUNDLE = "/etc/pki/tls/certs/ca-bundle.crt"
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD"])
+_HTTP_LOG_LOCK = threading.Lock()
 
 
 class Error(Exception):
     """Request error"""
     def __init__(self, response, status=520):
-        Exception.__init__(self, response.text)
+        Exception.__init__(self, getattr(response, "text", response))
         self.response = response
         self.status = status
 
 
+def is_connect_error(ex):
+    """Tell whether a ConnectionError happened while connecting, i.e. before any of the request was sent"""
+    if isinstance(ex, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(ex.args[0] if ex.args else None, "reason", None)
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class CountingHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter keeping count of requests sent and TCP connections opened"""
+    def __init__(self, *args, **kwargs):
+        self.lock = threading.Lock()
+        self.requests_sent = 0
+        self.connections_opened = 0
+        requests.adapters.HTTPAdapter.__init__(self, *args, **kwargs)
+
+    def _connection_opened(self):
+        with self.lock:
+            self.connections_opened += 1
+
+    def init_poolmanager(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        requests.adapters.HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        adapter = self
+
+        def counting_pool(pool_cls):
+            class CountingConnection(pool_cls.ConnectionCls):  # pylint: disable=too-few-public-methods
+                def connect(self):
+                    adapter._connection_opened()  # pylint: disable=protected-access
+                    return super(CountingConnection, self).connect()
+            return type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": CountingConnection})
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: counting_pool(pool_cls) for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        with self.lock:
+            self.requests_sent += 1
+        return requests.adapters.HTTPAdapter.send(self, request, **kwargs)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests_sent,
+                "new_connections": self.connections_opened,
+                "reused_connections": max(0, self.requests_sent - self.connections_opened),
+            }
+
+
 class AivenClientBase(object):
     """Aiven Client with low-level HTTP operations"""
-    def __init__(self, base_url, show_http=False):
+    def __init__(self, base_url, show_http=False, rate_limit=None, throttle_retries=5,
+                 pool_size=DEFAULT_POOL_SIZE, connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT, keep_alive=True, compression=None,
+                 compression_threshold=DEFAULT_THRESHOLD, accept_compression=True,
+                 record_to=None, replay_from=None, replay_speed=1.0,
+                 probe_interval=DEFAULT_PROBE_INTERVAL, probe_timeout=DEFAULT_PROBE_TIMEOUT, clock=time.time):
         self.log = logging.getLogger("AivenClient")
+        self.clock = clock
         self.auth_token = None
-        self.base_url = base_url
-        self.log.debug("using %r", self.base_url)
-        self.session = requests.Session()
-        self.session.verify = "/etc/pki/tls/certs/ca-bundle.crt"
-        self.session.headers = {
+        self.response_cache = None
+        self.cache_ttl = 0
+        self.rate_limiter = RateLimiter(rate=rate_limit)
+        self.throttle_retries = throttle_retries
+        self.timeout = (connect_timeout, read_timeout)
+        if compression is not None:
+            compress(b"", compression)  # fail early on unsupported methods
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+        self.transfer_stats = TransferStats()
+        self.stats_lock = threading.Lock()
+        self.request_count = 0
+        self.request_time = 0.0
+        # wall clock time with at least one request in flight, request_time sums concurrent requests
+        self.busy_time = 0.0
+        self._in_flight = 0
+        self._busy_since = None
+        self.probe_timeout = probe_timeout
+        self.endpoints = EndpointSelector(parse_urls(base_url), probe=self._probe_endpoint, interval=probe_interval,
+                                          cache=FileCache())
+        self.log.debug("using %r", self.endpoints.urls)
+        # use the system CA bundle where one exists, otherwise the one shipped with requests
+        self.verify_ca = SYSTEM_CA_BUNDLE if os.path.exists(SYSTEM_CA_BUNDLE) else True
+        # block on an exhausted pool rather than opening throwaway connections beyond pool_size
+        self.adapter = CountingHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        # serve responses from a recorded cassette instead of the network when replaying
+        self.transport = ReplayAdapter(replay_from, speed=replay_speed) if replay_from else self.adapter
+        self.recorder = CassetteRecorder(record_to) if record_to else None
+        self.headers = {
             "content-type": "application/json",
             "user-agent": "aiven-client/" + __version__,
+            "accept-encoding": ACCEPT_ENCODING if accept_compression else "identity",
         }
+        if not keep_alive:
+            self.headers["connection"] = "close"
+        # every thread gets its own session, all sharing the connection pool of the transport adapter
+        self._local = threading.local()
         self.http_log = logging.getLogger("aiven_http")
         self.init_http_logging(show_http)
         self.api_prefix = "/v1beta"
 
+    @property
+    def base_url(self):
+        """Base url of the endpoint currently used for requests"""
+        return self.endpoints.current()
+
+    def _probe_endpoint(self, url):
+        start_time = time.time()
+        self.session.head(url + self.api_prefix, timeout=(self.probe_timeout, self.probe_timeout),
+                          verify=self.verify_ca)
+        return time.time() - start_time
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the connections of all threads; the client must not be used afterwards"""
+        self.transport.close()
+
+    @property
+    def session(self):
+        """The requests session of the calling thread"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.transport)
+            session.mount("http://", self.transport)
+            session.headers = requests.structures.CaseInsensitiveDict(self.headers)
+            self._local.session = session
+        return session
+
     def init_http_logging(self, show_http):
-        http_handler = logging.StreamHandler()
-        http_handler.setFormatter(logging.Formatter("%(message)s"))
-        self.http_log.addHandler(http_handler)
-        self.http_log.propagate = False
-        if show_http:
-            self.http_log.setLevel(logging.DEBUG)
+        with _HTTP_LOG_LOCK:
+            if not any(getattr(handler, "aiven_http", False) for handler in self.http_log.handlers):
+                http_handler = logging.StreamHandler()
+                http_handler.setFormatter(logging.Formatter("%(message)s"))
+                http_handler.aiven_http = True
+                self.http_log.addHandler(http_handler)
+                self.http_log.propagate = False
+            if show_http:
+                self.http_log.setLevel(logging.DEBUG)
 
     def set_auth_token(self, token):
         self.auth_token = token
 
     def set_ca(self, ca):
-        self.session.verify = ca
-
-    def _execute(self, func, method, path, body, params=None):
-        url = self.base_url + path
+        self.verify_ca = ca
+
+    def set_response_cache(self, cache, ttl=0):
+        """Serve GET results from `cache` when they are at most `ttl` seconds old and drop
+        the cached results of a path and its parents on every write; ttl 0 only does the latter"""
+        self.response_cache = cache
+        self.cache_ttl = ttl
+
+    def _cache_key(self, path):
+        identity = hashlib.sha1(self.auth_token.encode("utf-8")).hexdigest()
+        return ["api", identity, path]
+
+    def _invalidate(self, path):
+        while path.startswith(self.api_prefix + "/"):
+            self.response_cache.delete(self._cache_key(path))
+            path = path.rpartition("/")[0]
+
+    def request_stats(self):
+        """Return the number of HTTP requests sent, the sum of their durations and the wall clock time
+        during which any of them was in flight"""
+        with self.stats_lock:
+            return {"requests": self.request_count, "request_time": self.request_time, "busy_time": self.busy_time}
+
+    def connection_stats(self):
+        """Return counts of HTTP requests and new versus reused connections"""
+        return self.adapter.stats()
+
+    def _prepare_body(self, data, headers):
+        """Compress request bodies above the size threshold and account their sizes; files are compressed
+        while they are sent"""
+        if data is None:
+            return None
+        if hasattr(data, "read"):
+            size = os.fstat(data.fileno()).st_size if hasattr(data, "fileno") else None
+            if self.compression and (size is None or size >= self.compression_threshold):
+                headers["content-encoding"] = self.compression
+                return CompressingReader(data, self.compression, self.transfer_stats)
+            self.transfer_stats.record_request(size or 0, size or 0, compressed=False)
+            return data
+        if not isinstance(data, bytes):
+            data = data.encode("utf-8")
+        size = len(data)
+        if self.compression and size >= self.compression_threshold:
+            compressed = compress(data, self.compression)
+            if len(compressed) < size:
+                headers["content-encoding"] = self.compression
+                self.transfer_stats.record_request(size, len(compressed), compressed=True)
+                return compressed
+        self.transfer_stats.record_request(size, size, compressed=False)
+        return data
+
+    def _record_response(self, response, size=None):
+        if size is None:
+            size = len(response.content)
+        try:
+            received = response.raw.tell()
+        except AttributeError:
+            received = size
+        encoding = response.headers.get("content-encoding", "identity")
+        self.transfer_stats.record_response(size, received or size, compressed=encoding != "identity")
+
+    def _execute(self, func, method, path, body, params=None, stream=False):
         headers = {}
         if isinstance(body, dict):
             headers["content-type"] = "application/json"
@@ -68,11 +271,13 @@ class AivenClientBase(object):
             data = body
             log_data = data or ""
 
+        data = self._prepare_body(data, headers)
+
         if self.auth_token:
             headers["authorization"] = "aivenv1 {token}".format(token=self.auth_token)
 
         self.http_log.debug("-----Request Begin-----")
-        self.http_log.debug("%s %s %s", method, url, params if params else "")
+        self.http_log.debug("%s %s %s", method, self.base_url + path, params if params else "")
         for header, header_value in headers.items():
             self.http_log.debug("%s: %s", header, header_value)
 
@@ -80,7 +285,63 @@ class AivenClientBase(object):
         self.http_log.debug("%s", log_data)
         self.http_log.debug("-----Request End-----")
 
-        response = func(url, headers=headers, params=params, data=data)
+        attempt = 0
+        failovers = 0
+        while True:
+            self.rate_limiter.acquire()
+            base_url = self.endpoints.current()
+            url = base_url + path
+            start_time = self.clock()
+            with self.stats_lock:
+                if not self._in_flight:
+                    self._busy_since = start_time
+                self._in_flight += 1
+            try:
+                response = func(url, headers=headers, params=params, data=data, timeout=self.timeout, stream=stream,
+                                verify=self.verify_ca)
+            except requests.exceptions.ConnectionError as ex:
+                self.endpoints.failed(base_url)
+                failovers += 1
+                # a write may already have been applied if the connection broke after sending it
+                resendable = method in IDEMPOTENT_METHODS or is_connect_error(ex)
+                if not resendable or failovers >= len(self.endpoints.urls):
+                    raise
+                self.log.warning("Request to %s failed (%s), retrying with another endpoint", base_url, ex)
+                if hasattr(data, "seek"):
+                    data.seek(0)
+                continue
+            finally:
+                end_time = self.clock()
+                elapsed = end_time - start_time
+                with self.stats_lock:
+                    self.request_count += 1
+                    self.request_time += elapsed
+                    self._in_flight -= 1
+                    if not self._in_flight:
+                        self.busy_time += end_time - self._busy_since
+            if self.recorder:
+                self.recorder.record(method, url, params, body, response, elapsed)
+            if response.status_code != 429 or attempt >= self.throttle_retries:
+                break
+            attempt += 1
+            retry_after = parse_retry_after(response.headers.get("retry-after"), default=float(attempt))
+            # release the connection of an unread streamed body, a blocking pool could run out of them
+            response.close()
+            self.rate_limiter.throttled(retry_after)
+            self.log.warning("Request throttled by API (%s %s), retrying in %.1f seconds (attempt %d/%d)",
+                             method, path, retry_after, attempt, self.throttle_retries)
+            if hasattr(data, "seek"):
+                data.seek(0)
+
+        if response.status_code != 429:
+            self.rate_limiter.succeeded()
+
+        success = str(response.status_code).startswith("2")
+        if stream and success and not self.http_log.isEnabledFor(logging.DEBUG):
+            # leave the body unread for the caller to consume incrementally
+            return response
+
+        self._record_response(response)
 
         self.http_log.debug("-----Response Begin-----")
         self.http_log.debug("%s %s", response.status_code, response.reason)
@@ -95,18 +356,18 @@ class AivenClientBase(object):
 
         self.http_log.debug("-----Response End-----")
 
-        if not str(response.status_code).startswith("2"):
+        if not success:
             raise Error(response, status=response.status_code)
 
         return response
 
-    def get(self, path="", params=None):
+    def get(self, path="", params=None, stream=False):
         """HTTP GET"""
-        return self._execute(self.session.get, "GET", path, body=None, params=params)
+        return self._execute(self.session.get, "GET", path, body=None, params=params, stream=stream)
 
-    def post(self, path="", body=None, params=None):
+    def post(self, path="", body=None, params=None, stream=False):
         """HTTP POST"""
-        return self._execute(self.session.post, "POST", path, body, params)
+        return self._execute(self.session.post, "POST", path, body, params, stream=stream)
 
     def put(self, path="", body=None, params=None):
         """HTTP PUT"""
@@ -118,6 +379,29 @@ class AivenClientBase(object):
 
     def verify(self, op, path, body=None, params=None, result_key=None):
         path = self.api_prefix + path
+        cache_key = None
+        if self.response_cache is not None and self.auth_token and params is None:
+            cache_key = self._cache_key(path)
+        if op != self.get:
+            try:
+                result = self._verify_response(op, path, body, params)
+            finally:
+                if cache_key is not None:
+                    self._invalidate(path)
+        elif cache_key is not None and self.cache_ttl:
+            result = self.response_cache.get(cache_key, max_age=self.cache_ttl)
+            if result is None:
+                result = self._verify_response(op, path, body, params)
+                self.response_cache.set(cache_key, result)
+        else:
+            result = self._verify_response(op, path, body, params)
+
+        if result_key is not None:
+            return result[result_key]
+        else:
+            return result
+
+    def _verify_response(self, op, path, body, params):
         if body:
             response = op(path=path, body=body, params=params)
         else:
@@ -127,10 +411,37 @@ class AivenClientBase(object):
         if result.get("error"):
             raise Error("server returned error: {op} {base_url}{path} {result}".format(
                 op=op.__doc__, base_url=self.base_url, path=path, result=result))
-        if result_key is not None:
-            return result[result_key]
+        return result
+
+    def verify_stream(self, op, path, result_key, body=None, params=None, chunk_size=64 * 1024, decode=None):
+        """Like verify() but yield the elements of the `result_key` list as they are received,
+        optionally creating them with decode(json_text) instead of json.loads()"""
+        path = self.api_prefix + path
+        if body:
+            response = op(path=path, body=body, params=params, stream=True)
         else:
-            return result
+            response = op(path=path, params=params, stream=True)
+
+        scanner = ArrayScanner(result_key, capture=["error"], decode=decode)
+        size = 0
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                size += len(chunk)
+                for item in scanner.feed(chunk):
+                    yield item
+            scanner.close()
+            self._record_response(response, size=size)
+        except StreamError as ex:
+            raise Error("invalid response: {} {}{}: {}".format(op.__doc__, self.base_url, path, ex))
+        finally:
+            response.close()
+
+        if scanner.captured.get("error"):
+            raise Error("server returned error: {op} {base_url}{path} {result}".format(
+                op=op.__doc__, base_url=self.base_url, path=path, result=scanner.captured))
+        if not scanner.found:
+            raise Error("server response did not contain {!r}: {} {}{}".format(
+                result_key, op.__doc__, self.base_url, path))
 
 
 class AivenClient(AivenClientBase):
@@ -138,9 +449,10 @@ class AivenClient(AivenClientBase):
     def get_clouds(self, project):
         return self.verify(self.get, "/project/{}/clouds".format(project), result_key="clouds")
 
-    def get_service(self, project, service_name):
-        return self.verify(self.get, "/project/{}/service/{}".format(project, service_name),
-                           result_key="service")
+    def get_service(self, project, service_name, typed=False):
+        service = self.verify(self.get, "/project/{}/service/{}".format(project, service_name),
+                              result_key="service")
+        return Service.from_dict(service) if typed else service
 
     def authenticate_user(self, email, password):
         return self.verify(self.post, "/userauth", body={
@@ -185,19 +497,39 @@ class AivenClient(AivenClientBase):
     def delete_service(self, project, service):
         return self.verify(self.delete, "/project/{}/service/{}".format(project, service))
 
-    def get_pg_service_query_stats(self, project, service):
+    def get_pg_service_query_stats(self, project, service, typed=False):
+        if typed:
+            return list(self.iter_pg_service_query_stats(project, service, typed=True))
         return self.verify(self.post, "/project/{}/service/{}/queries".format(project, service),
                            result_key="queries", body={"limit": 100, "order_by": "calls:desc"})
 
+    def iter_pg_service_query_stats(self, project, service, typed=False):
+        """Yield query statistics one at a time while the response is being received"""
+        return self.verify_stream(self.post, "/project/{}/service/{}/queries".format(project, service),
+                                  result_key="queries", body={"limit": 100, "order_by": "calls:desc"},
+                                  decode=QueryStat.from_json if typed else None)
+
     def get_pg_service_query_stats_reset(self, project, service):
         return self.verify(self.put, "/project/{}/service/{}/queries/reset".format(project, service),
                            result_key="queries")
 
-    def get_services(self, project):
+    def get_services(self, project, typed=False):
+        """Return the services of a project, as models.Service instances if `typed` is set"""
+        if typed:
+            return list(self.iter_services(project, typed=True))
         return self.verify(self.get, "/project/{}/service".format(project), result_key="services")
 
-    def get_service_types(self, project):
-        return self.verify(self.get, "/project/{}/service_types".format(project), result_key="service_types")
+    def iter_services(self, project, typed=False):
+        """Yield services one at a time while the response is being received"""
+        return self.verify_stream(self.get, "/project/{}/service".format(project), result_key="services",
+                                  decode=Service.from_json if typed else None)
+
+    def get_service_types(self, project, typed=False):
+        service_types = self.verify(self.get, "/project/{}/service_types".format(project),
+                                    result_key="service_types")
+        if typed:
+            return {name: ServiceType.from_dict(service_type) for name, service_type in service_types.items()}
+        return service_types
 
     def create_project(self, project, card_id=None, cloud=None):
         return self.verify(self.post, "/project", body={
@@ -206,10 +538,13 @@ class AivenClient(AivenClientBase):
             "cloud": cloud,
         }, result_key="project")
 
-    def get_project(self, project):
-        return self.verify(self.get, "/project/{}".format(project), result_key="project")
+    def get_project(self, project, typed=False):
+        result = self.verify(self.get, "/project/{}".format(project), result_key="project")
+        return Project.from_dict(result) if typed else result
 
-    def get_projects(self):
+    def get_projects(self, typed=False):
+        if typed:
+            return list(self.verify_stream(self.get, "/project", result_key="projects", decode=Project.from_json))
         return self.verify(self.get, "/project", result_key="projects")
 
     def update_project(self, project, card_id=None, cloud=None):
@@ -247,17 +582,37 @@ class AivenClient(AivenClientBase):
         return self.verify(self.get, "/project/{}/logs".format(project), params={"limit": limit},
                            result_key="logs")
 
+    def iter_logs(self, project, limit=100):
+        """Yield log entries one at a time while the response is being received"""
+        return self.verify_stream(self.get, "/project/{}/logs".format(project), params={"limit": limit},
+                                  result_key="logs")
+
     def list_data(self, project):
         return self.verify(self.get, "/project/{}/data".format(project))
 
-    def download_data(self, project, filename):
+    def download_data(self, project, filename, progress=None):
+        """Return the contents of a data file, calling progress(nbytes) as the body is received"""
         path = self.api_prefix + "/project/{}/data/{}".format(project, os.path.basename(filename))
-        return self.get(path).content
-
-    def upload_data(self, project, filename):
+        if progress is None:
+            return self.get(path).content
+        response = self.get(path, stream=True)
+        chunks = []
+        try:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                chunks.append(chunk)
+                progress(len(chunk))
+        finally:
+            response.close()
+        content = b"".join(chunks)
+        self._record_response(response, size=len(content))
+        return content
+
+    def upload_data(self, project, filename, progress=None):
+        """Upload a data file, calling progress(nbytes) as the body is sent"""
         with open(filename, "rb") as fp:
             path = "/project/{}/data/{}".format(project, os.path.basename(filename))
-            return self.verify(self.put, path, body=fp)
+            body = fp if progress is None else CountingReader(fp, progress)
+            return self.verify(self.put, path, body=body)
 
     def delete_data(self, project, filename):
         path = "/project/{}/data/{}".format(project, os.path.basename(filename))
@@ -0,0 +1,198 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Shell completion for bash and zsh
+
+The generated script contains the static command tree of the CLI and reads
+dynamic values (projects, services, service types, plans, clouds and
+user_config keys) from plain text files in the completion cache directory,
+so pressing Tab never waits for the API.  Cache files older than the TTL
+are refreshed by a background 'avn completion refresh' process.
+"""
+
+from aiven.client import envdefault, fileutil
+import argparse
+import os
+
+CACHE_DIR = os.path.join(envdefault.AIVEN_CONFIG_DIR, "completion")
+DEFAULT_TTL = int(os.environ.get("AIVEN_COMPLETION_TTL", "300"))
+KINDS = ["projects", "services", "service_types", "plans", "clouds", "user_config"]
+
+# option destinations whose values can be completed from the cache
+OPTION_KINDS = {
+    "cloud": "clouds",
+    "plan": "plans",
+    "project": "projects",
+    "service_type": "service_types",
+    "update_project": "projects",
+    "user_config": "user_config",
+}
+# positional destinations completed from the cache, per command category
+POSITIONAL_KINDS = {
+    ("project", "name"): "projects",
+    ("service", "name"): "services",
+    ("service", "service"): "services",
+}
+
+
+def _subparsers(parser):
+    for action in parser._actions:  # pylint: disable=protected-access
+        if isinstance(action, argparse._SubParsersAction):  # pylint: disable=protected-access
+            return action.choices
+    return {}
+
+
+def command_tree(parser, path=()):
+    """Return a list of (command path, subcommands, options, option value kinds, positional kind)"""
+    options = []
+    option_kinds = {}
+    positional_kind = None
+    for action in parser._actions:  # pylint: disable=protected-access
+        if action.option_strings:
+            options.extend(action.option_strings)
+            kind = OPTION_KINDS.get(action.dest)
+            if kind and action.nargs != 0:
+                for option in action.option_strings:
+                    option_kinds[option] = kind
+        elif not isinstance(action, argparse._SubParsersAction) and path:  # pylint: disable=protected-access
+            positional_kind = positional_kind or POSITIONAL_KINDS.get((path[0], action.dest))
+
+    children = _subparsers(parser)
+    commands = [(" ".join(path), sorted(children), sorted(options), option_kinds, positional_kind)]
+    for name, child in sorted(children.items()):
+        commands.extend(command_tree(child, path + (name,)))
+    return commands
+
+
+def _words(values):
+    return " ".join(values).replace('"', '\\"')
+
+
+def bash_script(parser, prog="avn", cache_dir=CACHE_DIR, ttl=DEFAULT_TTL):
+    """Generate a bash completion script for the given argument parser"""
+    tree = command_tree(parser)
+    commands_case = []
+    options_case = []
+    option_kinds_case = []
+    positional_case = []
+    for path, children, options, option_kinds, positional_kind in tree:
+        if children:
+            commands_case.append('        "{}") echo "{}" ;;'.format(path, _words(children)))
+        options_case.append('        "{}") echo "{}" ;;'.format(path, _words(options)))
+        for option, kind in sorted(option_kinds.items()):
+            option_kinds_case.append('        "{}|{}") echo {} ;;'.format(path, option, kind))
+        if positional_kind:
+            positional_case.append('        "{}") echo {} ;;'.format(path, positional_kind))
+
+    minutes = max(1, ttl // 60)
+    return BASH_TEMPLATE.format(
+        prog=prog, func="_" + prog.replace("-", "_"), cache_dir=cache_dir, ttl_minutes=minutes,
+        commands_case="\n".join(commands_case), options_case="\n".join(options_case),
+        option_kinds_case="\n".join(option_kinds_case), positional_case="\n".join(positional_case))
+
+
+def zsh_script(parser, prog="avn", cache_dir=CACHE_DIR, ttl=DEFAULT_TTL):
+    """Generate a zsh completion script using zsh's bash completion compatibility"""
+    return "autoload -U +X compinit && compinit\nautoload -U +X bashcompinit && bashcompinit\n" + \
+        bash_script(parser, prog=prog, cache_dir=cache_dir, ttl=ttl)
+
+
+def cache_path(kind, project=None, cache_dir=CACHE_DIR):
+    name = kind if not project else "{}.{}".format(kind, project)
+    return os.path.join(cache_dir, name)
+
+
+def write_values(kind, values, project=None, cache_dir=CACHE_DIR):
+    """Atomically replace the cached values of a kind, one value per line"""
+    fileutil.write_atomic(cache_path(kind, project, cache_dir),
+                          "".join("{}\n".format(value) for value in sorted(set(values))), mode=0o644)
+
+
+def service_type_values(service_types, collect_options):
+    """Return {kind: values} for the cache files derived from a service_types response"""
+    types = []
+    plans = []
+    user_config = {}
+    for service_type, service_def in service_types.items():
+        types.append(service_type)
+        for plan in service_def.get("service_plans", []):
+            types.append("{}:{}".format(service_type, plan["service_plan"]))
+            plans.append(plan["service_plan"])
+        keys = ["{}=".format(key) for key in collect_options(service_def.get("user_config_schema", {}))]
+        user_config["user_config." + service_type] = keys
+        user_config.setdefault("user_config", []).extend(keys)
+    result = {"service_types": types, "plans": plans}
+    result.update(user_config)
+    return result
+
+
+BASH_TEMPLATE = r"""# {prog} shell completion, generated by '{prog} completion script'
+{func}_commands() {{
+    case "$1" in
+{commands_case}
+    esac
+}}
+
+{func}_options() {{
+    case "$1" in
+{options_case}
+    esac
+}}
+
+{func}_option_kind() {{
+    case "$1|$2" in
+{option_kinds_case}
+    esac
+}}
+
+{func}_positional_kind() {{
+    case "$1" in
+{positional_case}
+    esac
+}}
+
+{func}_cached() {{
+    # print cached values, refreshing stale or missing cache files in the background
+    local kind="$1" project="$2" file="{cache_dir}/$1"
+    [ -n "$project" ] && [ "${{kind%%.*}}" = "services" ] && file="$file.$project"
+    if [ ! -f "$file" ] || [ -n "$(find "$file" -mmin +{ttl_minutes} 2>/dev/null)" ]; then
+        ( {prog} completion refresh "${{kind%%.*}}" ${{project:+--project "$project"}} >/dev/null 2>&1 & )
+    fi
+    [ -f "$file" ] && cat "$file"
+}}
+
+{func}() {{
+    local cur="${{COMP_WORDS[COMP_CWORD]}}" prev="${{COMP_WORDS[COMP_CWORD-1]}}"
+    local cmd="" project="" service_type="" word i kind
+    for ((i=1; i < COMP_CWORD; i++)); do
+        word="${{COMP_WORDS[i]}}"
+        case "$word" in
+            --project) project="${{COMP_WORDS[i+1]}}" ;;
+            -t|--service-type) service_type="${{COMP_WORDS[i+1]%%:*}}" ;;
+            -*) ;;
+            *) case " $({func}_commands "$cmd") " in *" $word "*) cmd="${{cmd:+$cmd }}$word" ;; esac ;;
+        esac
+    done
+
+    kind="$({func}_option_kind "$cmd" "$prev")"
+    if [ -z "$kind" ] && [[ "$cur" != -* ]]; then
+        kind="$({func}_positional_kind "$cmd")"
+    fi
+    if [ "$kind" = "user_config" ] && [ -n "$service_type" ]; then
+        kind="user_config.$service_type"
+    fi
+
+    if [ -n "$kind" ]; then
+        COMPREPLY=( $(compgen -W "$({func}_cached "$kind" "$project")" -- "$cur") )
+        [ "${{kind%%.*}}" = "user_config" ] && compopt -o nospace 2>/dev/null
+    elif [[ "$cur" == -* ]]; then
+        COMPREPLY=( $(compgen -W "$({func}_options "$cmd")" -- "$cur") )
+    else
+        COMPREPLY=( $(compgen -W "$({func}_commands "$cmd")" -- "$cur") )
+    fi
+}}
+
+complete -F {func} {prog}
+"""
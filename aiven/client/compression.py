@@ -0,0 +1,117 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""HTTP body compression and transfer size accounting"""
+
+import requests.utils
+import threading
+import zlib
+
+try:
+    import zstandard  # pylint: disable=import-error
+except ImportError:
+    zstandard = None
+
+DEFAULT_THRESHOLD = 1024
+# response encodings requests (via urllib3) is able to decode in this environment
+ACCEPT_ENCODING = requests.utils.default_headers()["Accept-Encoding"]
+
+
+def available_methods():
+    methods = ["gzip"]
+    if zstandard is not None:
+        methods.append("zstd")
+    return methods
+
+
+def compressor(method):
+    """Return a compressobj for the given content-encoding, with compress(data) and flush() methods"""
+    if method == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif method == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' module")
+        return zstandard.ZstdCompressor().compressobj()
+    raise ValueError("Unsupported compression method {!r}, expected one of {}".format(
+        method, ", ".join(available_methods())))
+
+
+def compress(data, method):
+    """Compress a bytes body using the given content-encoding"""
+    obj = compressor(method)
+    return obj.compress(data) + obj.flush()
+
+
+class CompressingReader(object):
+    """Request body compressing a file while it is sent, so that it never is in memory as a whole
+
+    requests sends iterable bodies of unknown length with chunked transfer
+    encoding.  seek() rewinds the file for a resend."""
+    def __init__(self, fp, method, stats, chunk_size=64 * 1024):
+        compressor(method)  # fail early on unsupported methods
+        self.fp = fp
+        self.method = method
+        self.stats = stats
+        self.chunk_size = chunk_size
+        self.recorded = False
+
+    def __iter__(self):
+        obj = compressor(self.method)
+        size = sent = 0
+        while True:
+            data = self.fp.read(self.chunk_size)
+            if not data:
+                break
+            size += len(data)
+            chunk = obj.compress(data)
+            if chunk:
+                sent += len(chunk)
+                yield chunk
+        chunk = obj.flush()
+        sent += len(chunk)
+        if not self.recorded:
+            self.recorded = True
+            self.stats.record_request(size, sent, compressed=True)
+        yield chunk
+
+    def seek(self, offset, whence=0):
+        return self.fp.seek(offset, whence)
+
+
+class TransferStats(object):
+    """Thread-safe counters of HTTP body sizes before and after compression"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.request_bytes = 0
+        self.request_bytes_sent = 0
+        self.compressed_requests = 0
+        self.response_bytes = 0
+        self.response_bytes_received = 0
+        self.compressed_responses = 0
+
+    def record_request(self, size, sent, compressed):
+        with self.lock:
+            self.request_bytes += size
+            self.request_bytes_sent += sent
+            self.compressed_requests += int(compressed)
+
+    def record_response(self, size, received, compressed):
+        with self.lock:
+            self.response_bytes += size
+            self.response_bytes_received += received
+            self.compressed_responses += int(compressed)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "request_bytes": self.request_bytes,
+                "request_bytes_sent": self.request_bytes_sent,
+                "request_bytes_saved": self.request_bytes - self.request_bytes_sent,
+                "compressed_requests": self.compressed_requests,
+                "response_bytes": self.response_bytes,
+                "response_bytes_received": self.response_bytes_received,
+                "response_bytes_saved": self.response_bytes - self.response_bytes_received,
+                "compressed_responses": self.compressed_responses,
+            }
@@ -0,0 +1,136 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Compare configurations of many services
+
+Each service's configuration is flattened into dotted keys such as
+'pg.max_connections'.  Values are interned as integer codes and stored in
+one array per key with a slot per service, so finding the keys that differ,
+the majority value of a key and the services deviating from it or from a
+reference service only compares small integers.
+"""
+
+import array
+import collections
+import json
+
+MISSING = -1
+
+
+def flatten(value, prefix=""):
+    """Return {dotted key: value} for the leaves of nested dicts; lists are leaves"""
+    result = {}
+    for key, item in value.items():
+        name = prefix + key
+        if isinstance(item, dict) and item:
+            result.update(flatten(item, name + "."))
+        else:
+            result[name] = item
+    return result
+
+
+def service_config(service):
+    """Return the compared settings of a service: plan, cloud and the flattened user config"""
+    config = flatten(service.get("user_config") or {})
+    config["plan"] = service.get("plan")
+    config["cloud_name"] = service.get("cloud_name")
+    return config
+
+
+class ConfigMatrix(object):
+    """Column-oriented key by service matrix of configuration values"""
+    def __init__(self):
+        self.services = []
+        self.keys = []
+        self.columns = []
+        self.values = []
+        self._key_index = {}
+        self._value_index = {}
+
+    def _code(self, value):
+        text = json.dumps(value, sort_keys=True)
+        code = self._value_index.get(text)
+        if code is None:
+            code = len(self.values)
+            self._value_index[text] = code
+            self.values.append(value)
+        return code
+
+    def add(self, service, config):
+        """Add the flattened configuration of a service"""
+        slot = len(self.services)
+        self.services.append(service)
+        for column in self.columns:
+            column.append(MISSING)
+        for key, value in config.items():
+            row = self._key_index.get(key)
+            if row is None:
+                row = len(self.keys)
+                self._key_index[key] = row
+                self.keys.append(key)
+                self.columns.append(array.array("l", [MISSING] * (slot + 1)))
+            self.columns[row][slot] = self._code(value)
+
+    def value(self, code):
+        return None if code == MISSING else self.values[code]
+
+    def _sorted_rows(self, rows):
+        return sorted(rows, key=self.keys.__getitem__)
+
+    def differing(self):
+        """Return the keys whose value is not the same for all services, sorted"""
+        return [self.keys[row] for row in self._sorted_rows(
+            row for row, column in enumerate(self.columns) if len(set(column)) > 1)]
+
+    def matrix(self, keys=None):
+        """Return a {"key": key, service: value} dict for each key, by default for the differing keys"""
+        result = []
+        for key in self.differing() if keys is None else keys:
+            row = {"key": key}
+            row.update(zip(self.services, map(self.value, self.columns[self._key_index[key]])))
+            result.append(row)
+        return result
+
+    def outliers(self):
+        """Return the services whose value of a key differs from the value most services have
+
+        Keys without a strict majority value, e.g. one that differs for every
+        service, are reported with a None majority and every service listed."""
+        result = []
+        for row in self._sorted_rows(row for row, column in enumerate(self.columns) if len(set(column)) > 1):
+            column = self.columns[row]
+            counts = collections.Counter(column).most_common(2)
+            majority, majority_count = counts[0]
+            if majority_count == counts[1][1]:
+                majority = None
+            for slot, code in enumerate(column):
+                if code != majority:
+                    result.append({
+                        "key": self.keys[row],
+                        "service": self.services[slot],
+                        "value": self.value(code),
+                        "majority_value": None if majority is None else self.value(majority),
+                        "majority_count": majority_count if majority is not None else None,
+                    })
+        return result
+
+    def drift(self, reference):
+        """Return the values differing from the ones of the reference service"""
+        ref = self.services.index(reference)
+        result = []
+        for row in self._sorted_rows(range(len(self.keys))):
+            column = self.columns[row]
+            expected = column[ref]
+            if column.count(expected) == len(column):
+                continue
+            for slot, code in enumerate(column):
+                if code != expected:
+                    result.append({
+                        "key": self.keys[row],
+                        "service": self.services[slot],
+                        "value": self.value(code),
+                        "reference_value": self.value(expected),
+                    })
+        return result
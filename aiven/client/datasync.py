@@ -0,0 +1,108 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Synchronize a local directory with project data files
+
+Local files are identified by size, mtime and MD5 checksum.  The checksums
+are kept in a manifest under AIVEN_CONFIG_DIR together with the state of
+the remote files as of the last sync, so unchanged files are neither
+re-hashed nor transferred again.
+"""
+
+from aiven.client import envdefault, fileutil
+import hashlib
+import json
+import os
+
+MANIFEST_DIR = os.path.join(envdefault.AIVEN_CONFIG_DIR, "data-sync")
+
+
+def file_md5(path, chunk_size=1024 * 1024):
+    digest = hashlib.md5()
+    with open(path, "rb") as fp:
+        while True:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SyncManifest(object):
+    """Last known state of a local directory and its remote counterpart"""
+    def __init__(self, project, local_dir, manifest_dir=MANIFEST_DIR):
+        key = "{}\0{}".format(project, os.path.abspath(local_dir)).encode("utf-8")
+        self.path = os.path.join(manifest_dir, hashlib.sha1(key).hexdigest() + ".json")
+        self.local = {}
+        self.remote = {}
+        try:
+            with open(self.path) as fp:
+                state = json.load(fp)
+            self.local = state.get("local", {})
+            self.remote = state.get("remote", {})
+        except (IOError, ValueError):
+            pass
+
+    def save(self):
+        fileutil.write_atomic(self.path, json.dumps({"local": self.local, "remote": self.remote}, sort_keys=True))
+
+
+def scan_local(local_dir, manifest):
+    """Return {filename: {"size", "mtime", "md5"}} for regular files in local_dir,
+    reusing checksums from the manifest for files whose size and mtime are unchanged"""
+    files = {}
+    for name in sorted(os.listdir(local_dir)):
+        path = os.path.join(local_dir, name)
+        if name.startswith(".") or not os.path.isfile(path):
+            continue
+        st = os.stat(path)
+        entry = {"size": st.st_size, "mtime": st.st_mtime}
+        known = manifest.local.get(name)
+        if known and known.get("size") == entry["size"] and known.get("mtime") == entry["mtime"]:
+            entry["md5"] = known["md5"]
+        else:
+            entry["md5"] = file_md5(path)
+        files[name] = entry
+    return files
+
+
+def remote_files(listing):
+    """Return {filename: {"size", "md5"}} from a list_data() response"""
+    files = {}
+    for entry in listing.get("files", []):
+        if isinstance(entry, dict):
+            name = entry.get("filename") or entry.get("name")
+            files[name] = {"size": entry.get("size"), "md5": entry.get("md5")}
+        else:
+            files[entry] = {"size": None, "md5": None}
+    return files
+
+
+def _changed(remote, local, synced):
+    """Decide whether the remote and local copies of a file differ"""
+    if remote is None or local is None:
+        return True
+    if remote.get("md5"):
+        return remote["md5"] != local["md5"]
+    if remote.get("size") is not None and remote["size"] != local["size"]:
+        return True
+    # no remote checksum: compare against the content transferred in the last sync
+    return synced is None or synced.get("md5") != local["md5"]
+
+
+def plan_upload(local, remote, manifest, delete=False):
+    """Return (upload, delete) lists of file names"""
+    upload = [name for name in sorted(local)
+              if _changed(remote.get(name), local[name], manifest.remote.get(name))]
+    removed = sorted(set(remote) - set(local)) if delete else []
+    return upload, removed
+
+
+def plan_download(local, remote, manifest, delete=False):
+    """Return (download, delete) lists of file names"""
+    download = [name for name in sorted(remote)
+                if _changed(remote[name], local.get(name), manifest.remote.get(name))]
+    removed = sorted(set(local) - set(remote)) if delete else []
+    return download, removed
@@ -0,0 +1,96 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Latency based selection between several equivalent API endpoints
+
+All endpoints are probed concurrently and requests are sent to the one with
+the lowest measured latency.  Probe results are shared between processes
+through the file cache for the length of the probe interval, so short CLI
+invocations do not pay for probing every time.  An endpoint that fails with
+a connection error is avoided until its cool-down has passed.
+"""
+
+from .parallel import map_concurrently
+import logging
+import threading
+import time
+
+try:
+    string_types = basestring  # pylint: disable=undefined-variable
+except NameError:
+    # python 3.x
+    string_types = str
+
+DEFAULT_PROBE_INTERVAL = 300.0
+DEFAULT_PROBE_TIMEOUT = 2.0
+FAILURE_COOLDOWN = 30.0
+
+
+def parse_urls(value):
+    """Return a list of base urls from a comma separated string or a list"""
+    if isinstance(value, string_types):
+        value = value.split(",")
+    urls = [url.strip().rstrip("/") for url in value if url.strip()]
+    if not urls:
+        raise ValueError("No API endpoint url given")
+    return urls
+
+
+class EndpointSelector(object):
+    def __init__(self, urls, probe, interval=DEFAULT_PROBE_INTERVAL, cache=None, clock=time.time):
+        self.log = logging.getLogger("AivenClient")
+        self.urls = urls
+        self.probe = probe  # probe(url) returns the latency in seconds or raises an exception
+        self.interval = interval
+        self.cache = cache
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.latencies = None
+        self.probed_at = None
+        self.failed_at = {}
+
+    def current(self):
+        """Return the fastest endpoint not in its failure cool-down"""
+        if len(self.urls) == 1:
+            return self.urls[0]
+        with self.lock:
+            now = self.clock()
+            if self.latencies is None or now - self.probed_at > self.interval:
+                self._probe()
+            healthy = [url for url in self.urls if now - self.failed_at.get(url, float("-inf")) > FAILURE_COOLDOWN]
+            if not healthy:
+                # every endpoint failed recently, retry the one that failed longest ago
+                return min(self.urls, key=lambda url: self.failed_at[url])
+            return min(healthy, key=self._sort_key)
+
+    def _sort_key(self, url):
+        latency = self.latencies.get(url)
+        return (latency is None, latency or 0.0, self.urls.index(url))
+
+    def failed(self, url):
+        """Record a connection failure of an endpoint"""
+        with self.lock:
+            self.failed_at[url] = self.clock()
+
+    def _probe(self):
+        cache_key = ["endpoints"] + self.urls
+        if self.cache is not None:
+            cached = self.cache.get(cache_key, max_age=self.interval)
+            if cached is not None:
+                self.latencies, self.probed_at = cached["latencies"], cached["time"]
+                return
+
+        self.latencies = {}
+        for url, latency, ex in map_concurrently(self.probe, self.urls, max_workers=len(self.urls)):
+            if ex is not None:
+                self.log.debug("Endpoint %r is unreachable: %s: %s", url, ex.__class__.__name__, ex)
+            self.latencies[url] = latency
+        self.probed_at = self.clock()
+        self.log.debug("Endpoint latencies: %r", self.latencies)
+        if self.cache is not None:
+            try:
+                self.cache.set(cache_key, {"latencies": self.latencies, "time": self.probed_at})
+            except (IOError, OSError) as ex:
+                self.log.debug("Failed to cache endpoint latencies: %s", ex)
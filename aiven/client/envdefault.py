@@ -14,6 +14,12 @@ AIVEN_CONFIG_DIR = os.environ.get("AIVEN_CONFIG_DIR", os.path.join(os.getenv("HO
 AIVEN_AUTH_TOKEN = os.environ.get("AIVEN_AUTH_TOKEN")
 AIVEN_CA_CERT = os.environ.get("AIVEN_CA_CERT")
 AIVEN_CLIENT_CONFIG = os.environ.get("AIVEN_CLIENT_CONFIG", os.path.join(AIVEN_CONFIG_DIR, "aiven-client.json"))
+AIVEN_CONNECT_TIMEOUT = float(os.environ.get("AIVEN_CONNECT_TIMEOUT", "10"))
 AIVEN_CREDENTIALS_FILE = os.environ.get("AIVEN_CREDENTIALS_FILE", os.path.join(AIVEN_CONFIG_DIR, "aiven-credentials.json"))
+AIVEN_HTTP_POOL_SIZE = int(os.environ.get("AIVEN_HTTP_POOL_SIZE", "10"))
+AIVEN_LOG_FORMAT = os.environ.get("AIVEN_LOG_FORMAT", "text")
+AIVEN_LOG_LEVEL = os.environ.get("AIVEN_LOG_LEVEL", "info")
+AIVEN_PROGRESS = os.environ.get("AIVEN_PROGRESS", "auto")
 AIVEN_PROJECT = os.environ.get("AIVEN_PROJECT")
+AIVEN_READ_TIMEOUT = float(os.environ.get("AIVEN_READ_TIMEOUT", "120"))
 AIVEN_WEB_URL = os.environ.get("AIVEN_WEB_URL")
@@ -0,0 +1,51 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Local cache of JSON values with per-entry timestamps
+
+Every entry is stored in its own file named after a hash of the key and
+replaced atomically, so concurrent avn processes can share the cache.
+"""
+
+from aiven.client import envdefault, fileutil
+import hashlib
+import json
+import os
+import time
+
+CACHE_DIR = os.path.join(envdefault.AIVEN_CONFIG_DIR, "cache")
+
+
+class FileCache(object):
+    def __init__(self, cache_dir=CACHE_DIR, clock=time.time):
+        self.cache_dir = cache_dir
+        self.clock = clock
+
+    def _path(self, key):
+        digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, digest + ".json")
+
+    def _read(self, path):
+        try:
+            with open(path) as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def get(self, key, max_age):
+        """Return the cached value for key if it is at most max_age seconds old, otherwise None"""
+        entry = self._read(self._path(key))
+        if entry is None or self.clock() - entry["time"] > max_age:
+            return None
+        return entry["value"]
+
+    def set(self, key, value):
+        fileutil.write_atomic(self._path(key), json.dumps({"key": key, "time": self.clock(), "value": value}))
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
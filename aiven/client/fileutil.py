@@ -0,0 +1,120 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Helpers for local state files shared by concurrently running avn processes
+
+Files are replaced atomically by writing a uniquely named temporary file in
+the same directory and renaming it over the target, so readers never see a
+partially written file.  Writers that read-modify-write a file serialize
+with an advisory lock on a separate lock file where fcntl is available.
+"""
+
+import contextlib
+import copy
+import errno
+import json
+import os
+import tempfile
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # advisory locking is not available on windows
+
+_replace = getattr(os, "replace", os.rename)  # os.rename does not overwrite files on windows
+_READ_CACHE = {}
+_READ_CACHE_LOCK = threading.Lock()
+
+
+def makedirs(path, mode=0o700):
+    """Create a directory and its parents, tolerating concurrent creation by other processes"""
+    if not path or os.path.isdir(path):
+        return
+    try:
+        os.makedirs(path)
+        os.chmod(path, mode)
+    except OSError as ex:
+        if ex.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+def write_atomic(path, data, mode=0o600):
+    """Replace the contents of path with the string or bytes data"""
+    directory = os.path.dirname(path)
+    makedirs(directory)
+    # hidden temporary names are skipped by directory scans such as datasync.scan_local
+    fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if isinstance(data, bytes) else "w") as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.chmod(tmp_path, mode)
+        _replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold an exclusive advisory lock for writing path"""
+    if fcntl is None:
+        yield
+        return
+    makedirs(os.path.dirname(path))
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # releases the lock
+
+
+def read_json(path):
+    """Return the parsed JSON contents of path, reusing the previous result while the file is unchanged"""
+    with open(path) as fp:
+        st = os.fstat(fp.fileno())
+        version = (getattr(st, "st_mtime_ns", st.st_mtime), st.st_size, st.st_ino)
+        with _READ_CACHE_LOCK:
+            cached = _READ_CACHE.get(path)
+        if cached is None or cached[0] != version:
+            cached = (version, json.load(fp))
+            with _READ_CACHE_LOCK:
+                _READ_CACHE[path] = cached
+    return copy.deepcopy(cached[1])
+
+
+def append_gzip_member(path, data):
+    """Compress data into a gzip member appended to path and return its (offset, length)
+
+    A file of concatenated members is itself a valid gzip file, and every
+    member can be decompressed on its own with read_gzip_member()."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    member = compressor.compress(data) + compressor.flush()
+    makedirs(os.path.dirname(path))
+    with locked(path), open(path, "ab") as fp:
+        fp.seek(0, os.SEEK_END)
+        offset = fp.tell()
+        fp.write(member)
+    return offset, len(member)
+
+
+def read_gzip_member(path, offset, length):
+    with open(path, "rb") as fp:
+        fp.seek(offset)
+        return zlib.decompress(fp.read(length), 16 + zlib.MAX_WBITS)
+
+
+def append_lines(path, lines):
+    """Append lines to a file shared by concurrent writers"""
+    makedirs(os.path.dirname(path))
+    with locked(path), open(path, "a") as fp:
+        fp.write("".join(line + "\n" for line in lines))
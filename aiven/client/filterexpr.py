@@ -0,0 +1,217 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Client-side filter expressions and field projection for list results
+
+Filter expressions compare dotted field paths to values and can be combined
+with 'and', 'or', 'not' and parentheses, e.g.::
+
+    state!=RUNNING and (plan~business-* or user_config.pg_version=9.5)
+
+Supported operators are '=' (or '=='), '!=', '~' and '!~' (shell-style glob
+match), and '<', '<=', '>', '>=' which compare numerically when both sides
+are numbers.  Expressions are compiled once into a predicate function.
+"""
+
+import fnmatch
+import operator
+import re
+
+
+class FilterError(ValueError):
+    """Invalid filter expression"""
+
+
+_TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<paren>[()])
+    | (?P<op>==|!=|!~|<=|>=|=|~|<|>)
+    | "(?P<dquoted>(?:[^"\\]|\\.)*)"
+    | '(?P<squoted>[^']*)'
+    | (?P<word>[^\s()=!~<>"']+)
+    )""", re.VERBOSE)
+
+_ORDERING_OPS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+_KEYWORDS = {"and", "or", "not"}
+_MISSING = object()
+
+
+def _tokenize(text):
+    pos = 0
+    tokens = []
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise FilterError("Invalid filter expression at offset {}: {!r}".format(pos, text[pos:]))
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "dquoted":
+            kind, value = "value", re.sub(r"\\(.)", r"\1", value)
+        elif kind == "squoted":
+            kind = "value"
+        elif kind == "word" and value.lower() in _KEYWORDS:
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+    return tokens
+
+
+def get_path(item, path):
+    """Look up a dotted path such as 'user_config.pg_version' from nested dicts"""
+    value = item
+    for part in path:
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(part, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _as_text(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "null"
+    return str(value)
+
+
+def _as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _comparison(field, op, expected):
+    path = field.split(".")
+    if op in ("=", "=="):
+        def match(item):
+            value = get_path(item, path)
+            return value is not _MISSING and _as_text(value) == expected
+    elif op == "!=":
+        def match(item):
+            value = get_path(item, path)
+            return value is _MISSING or _as_text(value) != expected
+    elif op in ("~", "!~"):
+        regex = re.compile(fnmatch.translate(expected))
+        negate = op == "!~"
+
+        def match(item):
+            value = get_path(item, path)
+            return (value is not _MISSING and regex.match(_as_text(value)) is not None) != negate
+    else:
+        compare = _ORDERING_OPS[op]
+        expected_number = _as_number(expected)
+
+        def match(item):
+            value = get_path(item, path)
+            if value is _MISSING:
+                return False
+            number = _as_number(value)
+            if number is not None and expected_number is not None:
+                return compare(number, expected_number)
+            return compare(_as_text(value), expected)
+    return match
+
+
+class _Parser(object):
+    def __init__(self, text):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, kind, value=None):
+        token = self.peek()
+        if token[0] != kind or (value is not None and token[1] != value):
+            found = repr(token[1]) if token[0] else "end of expression"
+            raise FilterError("Invalid filter expression {!r}: expected {}, found {}".format(
+                self.text, value or kind, found))
+        self.pos += 1
+        return token[1]
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterError("Empty filter expression")
+        predicate = self.parse_or()
+        if self.pos != len(self.tokens):
+            raise FilterError("Invalid filter expression {!r}: unexpected {!r}".format(self.text, self.peek()[1]))
+        return predicate
+
+    def parse_or(self):
+        terms = [self.parse_and()]
+        while self.peek() == ("keyword", "or"):
+            self.pos += 1
+            terms.append(self.parse_and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda item: any(term(item) for term in terms)
+
+    def parse_and(self):
+        terms = [self.parse_not()]
+        while self.peek() == ("keyword", "and"):
+            self.pos += 1
+            terms.append(self.parse_not())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda item: all(term(item) for term in terms)
+
+    def parse_not(self):
+        if self.peek() == ("keyword", "not"):
+            self.pos += 1
+            term = self.parse_not()
+            return lambda item: not term(item)
+        if self.peek() == ("paren", "("):
+            self.pos += 1
+            term = self.parse_or()
+            self.take("paren", ")")
+            return term
+        field = self.take("word")
+        op = self.take("op")
+        kind, value = self.peek()
+        if kind not in ("word", "value", "keyword"):
+            self.take("value")
+        self.pos += 1
+        return _comparison(field, op, value)
+
+
+def compile_filter(text):
+    """Compile a filter expression into a predicate taking a result dict"""
+    return _Parser(text).parse()
+
+
+def parse_fields(text):
+    """Parse a comma separated list of dotted field names"""
+    fields = [field.strip() for field in text.split(",") if field.strip()]
+    if not fields:
+        raise FilterError("Empty field list")
+    return fields
+
+
+def project(item, fields):
+    """Return a copy of `item` with only the given dotted fields
+
+    A field ending in '.*' selects the whole sub-object under it."""
+    result = {}
+    for field in fields:
+        path = field.split(".")
+        if path[-1] == "*":
+            path = path[:-1]
+        value = get_path(item, path)
+        if value is _MISSING:
+            continue
+        target = result
+        for part in path[:-1]:
+            target = target.setdefault(part, {})
+        target[path[-1]] = value
+    return result
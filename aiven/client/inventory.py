@@ -0,0 +1,154 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Local SQLite snapshot of projects, services, project users and cards
+
+Every entity is stored with a few commonly queried columns and its full JSON
+representation in the 'raw' column, which can be queried with SQLite's JSON
+functions.  Syncing a list compares each entity's version, a hash of its
+JSON, with the stored one and only writes the rows that were added, changed
+or removed.
+"""
+
+from aiven.client import envdefault, fileutil
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+INVENTORY_PATH = os.path.join(envdefault.AIVEN_CONFIG_DIR, "inventory.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    project_name TEXT PRIMARY KEY, default_cloud TEXT, card_id TEXT,
+    version TEXT, raw TEXT, synced_at REAL);
+CREATE TABLE IF NOT EXISTS services (
+    project TEXT, service_name TEXT, service_type TEXT, state TEXT, plan TEXT, cloud_name TEXT,
+    service_uri TEXT, user_config TEXT, create_time TEXT, update_time TEXT,
+    version TEXT, raw TEXT, synced_at REAL, PRIMARY KEY (project, service_name));
+CREATE INDEX IF NOT EXISTS services_plan_cloud ON services (plan, cloud_name);
+CREATE TABLE IF NOT EXISTS project_users (
+    project TEXT, user_email TEXT, member_type TEXT, create_time TEXT,
+    version TEXT, raw TEXT, synced_at REAL, PRIMARY KEY (project, user_email));
+CREATE TABLE IF NOT EXISTS cards (
+    card_id TEXT PRIMARY KEY, name TEXT, country TEXT, exp_month INTEGER, exp_year INTEGER, last4 TEXT,
+    version TEXT, raw TEXT, synced_at REAL);
+"""
+
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True)
+
+
+def _version(raw):
+    # not update_time: the API does not change it on every state, plan or node change
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def project_row(project):
+    raw = _dumps(project)
+    payment_info = project.get("payment_info") or {}
+    return {"project_name": project["project_name"], "default_cloud": project.get("default_cloud"),
+            "card_id": payment_info.get("card_id"), "version": _version(raw), "raw": raw}
+
+
+def service_row(project, service):
+    raw = _dumps(service)
+    return {"project": project, "service_name": service["service_name"], "service_type": service.get("service_type"),
+            "state": service.get("state"), "plan": service.get("plan"), "cloud_name": service.get("cloud_name"),
+            "service_uri": service.get("service_uri"), "user_config": _dumps(service.get("user_config") or {}),
+            "create_time": service.get("create_time"), "update_time": service.get("update_time"),
+            "version": _version(raw), "raw": raw}
+
+
+def user_row(project, user):
+    raw = _dumps(user)
+    return {"project": project, "user_email": user["user_email"], "member_type": user.get("member_type"),
+            "create_time": user.get("create_time"), "version": _version(raw), "raw": raw}
+
+
+def card_row(card):
+    raw = _dumps(card)
+    return {"card_id": card["card_id"], "name": card.get("name"), "country": card.get("country"),
+            "exp_month": card.get("exp_month"), "exp_year": card.get("exp_year"), "last4": card.get("last4"),
+            "version": _version(raw), "raw": raw}
+
+
+class Inventory(object):
+    def __init__(self, path=INVENTORY_PATH, clock=time.time):
+        fileutil.makedirs(os.path.dirname(path))
+        # rows include service URIs and passwords; SQLite gives its journal files the same permissions
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(path, 0o600)  # also for databases created before permissions were restricted
+        self.path = path
+        self.clock = clock
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def sync(self, table, key_columns, rows, scope=None):
+        """Make the rows of table within scope match rows, writing only the changed ones
+
+        `scope` is a {column: value} dict limiting which stored rows the new
+        rows replace, e.g. the services of a single project.  Returns counts
+        of added, updated, removed and unchanged rows."""
+        scope = scope or {}
+        where = " AND ".join("{} = ?".format(column) for column in sorted(scope)) or "1"
+        scope_values = [scope[column] for column in sorted(scope)]
+        stored = {}
+        for row in self.db.execute("SELECT {}, version FROM {} WHERE {}".format(
+                ", ".join(key_columns), table, where), scope_values):
+            stored[tuple(row[:-1])] = row[-1]
+
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        now = self.clock()
+        with self.db:
+            for row in rows:
+                key = tuple(row[column] for column in key_columns)
+                version = stored.pop(key, None)
+                if version == row["version"]:
+                    counts["unchanged"] += 1
+                    continue
+                counts["updated" if version is not None else "added"] += 1
+                columns = sorted(row) + ["synced_at"]
+                self.db.execute("INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(
+                    table, ", ".join(columns), ", ".join("?" for _ in columns)), [row[c] for c in columns[:-1]] + [now])
+            for key in stored:
+                counts["removed"] += 1
+                self.db.execute("DELETE FROM {} WHERE {}".format(
+                    table, " AND ".join("{} = ?".format(column) for column in key_columns)), key)
+        return counts
+
+    def sync_projects(self, projects):
+        counts = self.sync("projects", ["project_name"], [project_row(project) for project in projects])
+        # forget everything belonging to projects that no longer exist
+        with self.db:
+            for table in ["services", "project_users"]:
+                self.db.execute("DELETE FROM {} WHERE project NOT IN (SELECT project_name FROM projects)".format(table))
+        return counts
+
+    def sync_services(self, project, services):
+        return self.sync("services", ["project", "service_name"], [service_row(project, s) for s in services],
+                         scope={"project": project})
+
+    def sync_project_users(self, project, users):
+        return self.sync("project_users", ["project", "user_email"], [user_row(project, u) for u in users],
+                         scope={"project": project})
+
+    def sync_cards(self, cards):
+        return self.sync("cards", ["card_id"], [card_row(card) for card in cards])
+
+    def query(self, sql, params=()):
+        """Run a read-only query, returning its column names and a list of {column: value} dicts"""
+        self.db.execute("PRAGMA query_only = ON")
+        try:
+            cursor = self.db.execute(sql, params)
+            columns = [description[0] for description in cursor.description or []]
+            return columns, [dict(zip(columns, row)) for row in cursor]
+        finally:
+            self.db.execute("PRAGMA query_only = OFF")
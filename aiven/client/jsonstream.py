@@ -0,0 +1,159 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Incremental decoding of a list inside a JSON object
+
+ArrayScanner is fed the response body in chunks as they arrive from the
+network and yields the elements of the array stored under a top-level key
+one at a time, so only a single element needs to be kept in memory.  The
+scanner only tracks nesting depth and string boundaries; the elements
+themselves are decoded with the json module, or with the decode function
+given to the scanner, which receives the JSON text of each element.
+"""
+
+import codecs
+import json
+import re
+
+_SPECIAL_RE = re.compile(r'["\[\]{},:]')
+
+
+class StreamError(ValueError):
+    """Malformed or truncated JSON stream"""
+
+
+class ArrayScanner(object):
+    def __init__(self, key, capture=(), decode=None):
+        self.key = key
+        self.decode_item = decode
+        self.capture = set(capture)
+        self.captured = {}
+        self.found = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start = None
+        self._last_string = None
+        self._current_key = None
+        self._in_array = False
+        self._item_start = None
+        self._capture_start = None
+        self._done = False
+
+    def feed(self, data):
+        """Add a chunk of the body, returning the list of array elements completed by it"""
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        self._buf += data
+        items = self._scan()
+        self._compact()
+        return items
+
+    def close(self):
+        """Signal the end of the body; raise StreamError if it was incomplete"""
+        self.feed(self._decoder.decode(b"", final=True))
+        if self._depth != 0 or self._in_string or not self._done:
+            raise StreamError("Truncated JSON response")
+
+    def _compact(self):
+        keep = self._pos
+        for start in (self._item_start, self._capture_start, self._string_start):
+            if start is not None:
+                keep = min(keep, start)
+        if keep:
+            self._buf = self._buf[keep:]
+            self._pos -= keep
+            if self._item_start is not None:
+                self._item_start -= keep
+            if self._capture_start is not None:
+                self._capture_start -= keep
+            if self._string_start is not None:
+                self._string_start -= keep
+
+    def _decode(self, start, end):
+        try:
+            return json.loads(self._buf[start:end])
+        except ValueError as ex:
+            raise StreamError("Invalid JSON in response: {}".format(ex))
+
+    def _item(self, start, end):
+        if self.decode_item is None:
+            return self._decode(start, end)
+        try:
+            return self.decode_item(self._buf[start:end])
+        except ValueError as ex:
+            raise StreamError("Invalid JSON in response: {}".format(ex))
+
+    def _scan(self):  # pylint: disable=too-many-statements
+        items = []
+        buf = self._buf
+        pos = self._pos
+        length = len(buf)
+        while pos < length:
+            if self._in_string:
+                quote = buf.find('"', pos)
+                backslash = buf.find("\\", pos, quote if quote >= 0 else length)
+                if backslash >= 0:
+                    if backslash + 1 >= length:
+                        break  # need the escaped character
+                    pos = backslash + 2
+                    continue
+                if quote < 0:
+                    pos = length
+                    break
+                pos = quote + 1
+                self._in_string = False
+                if self._depth == 1:
+                    self._last_string = self._decode(self._string_start, pos)
+                self._string_start = None
+                continue
+
+            match = _SPECIAL_RE.search(buf, pos)
+            if not match:
+                pos = length
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos - 1
+            elif char == ":":
+                if self._depth == 1:
+                    self._current_key = self._last_string
+                    if self._current_key in self.capture:
+                        self._capture_start = pos
+            elif char in "[{":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._current_key == self.key and not self.found:
+                    self.found = True
+                    self._in_array = True
+                    self._item_start = pos
+            elif char == ",":
+                if self._in_array and self._depth == 2:
+                    items.append(self._item(self._item_start, pos - 1))
+                    self._item_start = pos
+                elif self._depth == 1:
+                    self._end_capture(pos - 1)
+            else:  # closing bracket or brace
+                if self._in_array and self._depth == 2:
+                    if buf[self._item_start:pos - 1].strip():
+                        items.append(self._item(self._item_start, pos - 1))
+                    self._in_array = False
+                    self._item_start = None
+                self._depth -= 1
+                if self._depth == 0:
+                    self._end_capture(pos - 1)
+                    self._done = True
+                elif self._depth < 0:
+                    raise StreamError("Unbalanced JSON in response")
+        self._pos = pos
+        return items
+
+    def _end_capture(self, end):
+        if self._capture_start is not None:
+            self.captured[self._current_key] = self._decode(self._capture_start, end)
+            self._capture_start = None
@@ -0,0 +1,119 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Local archive of project log entries
+
+The API only returns the latest entries, so `avn logs --archive` fetches
+them periodically and appends the ones not archived yet as a batch: a gzip
+member in a per-day segment file, plus an index line with the time range,
+segment and byte range of the batch.  Searches read the index to find the
+batches overlapping the requested period and only decompress those.
+"""
+
+from aiven.client import fileutil
+import calendar
+import hashlib
+import json
+import os
+import time
+
+INDEX_NAME = "index.jsonl"
+ENTRY_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+TAIL_READ_SIZE = 64 * 1024
+
+
+def entry_time(value):
+    """Return the unix timestamp of a log entry time such as '2016-01-31T12:00:00.123456Z'"""
+    main, _, fraction = value.rstrip("Z").partition(".")
+    seconds = float(calendar.timegm(time.strptime(main, ENTRY_TIME_FORMAT)))
+    return seconds + float("0." + fraction) if fraction else seconds
+
+
+def _entry_id(entry):
+    return hashlib.sha1(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class LogArchive(object):
+    def __init__(self, path, project):
+        self.path = os.path.join(path, project)
+        self.index_path = os.path.join(self.path, INDEX_NAME)
+
+    def batches(self, since=None, until=None):
+        """Return the index entries of batches overlapping the period, oldest first"""
+        result = []
+        try:
+            with open(self.index_path) as fp:
+                for line in fp:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        continue  # partially written line of an interrupted append
+                    if (since is None or batch["end"] >= since) and (until is None or batch["start"] <= until):
+                        result.append(batch)
+        except IOError:
+            if os.path.exists(self.index_path):
+                raise
+        return result
+
+    def last_batch(self):
+        """Return the index entry of the most recently archived batch, or None"""
+        try:
+            with open(self.index_path, "rb") as fp:
+                fp.seek(0, os.SEEK_END)
+                fp.seek(max(0, fp.tell() - TAIL_READ_SIZE))
+                lines = fp.read().decode("utf-8").splitlines()
+        except IOError:
+            if os.path.exists(self.index_path):
+                raise
+            return None
+        for line in reversed(lines):
+            try:
+                return json.loads(line)
+            except ValueError:
+                continue
+        return None
+
+    def append(self, entries):
+        """Archive the entries that are newer than the ones already archived and return their count"""
+        entries = sorted(((entry_time(entry["time"]), entry) for entry in entries), key=lambda item: item[0])
+        # appends by concurrent processes must see each other's last batch
+        with fileutil.locked(os.path.join(self.path, "archive")):
+            last = self.last_batch()
+            if last is not None:
+                seen = set(last["last_ids"])
+                entries = [(timestamp, entry) for timestamp, entry in entries
+                           if timestamp > last["end"] or (timestamp == last["end"] and _entry_id(entry) not in seen)]
+            if not entries:
+                return 0
+
+            start, end = entries[0][0], entries[-1][0]
+            segment = time.strftime("%Y%m%d.gz", time.gmtime(start))
+            data = json.dumps([entry for _, entry in entries]).encode("utf-8")
+            offset, length = fileutil.append_gzip_member(os.path.join(self.path, segment), data)
+            batch = {"segment": segment, "offset": offset, "length": length, "count": len(entries),
+                     "start": start, "end": end,
+                     "last_ids": [_entry_id(entry) for timestamp, entry in entries if timestamp == end]}
+            fileutil.append_lines(self.index_path, [json.dumps(batch, sort_keys=True)])
+        return len(entries)
+
+    def search(self, since=None, until=None, match=None, text=None):
+        """Yield archived entries of the period whose message satisfies match(msg), oldest first
+
+        `text` is an optional substring every match contains, used to skip
+        batches without decoding them."""
+        escaped = json.dumps(text)[1:-1] if text is not None else None
+        for batch in self.batches(since, until):
+            data = fileutil.read_gzip_member(os.path.join(self.path, batch["segment"]), batch["offset"],
+                                             batch["length"]).decode("utf-8")
+            if escaped is not None and escaped not in data:
+                continue
+            for entry in json.loads(data):
+                timestamp = entry_time(entry["time"])
+                if since is not None and timestamp < since:
+                    continue
+                if until is not None and timestamp > until:
+                    break
+                if match is None or match(entry.get("msg", "")):
+                    yield entry
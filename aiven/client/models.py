@@ -0,0 +1,215 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Typed API results with a small memory footprint
+
+Model instances use __slots__ and hold only the top-level fields listed in
+FIELDS as Python values.  Heavy sub-objects listed in LAZY, and any fields
+the model does not know about, are kept as their raw JSON text until they
+are first accessed; a LAZY member is then decoded once and the result kept.
+from_json() creates an instance directly from an object's JSON text,
+skipping over the text of nested objects and arrays without decoding them;
+it is used as the element decoder of streamed list responses.
+"""
+
+import json
+import re
+
+_DECODER = json.JSONDecoder()
+_OBJECT_START_RE = re.compile(r"[ \t\n\r]*{[ \t\n\r]*(}?)")
+_MEMBER_RE = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"[ \t\n\r]*:[ \t\n\r]*')
+_SEPARATOR_RE = re.compile(r"[ \t\n\r]*([,}])[ \t\n\r]*")
+
+# text up to the next bracket outside strings, and that bracket
+_NESTED_TOKEN_RE = re.compile(r'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*([\[\]{}])')
+
+
+def _skip_nested(text, pos):
+    """Return the end position of the object or array starting at pos"""
+    depth = 0
+    match = _NESTED_TOKEN_RE.match
+    while True:
+        token = match(text, pos)
+        if token is None:
+            raise ValueError("Unterminated object or array at position {}".format(pos))
+        pos = token.end()
+        if token.group(1) in "[{":
+            depth += 1
+        else:
+            depth -= 1
+            if not depth:
+                return pos
+
+
+def split_object(text, decode=None):
+    """Return {key: (value, raw JSON text of value)} for the members of a JSON object
+
+    Objects and arrays of members not listed in `decode` are only scanned for
+    their extent and returned with a None value; by default every member is
+    decoded."""
+    members = {}
+    start = _OBJECT_START_RE.match(text)
+    if start is None:
+        raise ValueError("Expected a JSON object")
+    pos = start.end()
+    if start.group(1):
+        return members
+    while True:
+        member = _MEMBER_RE.match(text, pos)
+        if member is None:
+            raise ValueError("Expected a member name at position {}".format(pos))
+        key = member.group(1)
+        if "\\" in key:
+            key = json.loads('"' + key + '"')
+        pos = member.end()
+        if decode is not None and key not in decode and text[pos:pos + 1] in ("{", "["):
+            value, end = None, _skip_nested(text, pos)
+        else:
+            value, end = _DECODER.raw_decode(text, pos)
+        members[key] = (value, text[pos:end])
+        separator = _SEPARATOR_RE.match(text, end)
+        if separator is None:
+            raise ValueError("Expected ',' or '}}' at position {}".format(end))
+        if separator.group(1) == "}":
+            return members
+        pos = separator.end()
+
+
+def _slots(fields, lazy):
+    return tuple(fields) + tuple("_" + name for name in lazy)
+
+
+def _lazy_property(index, name):
+    slot = "_" + name
+    bit = 1 << index
+
+    def get(self):
+        value = getattr(self, slot)
+        if value is not None and not self._decoded & bit:  # pylint: disable=protected-access
+            value = json.loads(value)
+            setattr(self, slot, value)
+            self._decoded |= bit  # pylint: disable=protected-access
+        return value
+    return property(get, doc="{!r}, decoded on first access".format(name))
+
+
+def model(cls):
+    """Class decorator adding properties that decode the LAZY fields of a Model subclass"""
+    for index, name in enumerate(cls.LAZY):
+        setattr(cls, name, _lazy_property(index, name))
+    return cls
+
+
+class Model(object):
+    # _decoded has a bit set for each LAZY member holding its decoded value instead of JSON text,
+    # _nulls names the FIELDS and LAZY members that were present with a null value
+    __slots__ = ("_extra", "_decoded", "_nulls")
+    FIELDS = ()
+    LAZY = ()
+
+    def __init__(self, **fields):
+        self._nulls = tuple(name for name in self.FIELDS + self.LAZY if name in fields and fields[name] is None)
+        for name in self.FIELDS:
+            setattr(self, name, fields.pop(name, None))
+        for name in self.LAZY:
+            setattr(self, "_" + name, fields.pop(name, None))
+        self._decoded = (1 << len(self.LAZY)) - 1
+        self._extra = {name: json.dumps(value) for name, value in fields.items()}
+
+    @classmethod
+    def from_dict(cls, value):
+        return cls(**value)
+
+    @classmethod
+    def from_json(cls, text):
+        """Create an instance from the JSON text of an object, decoding only the eager FIELDS"""
+        self = cls.__new__(cls)
+        members = split_object(text, decode=cls.FIELDS)
+        nulls = []
+        for name in cls.FIELDS:
+            value, raw = members.pop(name, (None, None))
+            setattr(self, name, value)
+            if raw == "null":
+                nulls.append(name)
+        for name in cls.LAZY:
+            _, raw = members.pop(name, (None, None))
+            if raw == "null":
+                nulls.append(name)
+                raw = None
+            setattr(self, "_" + name, raw)
+        self._decoded = 0
+        self._nulls = tuple(nulls)
+        self._extra = {name: raw for name, (_, raw) in members.items()}
+        return self
+
+    def get(self, name, default=None):
+        """Return any field of the result, including ones the model has no attribute for"""
+        if name in self.FIELDS or name in self.LAZY:
+            value = getattr(self, name)
+            return default if value is None else value
+        raw = self._extra.get(name)
+        return default if raw is None else json.loads(raw)
+
+    def to_dict(self):
+        """Return the fully decoded result as returned by the untyped client methods
+
+        Decoded LAZY members are shared with the instance rather than copied."""
+        result = {name: json.loads(raw) for name, raw in self._extra.items()}
+        for name in self.FIELDS + self.LAZY:
+            value = getattr(self, name)
+            if value is not None or name in self._nulls:
+                result[name] = value
+        return result
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, ", ".join(
+            "{}={!r}".format(name, getattr(self, name)) for name in self.FIELDS[:1]))
+
+
+@model
+class Service(Model):
+    FIELDS = ("service_name", "service_type", "state", "plan", "cloud_name", "group_name", "node_count",
+              "service_uri", "create_time", "update_time")
+    LAZY = ("user_config", "service_uri_params", "connection_info", "components", "backups", "metadata",
+            "users", "acl", "databases", "topics")
+    __slots__ = _slots(FIELDS, LAZY)
+
+
+@model
+class Project(Model):
+    FIELDS = ("project_name", "default_cloud", "country_code", "estimated_balance", "vat_id")
+    LAZY = ("payment_info", "billing_address", "copy_from_project")
+    __slots__ = _slots(FIELDS, LAZY)
+
+    @property
+    def card_id(self):
+        payment_info = self.payment_info  # pylint: disable=no-member
+        return payment_info.get("card_id") if payment_info else None
+
+
+@model
+class Plan(Model):
+    FIELDS = ("service_type", "service_plan", "description", "max_memory_percent", "node_count", "disk_space_mb")
+    LAZY = ("regions",)
+    __slots__ = _slots(FIELDS, LAZY)
+
+
+@model
+class ServiceType(Model):
+    FIELDS = ("description", "latest_available_version", "default_version")
+    LAZY = ("service_plans", "user_config_schema")
+    __slots__ = _slots(FIELDS, LAZY)
+
+    @property
+    def plans(self):
+        return [Plan.from_dict(plan) for plan in self.service_plans or []]  # pylint: disable=no-member
+
+
+@model
+class QueryStat(Model):
+    FIELDS = ("query", "calls", "total_time", "mean_time", "min_time", "max_time", "stddev_time", "rows",
+              "dbid", "userid", "queryid", "shared_blks_hit", "shared_blks_read", "local_blks_read",
+              "temp_blks_read", "blk_read_time", "blk_write_time")
+    __slots__ = _slots(FIELDS, ())
@@ -0,0 +1,52 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Run independent API calls concurrently using a bounded set of worker threads"""
+
+import threading
+
+try:
+    import queue
+except ImportError:
+    # python 2.x
+    import Queue as queue  # pylint: disable=import-error
+
+DEFAULT_WORKERS = 8
+
+
+def map_concurrently(func, items, max_workers=DEFAULT_WORKERS, progress=None):
+    """Call func(item) for every item using up to max_workers threads
+
+    Returns a list of (item, result, exception) tuples in the order of
+    the input items.  Exceptions raised by func are captured per item so
+    that a single failing call does not abort the whole batch.  Completed
+    items are reported to the optional progress.Progress instance."""
+    items = list(items)
+    results = [None] * len(items)
+    work = queue.Queue()
+    for index, item in enumerate(items):
+        work.put((index, item))
+
+    def worker():
+        while True:
+            try:
+                index, item = work.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = (item, func(item), None)
+            except Exception as ex:  # pylint: disable=broad-except
+                results[index] = (item, None, ex)
+            if progress is not None:
+                progress.done(failed=results[index][2] is not None)
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, min(max_workers, len(items))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results
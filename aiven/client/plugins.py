@@ -0,0 +1,202 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Discovery of CLI plugins registered as setuptools entry points
+
+Plugins are CommandLineTool classes registered in the 'aiven.client.plugins'
+entry point group.  The command names and top-level options of every plugin
+are recorded in a manifest file the first time a plugin set is seen, so a
+plugin module only needs to be imported when the command line refers to one
+of its commands or options.  The manifest is rebuilt whenever the set of
+installed plugins, their versions or the size or modification time of their
+module files change, as distribution versions are not known for every
+plugin; plugins that fail to load are not recorded and are retried on every
+run.
+"""
+
+from aiven.client import argx, envdefault, fileutil
+import argparse
+import importlib
+import json
+import logging
+import os
+
+ENTRY_POINT_GROUP = "aiven.client.plugins"
+# plugins shipped as modules before entry point discovery existed
+LEGACY_PLUGINS = [("admin", "aiven.admin.plugin:ClientPlugin")]
+MANIFEST_PATH = os.path.join(envdefault.AIVEN_CONFIG_DIR, "plugins.json")
+MANIFEST_VERSION = 2
+
+
+def entry_points(group=ENTRY_POINT_GROUP):
+    """Return a sorted list of (name, "module:attr", distribution version) of installed entry points"""
+    try:
+        from importlib import metadata  # pylint: disable=no-name-in-module
+    except ImportError:
+        metadata = None
+    if metadata is not None:
+        eps = metadata.entry_points()
+        eps = eps.select(group=group) if hasattr(eps, "select") else eps.get(group, [])
+        return sorted((ep.name, ep.value, getattr(getattr(ep, "dist", None), "version", None)) for ep in eps)
+
+    try:
+        import pkg_resources
+    except ImportError:
+        return []
+    return sorted((ep.name, "{}:{}".format(ep.module_name, ".".join(ep.attrs)), ep.dist.version if ep.dist else None)
+                  for ep in pkg_resources.iter_entry_points(group))
+
+
+def _find_module(module_name):
+    """Return whether a module exists and its file if it has one, without importing the module"""
+    try:
+        from importlib.util import find_spec  # pylint: disable=no-name-in-module,import-error
+    except ImportError:
+        # python 2.x
+        from pkgutil import find_loader
+        try:
+            loader = find_loader(module_name)
+        except ImportError:
+            return False, None
+        return loader is not None, loader.get_filename() if hasattr(loader, "get_filename") else None
+    try:
+        spec = find_spec(module_name)
+    except ImportError:
+        return False, None
+    return spec is not None, spec.origin if spec is not None else None
+
+
+def _module_exists(module_name):
+    return _find_module(module_name)[0]
+
+
+def _module_stamp(module_name):
+    """Return [size, mtime] of a module's file, None if it has none"""
+    path = _find_module(module_name)[1]
+    try:
+        st = os.stat(path)
+    except (TypeError, OSError):
+        return None
+    return [st.st_size, st.st_mtime]
+
+
+def load(value):
+    """Import and return the plugin class referred to by a "module:attr" entry point value"""
+    module_name, _, attrs = value.partition(":")
+    obj = importlib.import_module(module_name)
+    for attr in attrs.split(".") if attrs else ["ClientPlugin"]:
+        obj = getattr(obj, attr)
+    return obj
+
+
+def describe(tool):
+    """Return the commands and top-level options a CommandLineTool instance adds"""
+    commands = {}
+
+    def collect(func):
+        commands[func.__name__] = func.__doc__
+
+    tool.add_cmds(collect)
+    parser = argparse.ArgumentParser(add_help=False)
+    tool.add_args(parser)
+    options = sorted(option for action in parser._actions  # pylint: disable=protected-access
+                     for option in action.option_strings)
+    return {"commands": commands, "options": options}
+
+
+def _stub(func_name, doc, plugin_name):
+    def stub():
+        raise argx.UserError("Command provided by plugin {!r} could not be loaded".format(plugin_name))
+    stub.__name__ = str(func_name)
+    stub.__doc__ = doc or "Provided by plugin {}".format(plugin_name)
+    return stub
+
+
+class PluginRegistry(object):
+    def __init__(self, manifest_path=MANIFEST_PATH, group=ENTRY_POINT_GROUP, legacy=None):
+        self.manifest_path = manifest_path
+        self.group = group
+        self.legacy = LEGACY_PLUGINS if legacy is None else legacy
+        self.log = logging.getLogger("avn.plugins")
+
+    def available(self):
+        """Return a sorted list of (name, "module:attr", version, [size, mtime]) of the installed plugins"""
+        plugins = entry_points(self.group)
+        names = set(plugin[0] for plugin in plugins)
+        for name, value in self.legacy:
+            if name not in names and _module_exists(value.partition(":")[0]):
+                plugins.append((name, value, None))
+        return sorted(plugin + (_module_stamp(plugin[1].partition(":")[0]),) for plugin in plugins)
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_manifest(self, manifest):
+        try:
+            fileutil.write_atomic(self.manifest_path, json.dumps(manifest, indent=4, sort_keys=True), mode=0o644)
+        except (IOError, OSError) as ex:
+            self.log.warning("Failed to write plugin manifest %r: %s", self.manifest_path, ex)
+
+    def manifest(self):
+        """Return the cached plugin manifest, describing the plugins missing from it
+
+        Plugins that fail to load are reported in the returned manifest but
+        not stored, so they are retried on the next run.  The file is only
+        written when it changes, and never when no plugins are installed."""
+        available = [list(plugin) for plugin in self.available()]
+        manifest = {"version": MANIFEST_VERSION, "available": available, "plugins": {}}
+        if not available:
+            return manifest
+
+        stored = self._read_manifest()
+        if stored and stored.get("version") == MANIFEST_VERSION and stored.get("available") == available:
+            manifest["plugins"].update(stored["plugins"])
+
+        failed = {}
+        for name, value, _, _ in available:
+            if name in manifest["plugins"]:
+                continue
+            try:
+                entry = describe(load(value)())
+            except Exception as ex:  # pylint: disable=broad-except
+                self.log.warning("Failed to load plugin %r from %r: %s: %s", name, value, ex.__class__.__name__, ex)
+                failed[name] = {"commands": {}, "options": [], "error": str(ex), "entry_point": value}
+                continue
+            entry["entry_point"] = value
+            manifest["plugins"][name] = entry
+
+        if manifest != stored and manifest["plugins"]:
+            self._write_manifest(manifest)
+        manifest["plugins"].update(failed)
+        return manifest
+
+    @staticmethod
+    def wanted(entry, argv):
+        """Is a plugin needed to parse the given command line"""
+        for option in entry["options"]:
+            if any(word == option or word.startswith(option + "=") for word in argv):
+                return True
+        words = [word for word in argv if not word.startswith("-")]
+        for func_name in entry["commands"]:
+            cmd = argx.command_words(func_name)
+            for pos in range(len(words) - len(cmd) + 1):
+                if words[pos:pos + len(cmd)] == cmd:
+                    return True
+        return False
+
+    def extend(self, tool, argv):
+        """Load the plugins a command line refers to and add placeholders for the commands of the others"""
+        for name, entry in sorted(self.manifest()["plugins"].items()):
+            if entry.get("error"):
+                continue
+            if self.wanted(entry, argv):
+                tool.extend_commands(load(entry["entry_point"])())
+            else:
+                for func_name, doc in sorted(entry["commands"].items()):
+                    tool.add_cmd(_stub(func_name, doc, name))
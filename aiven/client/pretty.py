@@ -9,29 +9,94 @@ from __future__ import print_function
 import datetime
 import fnmatch
 import json
+import re
+import sys
+
+# characters json.dumps() escapes with its default ensure_ascii=True
+_JSON_ESCAPED_RE = re.compile(r'[^ -~]|["\\]')
+# number of table lines written to the output at a time
+WRITE_BATCH = 1000
 
 
 def format_item(key, value):
-    if isinstance(value, list):
-        return ", ".join(format_item(None, entry) for entry in value)
-    elif isinstance(value, dict):
-        return json.dumps(value, sort_keys=True)
-    elif isinstance(value, str):
+    if isinstance(value, str):
         if key and key.endswith("_time") and value.endswith("Z") and "." in value:
             # drop microseconds from timestamps
             value = value.split(".", 1)[0] + "Z"
         # json encode strings, but if the input string is exactly the same
         # as the output without quotes we'll go with the original
-        json_v = json.dumps(value)
-        if json_v == '"{}"'.format(value):
+        if _JSON_ESCAPED_RE.search(value) is None:
             return value
-        return json_v
+        return json.dumps(value)
+    elif value is None:
+        return "null"
+    elif value is True:
+        return "true"
+    elif value is False:
+        return "false"
+    elif type(value) is int:  # pylint: disable=unidiomatic-typecheck
+        return str(value)
+    elif isinstance(value, list):
+        return ", ".join([format_item(None, entry) for entry in value])
+    elif isinstance(value, dict):
+        return json.dumps(value, sort_keys=True)
     elif isinstance(value, datetime.datetime):
         return value.isoformat()
 
     return json.dumps(value)
 
 
+def _flatten_into(row, prefix, value):
+    for key, subvalue in value.items():
+        key = prefix + "." + key
+        if isinstance(subvalue, dict):
+            _flatten_into(row, key, subvalue)
+        else:
+            row[key] = format_item(key, subvalue)
+
+
+def flatten_item(item, drop_fields=()):
+    """Return {dotted.key: formatted value} for the leaf values of a dict in a single pass"""
+    row = {}
+    for key, value in item.items():
+        if key in drop_fields:
+            continue
+        if isinstance(value, dict):
+            _flatten_into(row, key, value)
+        else:
+            row[key] = format_item(key, value)
+    return row
+
+
+_MISSING = object()
+
+
+def _lookup(item, field):
+    """Return the leaf value flatten_item() would produce for a field, or _MISSING"""
+    value = item.get(field, _MISSING)
+    if value is _MISSING and "." in field:
+        value = item
+        for part in field.split("."):
+            if not isinstance(value, dict):
+                return _MISSING
+            value = value.get(part, _MISSING)
+            if value is _MISSING:
+                return _MISSING
+    return _MISSING if isinstance(value, dict) else value
+
+
+def select_fields(item, fields, drop_fields=()):
+    """Return {field: formatted value} for only the given dotted fields of a dict"""
+    row = {}
+    for field in fields:
+        if field.split(".", 1)[0] in drop_fields:
+            continue
+        value = _lookup(item, field)
+        if value is not _MISSING:
+            row[field] = format_item(field, value)
+    return row
+
+
 def print_list(result):
     for item in result:
         print(format_item(None, item))
@@ -46,47 +111,55 @@ def print_table(result, drop_fields=None, table_layout=None):
         return print_list(result)
 
     drop_fields = set(drop_fields or [])
-
-    def iter_values(key, value):
-        if not isinstance(value, dict):
-            yield key, value
-            return
-        for subkey, subvalue in value.items():
-            for kv in iter_values((key + "." if key else "") + subkey, subvalue):
-                yield kv
-
-    # format all fields and collect their widths
-    widths = {}
-    formatted_values = []
-    for item in result:
-        formatted_row = {}
-        formatted_values.append(formatted_row)
-        for key, value in item.items():
-            if key not in drop_fields:
-                for subkey, subvalue in iter_values(key, value):
-                    formatted_row[subkey] = format_item(subkey, subvalue)
-                    widths[subkey] = max(len(subkey), len(formatted_row[subkey]), widths.get(subkey, 1))
+    if table_layout is not None and not isinstance(table_layout[0], (list, tuple)):
+        table_layout = [table_layout]
+    if table_layout is not None and len(table_layout) == 1:
+        # only the listed fields are shown, don't format anything else
+        rows = [select_fields(item, table_layout[0], drop_fields) for item in result]
+    else:
+        rows = [flatten_item(item, drop_fields) for item in result]
 
     # default table layout is one row per item with sorted field names
     if table_layout is None:
-        table_layout = sorted(widths)
-    if not isinstance(table_layout[0], (list, tuple)):
-        table_layout = [table_layout]
+        keys = set()
+        for row in rows:
+            keys.update(row)
+        table_layout = [sorted(keys)]
 
     horizontal_fields = table_layout[0]
-
-    def longest(vf):
-        lengths = [len(f.split(".", 1)[-1]) for f in formatted_row if fnmatch.fnmatch(f, vf)]
-        return max(lengths) if lengths else 0
-
-    vertical_width = max(longest(f) for f in table_layout[1:]) if len(table_layout) > 1 else 0
-    print("  ".join(f.upper().ljust(widths[f]) for f in horizontal_fields))
-    print("  ".join("=" * widths[f] for f in horizontal_fields))
-    for row_num, formatted_row in enumerate(formatted_values):
-        if len(table_layout) > 1 and row_num > 0:
-            print("")
-        print("  ".join(formatted_row.get(f, "").ljust(widths[f]) for f in horizontal_fields))
-        for vertical_field in table_layout[1:]:
-            for key, value in sorted(formatted_row.items()):
-                if fnmatch.fnmatch(key, vertical_field):
-                    print("    {:{}} = {}".format(key.split(".", 1)[-1], vertical_width, value))
+    vertical_fields = table_layout[1:]
+    widths = []
+    for field in horizontal_fields:
+        values = [len(row[field]) for row in rows if field in row]
+        widths.append(max(values + [len(field)]))
+    columns = list(zip(horizontal_fields, widths))
+
+    # match every distinct key against the vertical field patterns only once
+    vertical_keys = {}
+    if vertical_fields:
+        for row in rows:
+            for key in row:
+                if key not in vertical_keys:
+                    vertical_keys[key] = [pattern for pattern in vertical_fields if fnmatch.fnmatch(key, pattern)]
+    vertical_width = max([len(key.split(".", 1)[-1]) for key, patterns in vertical_keys.items() if patterns] or [0])
+
+    lines = [
+        "  ".join([field.upper().ljust(width) for field, width in columns]),
+        "  ".join(["=" * width for width in widths]),
+    ]
+    write = sys.stdout.write
+    for row_num, row in enumerate(rows):
+        if vertical_fields and row_num > 0:
+            lines.append("")
+        lines.append("  ".join([row.get(field, "").ljust(width) for field, width in columns]))
+        if vertical_fields:
+            matched = sorted(key for key in row if vertical_keys[key])
+            for pattern in vertical_fields:
+                for key in matched:
+                    if pattern in vertical_keys[key]:
+                        lines.append("    {} = {}".format(key.split(".", 1)[-1].ljust(vertical_width), row[key]))
+        if len(lines) >= WRITE_BATCH:
+            write("\n".join(lines) + "\n")
+            lines = []
+    if lines:
+        write("\n".join(lines) + "\n")
@@ -0,0 +1,227 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Progress reporting for long running operations over many items or bytes
+
+On a terminal a single status line with completed items and bytes, the
+current throughput and an ETA is redrawn in place on stderr.  Otherwise a
+JSON line is written every `interval` seconds while the operation runs.
+Output is driven by a background ticker rather than by completed work, so a
+stalled operation keeps reporting a falling throughput.
+"""
+
+import collections
+import json
+import logging
+import sys
+import threading
+import time
+
+MODES = ["auto", "tty", "json", "none"]
+RATE_WINDOW = 10.0
+TTY_INTERVAL = 0.5
+JSON_INTERVAL = 10.0
+
+
+def format_bytes(value):
+    for unit in ["B", "KiB", "MiB", "GiB"]:
+        if value < 1024 or unit == "GiB":
+            return "{:.0f} {}".format(value, unit) if unit == "B" else "{:.1f} {}".format(value, unit)
+        value /= 1024.0
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+    return "{}:{:02d}".format(seconds // 60, seconds % 60)
+
+
+class CountingReader(object):
+    """File wrapper reporting the number of bytes read to callback(nbytes), e.g. for request bodies"""
+    def __init__(self, fp, callback):
+        self.fp = fp
+        self.callback = callback
+        self.mode = getattr(fp, "mode", "rb")
+        self.reported = 0
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.reported += len(data)
+        self.callback(len(data))
+        return data
+
+    def seek(self, offset, whence=0):
+        result = self.fp.seek(offset, whence)
+        position = self.fp.tell()
+        if position < self.reported:
+            # rewinding for a retry takes back the bytes that will be sent again
+            self.callback(position - self.reported)
+            self.reported = position
+        return result
+
+    def tell(self):
+        return self.fp.tell()
+
+    def fileno(self):
+        return self.fp.fileno()
+
+
+class _ClearStatusLine(logging.Filter):
+    """Erase the status line before log records are written over it"""
+    def __init__(self, progress):
+        logging.Filter.__init__(self)
+        self.progress = progress
+
+    def filter(self, record):
+        self.progress.clear_line()
+        return True
+
+
+class Progress(object):
+    def __init__(self, operation, items=None, total_bytes=None, mode="auto", stream=None, interval=None,
+                 clock=time.time, ticker=True):
+        self.operation = operation
+        self.stream = stream or sys.stderr
+        if mode == "auto":
+            mode = "tty" if getattr(self.stream, "isatty", lambda: False)() else "json"
+        self.mode = mode
+        self.interval = interval or (TTY_INTERVAL if mode == "tty" else JSON_INTERVAL)
+        self.clock = clock
+        self.items_total = items
+        self.items_done = 0
+        self.items_failed = 0
+        self.bytes_total = total_bytes
+        self.bytes_done = 0
+        self.started = clock()
+        self.lines = 0
+        self._samples = collections.deque([(self.started, 0, 0)])
+        self._lock = threading.RLock()
+        self._line_shown = False
+        self._closed = threading.Event()
+        self._handlers = []
+        if mode == "tty":
+            self._filter = _ClearStatusLine(self)
+            self._handlers = [handler for handler in logging.getLogger().handlers
+                              if getattr(handler, "stream", None) is self.stream]
+            for handler in self._handlers:
+                handler.addFilter(self._filter)
+        self._thread = None
+        if ticker and mode != "none":
+            self._thread = threading.Thread(target=self._tick_loop)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def advance(self, nbytes):
+        """Account transferred bytes, usable as a byte count callback"""
+        with self._lock:
+            self.bytes_done += nbytes
+
+    def done(self, failed=False):
+        """Mark one item completed"""
+        with self._lock:
+            self.items_done += 1
+            if failed:
+                self.items_failed += 1
+
+    def update(self, done, failed=0):
+        """Set the absolute number of completed and failed items"""
+        with self._lock:
+            self.items_done = done
+            self.items_failed = failed
+
+    def _rates(self, now):
+        samples = self._samples
+        samples.append((now, self.bytes_done, self.items_done))
+        while len(samples) > 2 and samples[1][0] <= now - RATE_WINDOW:
+            samples.popleft()
+        start_time, start_bytes, start_items = samples[0]
+        elapsed = now - start_time
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (self.bytes_done - start_bytes) / elapsed, (self.items_done - start_items) / elapsed
+
+    def snapshot(self):
+        """Return the current state as a dict"""
+        with self._lock:
+            now = self.clock()
+            byte_rate, item_rate = self._rates(now)
+            eta = None
+            if self.bytes_total and byte_rate > 0:
+                eta = max(0.0, self.bytes_total - self.bytes_done) / byte_rate
+            elif self.items_total and item_rate > 0:
+                eta = max(0, self.items_total - self.items_done) / item_rate
+            return {
+                "event": "progress",
+                "operation": self.operation,
+                "items_done": self.items_done,
+                "items_total": self.items_total,
+                "items_failed": self.items_failed,
+                "bytes_done": self.bytes_done,
+                "bytes_total": self.bytes_total,
+                "bytes_per_second": round(byte_rate, 1),
+                "items_per_second": round(item_rate, 3),
+                "eta_seconds": None if eta is None else round(eta, 1),
+                "elapsed_seconds": round(now - self.started, 1),
+            }
+
+    def status_line(self, state):
+        parts = []
+        if state["items_total"] is not None:
+            parts.append("{}/{} items".format(state["items_done"], state["items_total"]))
+        if state["items_failed"]:
+            parts.append("{} failed".format(state["items_failed"]))
+        if state["bytes_done"] or state["bytes_total"]:
+            total = "/" + format_bytes(state["bytes_total"]) if state["bytes_total"] else ""
+            parts.append("{}{}".format(format_bytes(state["bytes_done"]), total))
+            parts.append("{}/s".format(format_bytes(state["bytes_per_second"])))
+        parts.append("elapsed {}".format(format_duration(state["elapsed_seconds"])))
+        if state["eta_seconds"] is not None:
+            parts.append("ETA {}".format(format_duration(state["eta_seconds"])))
+        return "{}: {}".format(self.operation, ", ".join(parts))
+
+    def tick(self, final=False):
+        """Write the current progress"""
+        if self.mode == "none":
+            return
+        with self._lock:
+            state = self.snapshot()
+            if self.mode == "tty":
+                self.stream.write("\r" + self.status_line(state) + "\x1b[K" + ("\n" if final else ""))
+                self._line_shown = not final
+            else:
+                state["final"] = final
+                self.stream.write(json.dumps(state, sort_keys=True) + "\n")
+            self.stream.flush()
+            self.lines += 1
+
+    def clear_line(self):
+        with self._lock:
+            if self._line_shown:
+                self.stream.write("\r\x1b[K")
+                self.stream.flush()
+                self._line_shown = False
+
+    def _tick_loop(self):
+        while not self._closed.wait(self.interval):
+            self.tick()
+
+    def close(self):
+        """Stop reporting; writes a final line if anything was reported while running"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        for handler in self._handlers:
+            handler.removeFilter(self._filter)
+        if self.lines:
+            self.tick(final=True)
@@ -0,0 +1,209 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Create many services from a manifest, respecting their dependencies
+
+A manifest is a JSON or YAML document:
+
+    project: my-project          # optional, defaults to --project
+    services:
+      - name: kafka1
+        service_type: kafka
+        plan: business-4
+        cloud: google-europe-west1
+        user_config: {kafka_connect: false}
+      - name: connect1
+        service_type: kafka_connect:business-4
+        depends_on: [kafka1]
+
+Services whose dependencies are all RUNNING are created concurrently while
+the states of every service created so far are tracked with a single
+service list request per poll.  Services no other service depends on are
+not waited for unless asked to.
+"""
+
+from .parallel import DEFAULT_WORKERS, map_concurrently
+import json
+import logging
+import time
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+SERVICE_KEYS = {"name", "service_type", "plan", "cloud", "group_name", "user_config", "depends_on"}
+
+
+class ManifestError(ValueError):
+    """Invalid service manifest"""
+
+
+def load_manifest(path):
+    """Load and validate a JSON or YAML manifest, returning (project, [service spec, ...])"""
+    with open(path) as fp:
+        text = fp.read()
+    if path.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise ManifestError("Reading YAML manifests requires PyYAML, use JSON instead")
+        manifest = yaml.safe_load(text)
+    else:
+        try:
+            manifest = json.loads(text)
+        except ValueError as ex:
+            raise ManifestError("Invalid JSON in manifest {!r}: {}".format(path, ex))
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("services"), list):
+        raise ManifestError("Manifest must be an object with a 'services' list")
+    return manifest.get("project"), parse_services(manifest["services"])
+
+
+def parse_services(items):
+    specs = []
+    names = set()
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("name") or not item.get("service_type"):
+            raise ManifestError("services[{}]: 'name' and 'service_type' are required".format(index))
+        unknown = set(item) - SERVICE_KEYS
+        if unknown:
+            raise ManifestError("services[{}]: unknown keys {}".format(index, ", ".join(sorted(unknown))))
+        if item["name"] in names:
+            raise ManifestError("Service {!r} is listed more than once".format(item["name"]))
+        names.add(item["name"])
+        service_type, _, plan = item["service_type"].partition(":")
+        specs.append({
+            "name": item["name"],
+            "service_type": service_type,
+            "plan": plan or item.get("plan"),
+            "cloud": item.get("cloud"),
+            "group_name": item.get("group_name", "default"),
+            "user_config": item.get("user_config") or {},
+            "depends_on": list(item.get("depends_on") or []),
+        })
+        if not specs[-1]["plan"]:
+            raise ManifestError("Service {!r} has no plan".format(item["name"]))
+
+    for spec in specs:
+        missing = [dep for dep in spec["depends_on"] if dep not in names]
+        if missing:
+            raise ManifestError("Service {!r} depends on unknown services {}".format(spec["name"], ", ".join(missing)))
+    _check_cycles(specs)
+    return specs
+
+
+def _check_cycles(specs):
+    deps = {spec["name"]: spec["depends_on"] for spec in specs}
+    done = set()
+    while len(done) < len(deps):
+        ready = [name for name in deps if name not in done and all(dep in done for dep in deps[name])]
+        if not ready:
+            raise ManifestError("Circular dependencies between services {}".format(
+                ", ".join(sorted(set(deps) - done))))
+        done.update(ready)
+
+
+class StateTracker(object):
+    """Follow the states of services using one service list request per poll
+
+    State changes of the services in `names` are logged."""
+    def __init__(self, list_services, names, log=None):
+        self.list_services = list_services
+        self.names = set(names)
+        self.log = log or logging.getLogger("avn")
+        self.states = {}
+
+    def poll(self):
+        states = {service["service_name"]: service["state"] for service in self.list_services()}
+        for name, state in sorted(states.items()):
+            if name in self.names and self.states.get(name) != state:
+                self.log.info("Service %r state is now %r", name, state)
+        self.states = states
+        return states
+
+
+class Provisioner(object):
+    """Create services in dependency order, waiting for dependencies to reach RUNNING
+
+    `create(spec)` creates a single service, raising an exception on failure;
+    `exists(exception)` tells whether a failure means the service already exists.
+    With `wait` also the services nothing depends on are waited for."""
+    def __init__(self, specs, create, list_services, exists=lambda ex: False, no_fail_if_exists=False,
+                 workers=DEFAULT_WORKERS, interval=3.0, timeout=None, wait=False, log=None, clock=time.time,
+                 sleep=time.sleep, progress=None):
+        self.specs = specs
+        self.create = create
+        self.exists = exists
+        self.no_fail_if_exists = no_fail_if_exists
+        self.wait = wait
+        self.workers = workers
+        self.interval = interval
+        self.timeout = timeout
+        self.log = log or logging.getLogger("avn")
+        self.tracker = StateTracker(list_services, [], log=self.log)
+        self.clock = clock
+        self.sleep = sleep
+        self.progress = progress
+
+    def _report(self, results, done):
+        if self.progress is not None:
+            failed = [name for name, result in results.items() if result.startswith(("failed", "skipped"))]
+            self.progress.update(done=len(done) + len(failed), failed=len(failed))
+
+    def run(self):
+        """Return {service name: result}, result being 'created', 'exists', 'failed: ...' or 'skipped: ...'"""
+        start_time = self.clock()
+        pending = list(self.specs)
+        dependencies = set(dep for spec in self.specs for dep in spec["depends_on"])
+        results = {}
+        waiting = set()
+        running = set()
+        not_waited = set()
+        while pending or waiting:
+            ready = []
+            for spec in list(pending):
+                failed_deps = [dep for dep in spec["depends_on"] if results.get(dep, "").startswith(("failed", "skipped"))]
+                if failed_deps:
+                    results[spec["name"]] = "skipped: dependency {} failed".format(", ".join(failed_deps))
+                    pending.remove(spec)
+                elif all(dep in running for dep in spec["depends_on"]):
+                    ready.append(spec)
+                    pending.remove(spec)
+
+            for spec, _, ex in map_concurrently(self.create, ready, self.workers):
+                name = spec["name"]
+                if ex is None:
+                    self.log.info("Created service %r", name)
+                    results[name] = "created"
+                elif self.no_fail_if_exists and self.exists(ex):
+                    self.log.info("Service %r already exists", name)
+                    results[name] = "exists"
+                else:
+                    self.log.error("Creating service %r failed: %s", name, ex)
+                    results[name] = "failed: {}".format(ex)
+                    continue
+                if self.wait or name in dependencies:
+                    waiting.add(name)
+                    self.tracker.names.add(name)
+                else:
+                    not_waited.add(name)
+
+            if waiting:
+                states = self.tracker.poll()
+                for name in list(waiting):
+                    if states.get(name) == "RUNNING":
+                        waiting.discard(name)
+                        running.add(name)
+            if not waiting and not pending:
+                break
+            if self.timeout is not None and self.clock() - start_time > self.timeout:
+                for name in waiting:
+                    results[name] = "failed: timeout in state {}".format(self.tracker.states.get(name))
+                for spec in pending:
+                    results[spec["name"]] = "skipped: timeout"
+                break
+            self._report(results, running | not_waited)
+            if not any(all(dep in running for dep in spec["depends_on"]) for spec in pending):
+                self.sleep(self.interval)
+        self._report(results, running | not_waited)
+        return results
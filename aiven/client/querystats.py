@@ -0,0 +1,102 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Aggregate PostgreSQL query statistics from multiple services"""
+
+import array
+import heapq
+import re
+
+# per-query counters summed across services
+SUM_FIELDS = ["calls", "total_time", "rows", "shared_blks_hit", "shared_blks_read",
+              "local_blks_read", "temp_blks_read", "blk_read_time", "blk_write_time"]
+ORDER_BY = ["total_time", "mean_time", "blocks_read", "calls"]
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/|--[^\n]*", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PARAM_RE = re.compile(r"\$\d+|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(query):
+    """Reduce a query to a canonical form so identical statements from
+    different services and parameter values map to the same entry"""
+    query = _COMMENT_RE.sub(" ", query)
+    query = _STRING_RE.sub("?", query)
+    query = _PARAM_RE.sub("?", query)
+    query = _LIST_RE.sub("(?)", query)
+    return _SPACE_RE.sub(" ", query).strip().rstrip(";")
+
+
+class QueryStatsAggregate(object):
+    """Column-oriented aggregate of query statistics keyed by normalized query"""
+    def __init__(self):
+        self.queries = []
+        self._index = {}
+        self.columns = {field: array.array("d") for field in SUM_FIELDS}
+        self.max_time = array.array("d")
+        self.service_count = array.array("l")
+        self._seen = set()
+
+    def __len__(self):
+        return len(self.queries)
+
+    def _row(self, query):
+        row = self._index.get(query)
+        if row is None:
+            row = len(self.queries)
+            self._index[query] = row
+            self.queries.append(query)
+            for column in self.columns.values():
+                column.append(0.0)
+            self.max_time.append(0.0)
+            self.service_count.append(0)
+        return row
+
+    def add(self, service, stats):
+        """Add the query statistics list returned for a single service"""
+        for entry in stats:
+            row = self._row(normalize_query(entry.get("query") or ""))
+            for field, column in self.columns.items():
+                column[row] += float(entry.get(field) or 0)
+            self.max_time[row] = max(self.max_time[row], float(entry.get("max_time") or 0))
+            if (service, row) not in self._seen:
+                self._seen.add((service, row))
+                self.service_count[row] += 1
+
+    def _sort_key(self, order_by):
+        calls = self.columns["calls"]
+        if order_by == "mean_time":
+            total_time = self.columns["total_time"]
+            return lambda row: total_time[row] / calls[row] if calls[row] else 0.0
+        elif order_by == "blocks_read":
+            shared, local, temp = (self.columns[f] for f in ("shared_blks_read", "local_blks_read", "temp_blks_read"))
+            return lambda row: shared[row] + local[row] + temp[row]
+        elif order_by in self.columns:
+            return self.columns[order_by].__getitem__
+        raise ValueError("Unsupported sort order {!r}, expected one of {}".format(order_by, ", ".join(ORDER_BY)))
+
+    def top(self, limit, order_by="total_time"):
+        """Return the top `limit` queries as a list of dicts"""
+        rows = heapq.nlargest(limit, range(len(self.queries)), key=self._sort_key(order_by))
+        return [self.row_dict(row) for row in rows]
+
+    def find(self, query):
+        """Return the entry of an already normalized query as a dict, or None"""
+        row = self._index.get(query)
+        return None if row is None else self.row_dict(row)
+
+    def row_dict(self, row):
+        result = {field: column[row] for field, column in self.columns.items()}
+        calls = result["calls"]
+        result["calls"] = int(calls)
+        result["rows"] = int(result["rows"])
+        result["mean_time"] = result["total_time"] / calls if calls else 0.0
+        result["blocks_read"] = int(result["shared_blks_read"] + result["local_blks_read"] + result["temp_blks_read"])
+        result["max_time"] = self.max_time[row]
+        result["services"] = self.service_count[row]
+        result["query"] = self.queries[row]
+        return result
@@ -0,0 +1,108 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Client-side request rate limiting shared by all threads using a client"""
+
+import email.utils
+import threading
+import time
+
+
+def parse_retry_after(value, default=1.0):
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return default
+    return max(0.0, email.utils.mktime_tz(parsed) - time.time())
+
+
+class RateLimiter(object):
+    """Token bucket rate limiter adapting its rate to API throttling
+
+    With `rate=None` requests are not limited until the API throttles us
+    with a 429 response, after which the limiter starts from
+    `throttled_rate` requests per second.  Every throttled response halves
+    the rate and pauses all callers for the Retry-After period; successful
+    requests slowly raise the rate back towards the configured maximum."""
+    def __init__(self, rate=None, burst=None, throttled_rate=10.0, min_rate=0.1, recovery=1.02,
+                 clock=time.time, sleep=time.sleep):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.throttled_rate = throttled_rate
+        self.min_rate = min_rate
+        self.recovery = recovery
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.tokens = self._capacity()
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.requests = 0
+        self.throttled_requests = 0
+        self.total_wait = 0.0
+
+    def _capacity(self):
+        if self.burst is not None:
+            return float(self.burst)
+        return max(1.0, self.rate or 1.0)
+
+    def acquire(self):
+        """Block until the caller is allowed to send a request"""
+        with self.lock:
+            now = self.clock()
+            delay = max(0.0, self.paused_until - now)
+            if self.rate is not None:
+                self.tokens = min(self._capacity(), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                self.tokens -= 1.0
+                if self.tokens < 0:
+                    delay = max(delay, -self.tokens / self.rate)
+            self.requests += 1
+            self.total_wait += delay
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    def throttled(self, retry_after):
+        """Register a 429 response: slow down and pause everyone for retry_after seconds"""
+        with self.lock:
+            now = self.clock()
+            self.throttled_requests += 1
+            self.rate = max(self.min_rate, (self.rate or self.throttled_rate * 2) / 2.0)
+            self.tokens = 0.0
+            self.updated = now
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+    def succeeded(self):
+        """Register a non-throttled response, gradually recovering the rate"""
+        if self.rate is None or self.rate == self.max_rate:
+            return
+        with self.lock:
+            if self.rate is None:
+                return
+            rate = self.rate * self.recovery
+            if self.max_rate is not None:
+                self.rate = min(rate, self.max_rate)
+            elif rate >= self.throttled_rate * 10:
+                self.rate = None  # fully recovered, stop limiting
+            else:
+                self.rate = rate
+
+    def stats(self):
+        with self.lock:
+            return {
+                "current_rate": self.rate,
+                "max_rate": self.max_rate,
+                "requests": self.requests,
+                "throttled_requests": self.throttled_requests,
+                "total_wait": self.total_wait,
+            }
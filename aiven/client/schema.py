@@ -0,0 +1,202 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Validate values against the JSON schema subset used by service user_config_schema
+
+compile_schema() turns a schema into a validator function once; the
+validator returns a list of (path, message) tuples describing every
+violation found, or an empty list for valid values.
+"""
+
+import re
+
+try:
+    string_types = basestring  # pylint: disable=undefined-variable
+    integer_types = (int, long)  # pylint: disable=undefined-variable
+except NameError:
+    # python 3.x
+    string_types = str
+    integer_types = (int,)
+
+
+def _is_integer(value):
+    return isinstance(value, integer_types) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return (_is_integer(value) or isinstance(value, float)) and not isinstance(value, bool)
+
+
+TYPE_CHECKS = {
+    "array": lambda value: isinstance(value, list),
+    "boolean": lambda value: isinstance(value, bool),
+    "integer": _is_integer,
+    "null": lambda value: value is None,
+    "number": _is_number,
+    "object": lambda value: isinstance(value, dict),
+    "string": lambda value: isinstance(value, string_types),
+}
+
+
+def _join(path, key):
+    return "{}.{}".format(path, key) if path else str(key)
+
+
+def compile_schema(schema):
+    """Return a validator function validate(value, path="") -> [(path, message), ...]"""
+    checks = []
+
+    types = schema.get("type")
+    if types is not None:
+        types = [types] if isinstance(types, string_types) else list(types)
+        type_checks = [TYPE_CHECKS[t] for t in types if t in TYPE_CHECKS]
+        expected = " or ".join(types)
+
+        def check_type(value, path):
+            if not any(check(value) for check in type_checks):
+                return [(path, "expected {}, got {!r}".format(expected, value))]
+            return []
+        checks.append(check_type)
+
+    if "enum" in schema:
+        enum = schema["enum"]
+
+        def check_enum(value, path):
+            if value not in enum:
+                return [(path, "value {!r} is not one of {}".format(value, ", ".join(repr(e) for e in enum)))]
+            return []
+        checks.append(check_enum)
+
+    checks.extend(_compile_number_checks(schema))
+    checks.extend(_compile_string_checks(schema))
+    checks.extend(_compile_array_checks(schema))
+    checks.extend(_compile_object_checks(schema))
+
+    def validate(value, path=""):
+        errors = []
+        for check in checks:
+            errors.extend(check(value, path))
+            if errors and check is checks[0] and types is not None:
+                break  # no point checking further constraints of a value of the wrong type
+        return errors
+    return validate
+
+
+def _compile_number_checks(schema):
+    checks = []
+    for key, fails, relation in (("minimum", lambda v, limit: v < limit, ">="),
+                                 ("maximum", lambda v, limit: v > limit, "<=")):
+        if key in schema:
+            def check(value, path, limit=schema[key], fails=fails, relation=relation):
+                if _is_number(value) and fails(value, limit):
+                    return [(path, "value {!r} must be {} {!r}".format(value, relation, limit))]
+                return []
+            checks.append(check)
+    return checks
+
+
+def _compile_string_checks(schema):
+    checks = []
+    if "minLength" in schema or "maxLength" in schema:
+        min_length = schema.get("minLength", 0)
+        max_length = schema.get("maxLength")
+
+        def check_length(value, path):
+            if isinstance(value, string_types):
+                if len(value) < min_length:
+                    return [(path, "length of {!r} must be at least {}".format(value, min_length))]
+                if max_length is not None and len(value) > max_length:
+                    return [(path, "length of {!r} must be at most {}".format(value, max_length))]
+            return []
+        checks.append(check_length)
+
+    if "pattern" in schema:
+        pattern = re.compile(schema["pattern"])
+
+        def check_pattern(value, path):
+            if isinstance(value, string_types) and not pattern.search(value):
+                return [(path, "value {!r} does not match pattern {!r}".format(value, pattern.pattern))]
+            return []
+        checks.append(check_pattern)
+    return checks
+
+
+def _compile_array_checks(schema):
+    checks = []
+    if "minItems" in schema or "maxItems" in schema:
+        min_items = schema.get("minItems", 0)
+        max_items = schema.get("maxItems")
+
+        def check_count(value, path):
+            if isinstance(value, list):
+                if len(value) < min_items:
+                    return [(path, "must have at least {} items".format(min_items))]
+                if max_items is not None and len(value) > max_items:
+                    return [(path, "must have at most {} items".format(max_items))]
+            return []
+        checks.append(check_count)
+
+    if schema.get("uniqueItems"):
+        def check_unique(value, path):
+            if isinstance(value, list) and len(set(repr(item) for item in value)) != len(value):
+                return [(path, "items must be unique")]
+            return []
+        checks.append(check_unique)
+
+    if isinstance(schema.get("items"), dict):
+        validate_item = compile_schema(schema["items"])
+
+        def check_items(value, path):
+            errors = []
+            if isinstance(value, list):
+                for index, item in enumerate(value):
+                    errors.extend(validate_item(item, "{}[{}]".format(path, index)))
+            return errors
+        checks.append(check_items)
+    return checks
+
+
+def _compile_object_checks(schema):
+    properties = {name: compile_schema(spec) for name, spec in schema.get("properties", {}).items()}
+    patterns = [(re.compile(pattern), compile_schema(spec))
+                for pattern, spec in schema.get("patternProperties", {}).items()]
+    additional = schema.get("additionalProperties", True)
+    validate_additional = compile_schema(additional) if isinstance(additional, dict) else None
+    required = schema.get("required", [])
+    if not (properties or patterns or required or additional is not True):
+        return []
+
+    def check_object(value, path):
+        if not isinstance(value, dict):
+            return []
+        errors = [(_join(path, name), "required property is missing") for name in required if name not in value]
+        for key, item in sorted(value.items()):
+            item_path = _join(path, key)
+            matched = False
+            if key in properties:
+                matched = True
+                errors.extend(properties[key](item, item_path))
+            for pattern, validate_pattern in patterns:
+                if pattern.search(key):
+                    matched = True
+                    errors.extend(validate_pattern(item, item_path))
+            if not matched:
+                if validate_additional is not None:
+                    errors.extend(validate_additional(item, item_path))
+                elif additional is False:
+                    errors.append((item_path, "unknown property"))
+        return errors
+    return [check_object]
+
+
+def merge(base, update):
+    """Return `base` recursively updated with the values in `update`"""
+    result = dict(base)
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = merge(result[key], value)
+        else:
+            result[key] = value
+    return result
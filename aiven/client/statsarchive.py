@@ -0,0 +1,150 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Append-only local archive of PostgreSQL query statistics snapshots
+
+Snapshots are appended as individual gzip members to one segment file per
+UTC day, so a segment is itself a valid gzip file and existing data is never
+rewritten.  Each snapshot gets a line in index.jsonl with its time, service,
+segment and byte range; the index is all that needs to be read to find the
+snapshots of a period, and only those members are decompressed.
+
+pg_stat_statements counters are cumulative since the last reset, so the
+usage during a period is computed from the difference between consecutive
+snapshots of a service, or taken as is after a reset.
+"""
+
+from aiven.client import envdefault, fileutil, querystats
+import calendar
+import json
+import os
+import re
+import time
+
+ARCHIVE_DIR = os.path.join(envdefault.AIVEN_CONFIG_DIR, "querystats")
+INDEX_NAME = "index.jsonl"
+
+_RELATIVE_RE = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+_TIME_FORMATS = ["%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]
+
+
+def parse_time(value, now=None):
+    """Parse 'now', a relative age such as '12h' or '7d', or an ISO 8601 UTC time to a unix timestamp"""
+    now = time.time() if now is None else now
+    value = value.strip()
+    if value == "now":
+        return now
+    match = _RELATIVE_RE.match(value)
+    if match:
+        return now - float(match.group(1)) * _UNITS[match.group(2)]
+    value = value.rstrip("Z")
+    for time_format in _TIME_FORMATS:
+        try:
+            return float(calendar.timegm(time.strptime(value, time_format)))
+        except ValueError:
+            pass
+    raise ValueError("Invalid time {!r}, expected e.g. 'now', '12h', '7d' or '2016-01-31T12:00:00Z'".format(value))
+
+
+def _query_key(entry):
+    if entry.get("queryid") is not None:
+        return (entry.get("dbid"), entry.get("userid"), entry["queryid"])
+    return (entry.get("dbid"), entry.get("userid"), entry.get("query"))
+
+
+def stats_delta(previous, current):
+    """Return the counters accumulated between two snapshots of the same service
+
+    Entries whose calls decreased were reset in between and are counted as is."""
+    previous = {_query_key(entry): entry for entry in previous}
+    delta = []
+    for entry in current:
+        before = previous.get(_query_key(entry))
+        if before is None or float(entry.get("calls") or 0) < float(before.get("calls") or 0):
+            delta.append(entry)
+            continue
+        entry = dict(entry)
+        for field in querystats.SUM_FIELDS:
+            entry[field] = float(entry.get(field) or 0) - float(before.get(field) or 0)
+        if entry["calls"]:
+            delta.append(entry)
+    return delta
+
+
+class QueryStatsArchive(object):
+    def __init__(self, path=None, clock=time.time):
+        self.path = path or ARCHIVE_DIR
+        self.clock = clock
+        self.index_path = os.path.join(self.path, INDEX_NAME)
+
+    def append(self, project, service, stats):
+        """Store a snapshot and return its index entry, which must be passed to commit() to make it visible"""
+        timestamp = self.clock()
+        segment = time.strftime("%Y%m%d.gz", time.gmtime(timestamp))
+        record = {"time": timestamp, "project": project, "service": service, "queries": stats}
+        offset, length = fileutil.append_gzip_member(os.path.join(self.path, segment),
+                                                     json.dumps(record, sort_keys=True).encode("utf-8"))
+        return {"time": timestamp, "project": project, "service": service, "segment": segment,
+                "offset": offset, "length": length, "queries": len(stats)}
+
+    def commit(self, entries):
+        """Append index entries; `reset` in an entry tells whether the counters were reset after the snapshot"""
+        if not entries:
+            return
+        fileutil.append_lines(self.index_path, [json.dumps(entry, sort_keys=True) for entry in entries])
+
+    def entries(self, services=None, until=None):
+        """Return index entries sorted by time, optionally limited to (project, service) tuples and a time"""
+        result = []
+        try:
+            with open(self.index_path) as fp:
+                for line in fp:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # partially written line of an interrupted snapshot
+                    if services is not None and (entry["project"], entry["service"]) not in services:
+                        continue
+                    if until is not None and entry["time"] > until:
+                        continue
+                    result.append(entry)
+        except IOError:
+            if os.path.exists(self.index_path):
+                raise
+        result.sort(key=lambda entry: entry["time"])
+        return result
+
+    def load(self, entry):
+        """Return the query statistics list stored for an index entry"""
+        data = fileutil.read_gzip_member(os.path.join(self.path, entry["segment"]), entry["offset"], entry["length"])
+        return json.loads(data.decode("utf-8"))["queries"]
+
+    def period(self, start, end, services=None):
+        """Aggregate the query statistics accumulated between start and end
+
+        Returns a (QueryStatsAggregate, snapshot_count) tuple."""
+        by_service = {}
+        for entry in self.entries(services=services, until=end):
+            by_service.setdefault((entry["project"], entry["service"]), []).append(entry)
+
+        aggregate = querystats.QueryStatsAggregate()
+        count = 0
+        for (project, service), service_entries in sorted(by_service.items()):
+            previous, previous_stats = None, None
+            for entry in service_entries:
+                if entry["time"] < start:
+                    previous, previous_stats = entry, None  # only the last one before the period is loaded
+                    continue
+                stats = self.load(entry)
+                delta = stats
+                if previous is not None and not previous.get("reset"):
+                    if previous_stats is None:
+                        previous_stats = self.load(previous)
+                    delta = stats_delta(previous_stats, stats)
+                aggregate.add("{}/{}".format(project, service), delta)
+                previous, previous_stats = entry, stats
+                count += 1
+        return aggregate, count
@@ -0,0 +1,58 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Per-phase timing of CLI invocations and JSON log formatting
+
+This module is imported first by the aiven.client package so that
+IMPORT_STARTED approximates the time the client started loading.
+"""
+
+import contextlib
+import json
+import logging
+import time
+
+IMPORT_STARTED = time.time()
+
+
+class PhaseTimer(object):
+    """Accumulate wall clock time spent in named phases"""
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.started = clock()
+        self.phases = {}
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add(name, self.clock() - start)
+
+    def get(self, name):
+        return self.phases.get(name, 0.0)
+
+
+class JsonFormatter(logging.Formatter):
+    """Format log records as single line JSON objects
+
+    Extra fields given to a logging call as extra={"fields": {...}} are
+    included in the object."""
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + ".{:03d}Z".format(
+                int(record.msecs)),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, sort_keys=True)
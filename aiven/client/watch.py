@@ -0,0 +1,109 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+"""Live updating table on an ANSI terminal
+
+WatchTable keeps the rows of the previous update and, after the first full
+draw, only moves the cursor to and rewrites the cells whose text on screen
+changed.  Rows are matched by their key column, so a row added or removed
+above others shifts them without their cells being highlighted as changed.
+Column widths only ever grow so unchanged cells stay in place; when a column
+has to grow the table is drawn again in full.  When the output is not a
+terminal the whole table is printed on every update without escape codes.
+"""
+
+from .pretty import format_item
+import sys
+
+CLEAR_SCREEN = "\x1b[H\x1b[2J"
+CLEAR_TO_END = "\x1b[J"
+CLEAR_LINE = "\x1b[K"
+HIGHLIGHT = "\x1b[7m"
+RESET = "\x1b[0m"
+FIRST_ROW_LINE = 4  # status line, header and separator come first
+
+
+def _move(line, column):
+    return "\x1b[{};{}H".format(line, column)
+
+
+class WatchTable(object):
+    def __init__(self, columns, key, highlight=(), stream=sys.stdout, ansi=None):
+        self.columns = columns
+        self.key = key
+        self.highlight = set(highlight)
+        self.stream = stream
+        self.ansi = stream.isatty() if ansi is None else ansi
+        self.widths = [len(column) for column in columns]
+        self.keys = None
+        self.rows = None
+        self.highlighted = set()
+
+    def _format_rows(self, items):
+        items = sorted(items, key=lambda item: item.get(self.key))
+        return ([item.get(self.key) for item in items],
+                [[format_item(column, item.get(column, "")) for column in self.columns] for item in items])
+
+    def _offsets(self):
+        offsets = []
+        offset = 1
+        for width in self.widths:
+            offsets.append(offset)
+            offset += width + 2
+        return offsets
+
+    def _cell(self, text, width, highlight):
+        text = text.ljust(width)
+        return HIGHLIGHT + text + RESET if highlight else text
+
+    def update(self, items, status=""):
+        """Bring the table on screen up to date with a new list of items"""
+        keys, rows = self._format_rows(items)
+        widths = [max([width] + [len(row[index]) for row in rows]) for index, width in enumerate(self.widths)]
+        out = []
+        if not self.ansi:
+            self.widths = widths
+            out.append(status + "\n")
+            self._draw_table(out, rows)
+            out.append("\n")
+        elif self.rows is None or widths != self.widths:
+            self.widths = widths
+            out.append(CLEAR_SCREEN + "\n")
+            self._draw_table(out, rows)
+            self.highlighted = set()
+        else:
+            self._draw_changes(out, keys, rows)
+        if self.ansi:
+            out.append(_move(1, 1) + status + CLEAR_LINE)
+            out.append(_move(FIRST_ROW_LINE + len(rows), 1))
+        self.keys = keys
+        self.rows = rows
+        self.stream.write("".join(out))
+        self.stream.flush()
+
+    def _draw_table(self, out, rows):
+        out.append("  ".join(column.upper().ljust(width) for column, width in zip(self.columns, self.widths)) + "\n")
+        out.append("  ".join("=" * width for width in self.widths) + "\n")
+        for row in rows:
+            out.append("  ".join(cell.ljust(width) for cell, width in zip(row, self.widths)) + "\n")
+
+    def _draw_changes(self, out, keys, rows):
+        offsets = self._offsets()
+        previous = dict(zip(self.keys, self.rows))
+        highlighted = set()
+        for row_num, (key, row) in enumerate(zip(keys, rows)):
+            on_screen = self.rows[row_num] if row_num < len(self.rows) else None
+            old_row = previous.get(key)
+            for index, cell in enumerate(row):
+                highlight = old_row is not None and old_row[index] != cell and self.columns[index] in self.highlight
+                if highlight:
+                    highlighted.add((row_num, index))
+                elif on_screen is not None and on_screen[index] == cell and (row_num, index) not in self.highlighted:
+                    continue
+                out.append(_move(FIRST_ROW_LINE + row_num, offsets[index]) +
+                           self._cell(cell, self.widths[index], highlight))
+        if len(rows) < len(self.rows):
+            out.append(_move(FIRST_ROW_LINE + len(rows), 1) + CLEAR_TO_END)
+        self.highlighted = highlighted
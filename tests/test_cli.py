@@ -4,7 +4,10 @@
 # See the file `LICENSE` for details.
 
 # pylint: disable=no-member
+from aiven.client.argx import UserError
 from aiven.client.cli import AivenCLI
+import json
+import logging
 import pytest
 
 pytestmark = [pytest.mark.unittest, pytest.mark.all]
@@ -14,3 +17,69 @@ def test_cli():
     with pytest.raises(SystemExit) as excinfo:
         AivenCLI().run(args=["--help"])
     assert excinfo.value.code == 0
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+        self.lines = []
+
+    def emit(self, record):
+        self.records.append(record)
+        self.lines.append(self.format(record))
+
+
+@pytest.fixture
+def root_handler():
+    """Replace the root logger's handlers with a recording one, as the CLI reconfigures them"""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    handler = RecordingHandler()
+    root.handlers = [handler]
+    try:
+        yield handler
+    finally:
+        root.handlers = handlers
+        root.setLevel(level)
+
+
+def test_json_invocation_log(root_handler):
+    assert not AivenCLI().run(args=["--log-format", "json", "completion", "script", "bash"])
+    records = [r for r in root_handler.records if r.name == "avn.invocation"]
+    assert len(records) == 1
+    fields = records[0].fields
+    assert fields["command"] == "completion script"
+    assert fields["exit_status"] == 0
+    assert set(fields["phases"]) == {"import", "parse", "config", "auth", "api", "render"}
+    assert fields["duration"] >= sum(fields["phases"].values()) - fields["phases"]["import"]
+    line = json.loads(root_handler.lines[-1])
+    assert line["requests"] == 0
+    assert line["api_request_time"] == 0.0
+    assert line["transfer"]["request_bytes_saved"] == line["transfer"]["response_bytes_saved"] == 0
+
+
+def test_create_user_config_refetches_stale_schema(monkeypatch):
+    def service_types(*options):
+        properties = {option: {"type": "integer"} for option in options}
+        return {"pg": {"user_config_schema": {"type": "object", "properties": properties}}}
+
+    fetched = []
+
+    def get_service_types(project, max_age=3600):
+        fetched.append(max_age)
+        return service_types("a", "b") if max_age == 0 else service_types("a")
+
+    cli = AivenCLI()
+    monkeypatch.setattr(cli, "get_service_types", get_service_types)
+    assert cli.create_user_config("proj", "pg", ["a=1"]) == {"a": 1}
+    assert cli.create_user_config("proj", "pg", ["b=2"]) == {"b": 2}
+    assert fetched == [3600, 3600, 0]
+
+    # errors that do not depend on the schema are reported without refetching
+    del fetched[:]
+    with pytest.raises(UserError):
+        cli.create_user_config("proj", "pg", ["a"])
+    with pytest.raises(UserError):
+        cli.create_user_config("proj", "pg", ["a=x"])
+    assert fetched == [3600, 3600]
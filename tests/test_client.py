@@ -0,0 +1,344 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client import AivenClient
+from aiven.client.client import Error
+from aiven.client.compression import compress
+from aiven.client.filecache import FileCache
+import itertools
+import json
+import logging
+import pytest
+import requests
+import threading
+import time
+import urllib3.exceptions
+import zlib
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    # python 2.x
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer  # pylint: disable=import-error
+    from SocketServer import ThreadingMixIn  # pylint: disable=import-error
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.server.requests.append((self.command, {name.lower(): value for name, value in self.headers.items()}, None))
+        body = b"{}"
+        if self.path.endswith("/large"):
+            body = json.dumps({"services": [{"service_name": "pg-{}".format(i)} for i in range(1000)]}).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        if self.path.endswith("/large") and "gzip" in self.headers.get("accept-encoding", ""):
+            body = compress(body, "gzip")
+            self.send_header("content-encoding", "gzip")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):  # pylint: disable=invalid-name
+        if self.headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                chunks.append(self.rfile.read(size + 2)[:size])
+                if not size:
+                    break
+            body = b"".join(chunks)
+        else:
+            body = self.rfile.read(int(self.headers.get("content-length", 0)))
+        self.server.requests.append((self.command, {name.lower(): value for name, value in self.headers.items()}, body))
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def end_headers(self):
+        if self.close_connection:
+            self.send_header("connection", "close")
+        BaseHTTPRequestHandler.end_headers(self)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        HTTPServer.__init__(self, *args, **kwargs)
+        self.requests = []  # (method, headers, body) of every request handled
+        self.url = "http://127.0.0.1:{}".format(self.server_address[1])
+
+
+@pytest.fixture
+def server():
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), JSONHandler)
+    thread = threading.Thread(target=http_server.serve_forever, args=(0.05,))
+    thread.start()
+    try:
+        yield http_server
+    finally:
+        http_server.shutdown()
+        http_server.server_close()
+        thread.join()
+
+
+@pytest.fixture
+def server_url(server):
+    return server.url
+
+
+def test_http_logging_setup_is_idempotent():
+    AivenClient("https://api.example.com")
+    handlers = list(logging.getLogger("aiven_http").handlers)
+    for _ in range(3):
+        AivenClient("https://api.example.com")
+    assert logging.getLogger("aiven_http").handlers == handlers
+
+
+def test_session_per_thread():
+    with AivenClient("https://api.example.com") as client:
+        client.set_auth_token("token")
+        sessions = []
+        threads = [threading.Thread(target=lambda: sessions.append(client.session)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(id(session) for session in sessions)) == 4
+        assert client.session is client.session
+        assert all(session.get_adapter("https://api.example.com") is client.adapter for session in sessions)
+        assert "authorization" not in client.session.headers
+
+
+def test_connection_reuse(server_url):
+    with AivenClient(server_url) as client:
+        for _ in range(3):
+            client.get("/me")
+        assert client.connection_stats() == {"requests": 3, "new_connections": 1, "reused_connections": 2}
+
+    with AivenClient(server_url, keep_alive=False) as client:
+        for _ in range(3):
+            client.get("/me")
+        assert client.connection_stats() == {"requests": 3, "new_connections": 3, "reused_connections": 0}
+
+
+def test_connection_pool_shared_between_threads(server_url):
+    with AivenClient(server_url, pool_size=2) as client:
+        def fetch():
+            for _ in range(3):
+                client.get("/me")
+
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = client.connection_stats()
+    # the per-thread sessions share one adapter, so its pool limits the connections of all of them
+    assert stats["requests"] == 12
+    assert 1 <= stats["new_connections"] <= 2
+
+
+def test_timeouts(monkeypatch):
+    timeouts = []
+
+    def request(self, method, url, **kwargs):  # pylint: disable=unused-argument
+        timeouts.append(kwargs["timeout"])
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"{}"  # pylint: disable=protected-access
+        return response
+
+    monkeypatch.setattr(requests.Session, "request", request)
+    with AivenClient("https://api.example.com", connect_timeout=3.0, read_timeout=7.0) as client:
+        client.get("/me")
+        client.post("/me", body={})
+    assert timeouts == [(3.0, 7.0), (3.0, 7.0)]
+
+
+def test_compressed_request_bodies(server, tmpdir):
+    with AivenClient(server.url, compression="gzip") as client:
+        client.put("/small", body={"a": 1})
+        client.put("/large", body={"a": "x" * 2000})
+        data_file = tmpdir.join("data.json")
+        data_file.write_binary(json.dumps({"services": ["pg-{}".format(i) for i in range(5000)]}).encode())
+        client.upload_data("proj", str(data_file))
+        stats = client.transfer_stats.as_dict()
+
+    (_, small_headers, small_body), (_, large_headers, large_body), (_, upload_headers, upload_body) = server.requests
+    # bodies below the threshold are sent as they are
+    assert "content-encoding" not in small_headers
+    assert json.loads(small_body.decode()) == {"a": 1}
+    assert large_headers["content-encoding"] == "gzip"
+    assert json.loads(zlib.decompress(large_body, 16 + zlib.MAX_WBITS).decode()) == {"a": "x" * 2000}
+    # files are compressed while they are sent, without a known length
+    assert upload_headers["content-encoding"] == "gzip"
+    assert upload_headers["transfer-encoding"] == "chunked"
+    assert zlib.decompress(upload_body, 16 + zlib.MAX_WBITS) == data_file.read_binary()
+
+    assert stats["compressed_requests"] == 2
+    assert stats["request_bytes"] == len(small_body) + len(json.dumps({"a": "x" * 2000})) + data_file.size()
+    assert stats["request_bytes_sent"] == len(small_body) + len(large_body) + len(upload_body)
+    assert stats["request_bytes_saved"] > 0
+
+
+def test_compressed_responses(server):
+    with AivenClient(server.url) as client:
+        assert len(client.get("/large").json()["services"]) == 1000
+        stats = client.transfer_stats.as_dict()
+    assert "gzip" in server.requests[0][1]["accept-encoding"]
+    assert stats["compressed_responses"] == 1
+    assert stats["response_bytes_saved"] > 0
+
+    with AivenClient(server.url, accept_compression=False) as client:
+        client.get("/large")
+        stats = client.transfer_stats.as_dict()
+    assert server.requests[1][1]["accept-encoding"] == "identity"
+    assert stats["compressed_responses"] == stats["response_bytes_saved"] == 0
+
+
+def test_response_cache(tmpdir, monkeypatch):
+    class Response(object):
+        def __init__(self, result):
+            self.result = result
+
+        def json(self):
+            return self.result
+
+    requests_sent = []
+
+    def fake_op(method):
+        def op(path, params=None, body=None):
+            requests_sent.append((method, path))
+            return Response({"services": [{"service_name": "pg1"}], "service": {}})
+        return op
+
+    with AivenClient("https://api.example.com") as client:
+        monkeypatch.setattr(client, "get", fake_op("GET"))
+        monkeypatch.setattr(client, "put", fake_op("PUT"))
+        client.set_auth_token("token")
+        client.set_response_cache(FileCache(str(tmpdir)), ttl=60)
+        assert client.get_services("proj") == client.get_services("proj") == [{"service_name": "pg1"}]
+        assert requests_sent == [("GET", "/v1beta/project/proj/service")]
+
+        client.set_auth_token("other-token")  # cached results are per user
+        client.get_services("proj")
+        assert len(requests_sent) == 2
+
+        # a write invalidates the cached results of its path and parent paths
+        client.update_service("proj", "pg1", powered=True)
+        client.get_services("proj")
+        assert [method for method, _ in requests_sent] == ["GET", "GET", "PUT", "GET"]
+
+        client.set_response_cache(FileCache(str(tmpdir)), ttl=0)
+        client.get_services("proj")
+        assert len(requests_sent) == 5
+
+
+def test_truncated_stream(monkeypatch):
+    class Response(object):
+        headers = {}
+
+        def iter_content(self, chunk_size):
+            return iter([b'{"services": [{"service_name": "pg1"}, {"service_na'])
+
+        def close(self):
+            pass
+
+    with AivenClient("https://api.example.com") as client:
+        monkeypatch.setattr(client, "get", lambda path, params=None, stream=False: Response())
+        services = client.iter_services("proj")
+        assert next(services) == {"service_name": "pg1"}
+        with pytest.raises(Error) as excinfo:
+            next(services)
+        assert "Truncated JSON response" in str(excinfo.value)
+
+
+def test_throttled_stream_is_closed():
+    responses = []
+
+    class Response(requests.Response):
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    def throttled_request(url, **kwargs):  # pylint: disable=unused-argument
+        response = Response()
+        response.status_code = 429 if not responses else 200
+        response.headers["retry-after"] = "0"
+        response._content = b"{}"  # pylint: disable=protected-access
+        responses.append(response)
+        return response
+
+    with AivenClient("https://api.example.com") as client:
+        client._execute(throttled_request, "GET", "/project", None, stream=True)  # pylint: disable=protected-access
+    assert [response.closed for response in responses] == [True, False]
+
+
+def test_request_stats_concurrent():
+    # the first request starts at 0 and ends at 2, the second starts at 1 and ends at 3
+    ticks = itertools.count()
+    first_sent, second_sent = threading.Event(), threading.Event()
+
+    def request(url, **kwargs):  # pylint: disable=unused-argument
+        if not first_sent.is_set():
+            first_sent.set()
+            second_sent.wait()
+        else:
+            second_sent.set()
+            threads[0].join()
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"{}"  # pylint: disable=protected-access
+        return response
+
+    with AivenClient("https://api.example.com", clock=lambda: float(next(ticks))) as client:
+        threads = [threading.Thread(target=client._execute,  # pylint: disable=protected-access
+                                    args=(request, "GET", "/project", None)) for _ in range(2)]
+        threads[0].start()
+        first_sent.wait()
+        threads[1].start()
+        for thread in threads:
+            thread.join()
+        stats = client.request_stats()
+    assert stats == {"requests": 2, "request_time": 4.0, "busy_time": 3.0}
+
+
+def test_failover_does_not_resend_writes():
+    sent = []
+
+    def broken_request(url, **kwargs):  # pylint: disable=unused-argument
+        sent.append(url)
+        if kwargs["data"] is not None and url.startswith("https://a."):
+            raise requests.exceptions.ConnectionError(
+                urllib3.exceptions.ProtocolError("Connection aborted."))
+        raise requests.exceptions.ConnectionError(
+            urllib3.exceptions.MaxRetryError(
+                None, url, urllib3.exceptions.NewConnectionError(None, "Connection refused")))
+
+    with AivenClient(["https://a.example.com", "https://b.example.com"]) as client:
+        client.endpoints.latencies, client.endpoints.probed_at = {}, time.time()
+        # the body may have reached the server: not sent again
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client._execute(broken_request, "POST", "/project", {"a": 1})  # pylint: disable=protected-access
+        assert sent == ["https://a.example.com/project"]
+
+        # refused before anything was sent: safe to send to the other endpoint
+        del sent[:]
+        client.endpoints.failed_at.clear()
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client._execute(broken_request, "DELETE", "/project", None)  # pylint: disable=protected-access
+        assert sent == ["https://a.example.com/project", "https://b.example.com/project"]
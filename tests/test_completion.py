@@ -0,0 +1,34 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client import completion
+from aiven.client.cli import AivenCLI
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def test_command_tree():
+    cli = AivenCLI()
+    cli.parse_args(["completion", "script", "bash"])
+    tree = {path: (children, options, option_kinds, positional)
+            for path, children, options, option_kinds, positional in completion.command_tree(cli.parser)}
+    assert "service" in tree[""][0]
+    assert "list" in tree["service"][0]
+    children, options, option_kinds, positional = tree["service get"]
+    assert children == []
+    assert "--project" in options
+    assert option_kinds["--project"] == "projects"
+    assert positional == "services"
+    assert tree["service create"][2]["-c"] == "user_config"
+
+    script = completion.bash_script(cli.parser, cache_dir="/tmp/cache")
+    assert "complete -F _avn avn" in script
+    assert '"service get|--project") echo projects ;;' in script
+
+
+def test_write_values(tmpdir):
+    completion.write_values("services", ["b", "a", "a"], project="proj", cache_dir=str(tmpdir))
+    assert tmpdir.join("services.proj").read() == "a\nb\n"
@@ -0,0 +1,70 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.compression import compress, CompressingReader, TransferStats
+import io
+import pytest
+import zlib
+
+try:
+    import zstandard  # pylint: disable=import-error
+except ImportError:
+    zstandard = None
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+DATA = "".join('{{"service_name": "pg-{}", "state": "RUNNING"}}\n'.format(i) for i in range(5000)).encode("utf-8")
+
+
+def decompress(data, method):
+    if method == "gzip":
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+@pytest.mark.parametrize("method", [
+    "gzip",
+    pytest.param("zstd", marks=pytest.mark.skipif(zstandard is None, reason="zstandard module is not installed")),
+])
+def test_round_trip(method):
+    assert decompress(compress(DATA, method), method) == DATA
+    assert decompress(compress(b"", method), method) == b""
+
+    stats = TransferStats()
+    reader = CompressingReader(io.BytesIO(DATA), method, stats, chunk_size=4096)
+    body = b"".join(reader)
+    assert decompress(body, method) == DATA
+    # a resend after seek(0) produces the same body and is accounted once
+    reader.seek(0)
+    assert b"".join(reader) == body
+    assert stats.as_dict() == {
+        "request_bytes": len(DATA),
+        "request_bytes_sent": len(body),
+        "request_bytes_saved": len(DATA) - len(body),
+        "compressed_requests": 1,
+        "response_bytes": 0,
+        "response_bytes_received": 0,
+        "response_bytes_saved": 0,
+        "compressed_responses": 0,
+    }
+
+
+def test_unsupported_method():
+    with pytest.raises(ValueError):
+        compress(DATA, "br")
+    with pytest.raises(ValueError):
+        CompressingReader(io.BytesIO(DATA), "br", TransferStats())
+
+
+def test_transfer_stats():
+    stats = TransferStats()
+    stats.record_request(100, 100, compressed=False)
+    stats.record_request(1000, 200, compressed=True)
+    stats.record_response(5000, 1000, compressed=True)
+    result = stats.as_dict()
+    assert result["request_bytes_saved"] == 800
+    assert result["compressed_requests"] == 1
+    assert result["response_bytes_saved"] == 4000
+    assert result["compressed_responses"] == 1
@@ -0,0 +1,59 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.configdiff import ConfigMatrix, flatten, service_config
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def service(name, plan="business-4", **user_config):
+    config = {"pg_version": "9.6", "pg": {"max_connections": 100}, "ip_filter": ["10.0.0.0/8"]}
+    config.update(user_config)
+    return name, service_config({"service_name": name, "plan": plan, "cloud_name": "aws-eu-west-1",
+                                 "user_config": config})
+
+
+def test_flatten():
+    assert flatten({"a": {"b": {"c": 1}, "d": []}, "e": {}}) == {"a.b.c": 1, "a.d": [], "e": {}}
+
+
+def test_matrix():
+    matrix = ConfigMatrix()
+    matrix.add(*service("pg1"))
+    matrix.add(*service("pg2", pg={"max_connections": 200}))
+    matrix.add(*service("pg3", plan="startup-4", pg={"max_connections": 100, "work_mem": 8}))
+    matrix.add(*service("pg4", ip_filter=["0.0.0.0/0"]))
+
+    assert matrix.differing() == ["ip_filter", "pg.max_connections", "pg.work_mem", "plan"]
+    assert matrix.matrix(["pg.work_mem", "pg_version"]) == [
+        {"key": "pg.work_mem", "pg1": None, "pg2": None, "pg3": 8, "pg4": None},
+        {"key": "pg_version", "pg1": "9.6", "pg2": "9.6", "pg3": "9.6", "pg4": "9.6"},
+    ]
+
+    assert [(row["key"], row["service"], row["value"], row["majority_value"]) for row in matrix.outliers()] == [
+        ("ip_filter", "pg4", ["0.0.0.0/0"], ["10.0.0.0/8"]),
+        ("pg.max_connections", "pg2", 200, 100),
+        ("pg.work_mem", "pg3", 8, None),
+        ("plan", "pg3", "startup-4", "business-4"),
+    ]
+
+    assert [(row["key"], row["service"], row["value"], row["reference_value"]) for row in matrix.drift("pg2")] == [
+        ("ip_filter", "pg4", ["0.0.0.0/0"], ["10.0.0.0/8"]),
+        ("pg.max_connections", "pg1", 100, 200),
+        ("pg.max_connections", "pg3", 100, 200),
+        ("pg.max_connections", "pg4", 100, 200),
+        ("pg.work_mem", "pg3", 8, None),
+        ("plan", "pg3", "startup-4", "business-4"),
+    ]
+
+
+def test_outliers_without_majority():
+    matrix = ConfigMatrix()
+    matrix.add(*service("pg1", plan="hobbyist"))
+    matrix.add(*service("pg2", plan="startup-4"))
+    rows = [row for row in matrix.outliers() if row["key"] == "plan"]
+    assert [(row["service"], row["majority_value"], row["majority_count"]) for row in rows] == [
+        ("pg1", None, None), ("pg2", None, None)]
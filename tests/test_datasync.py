@@ -0,0 +1,33 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client import datasync
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def test_sync_plan(tmpdir):
+    local_dir = tmpdir.mkdir("data")
+    local_dir.join("a.txt").write("a\n")
+    local_dir.join("b.txt").write("bb\n")
+    manifest = datasync.SyncManifest("proj", str(local_dir), manifest_dir=str(tmpdir.join("manifest")))
+    local = datasync.scan_local(str(local_dir), manifest)
+    remote = datasync.remote_files({"files": [{"filename": "b.txt", "size": 3}, {"filename": "c.txt", "size": 1}]})
+
+    # b.txt has never been synced and has no remote checksum so it must be uploaded
+    assert datasync.plan_upload(local, remote, manifest, delete=True) == (["a.txt", "b.txt"], ["c.txt"])
+
+    manifest.local = local
+    manifest.remote = {"a.txt": {"size": 2, "md5": local["a.txt"]["md5"]},
+                       "b.txt": {"size": 3, "md5": local["b.txt"]["md5"]}}
+    manifest.save()
+    reloaded = datasync.SyncManifest("proj", str(local_dir), manifest_dir=str(tmpdir.join("manifest")))
+    assert reloaded.remote == manifest.remote
+    assert datasync.plan_upload(local, remote, reloaded) == (["a.txt"], [])
+    assert datasync.plan_download(local, remote, reloaded, delete=True) == (["c.txt"], ["a.txt"])
+
+    remote["b.txt"]["md5"] = "0" * 32
+    assert datasync.plan_download(local, remote, reloaded) == (["b.txt", "c.txt"], [])
@@ -0,0 +1,51 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.endpoints import EndpointSelector, FAILURE_COOLDOWN, parse_urls
+from aiven.client.filecache import FileCache
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+LATENCIES = {"https://a.example.com": 0.3, "https://b.example.com": 0.1, "https://c.example.com": None}
+
+
+def probe(url):
+    if LATENCIES[url] is None:
+        raise IOError("unreachable")
+    return LATENCIES[url]
+
+
+def test_parse_urls():
+    urls = parse_urls("https://a.example.com/, https://b.example.com")
+    assert urls == ["https://a.example.com", "https://b.example.com"]
+    with pytest.raises(ValueError):
+        parse_urls(" , ")
+
+
+def test_fastest_and_failover():
+    now = [1000.0]
+    selector = EndpointSelector(sorted(LATENCIES), probe=probe, clock=lambda: now[0])
+    assert selector.current() == "https://b.example.com"
+    selector.failed("https://b.example.com")
+    assert selector.current() == "https://a.example.com"
+    selector.failed("https://a.example.com")
+    assert selector.current() == "https://c.example.com"
+    now[0] += FAILURE_COOLDOWN + 1
+    assert selector.current() == "https://b.example.com"
+
+
+def test_probe_results_are_cached(tmpdir):
+    probed = []
+
+    def counting_probe(url):
+        probed.append(url)
+        return probe(url)
+
+    cache = FileCache(str(tmpdir))
+    for _ in range(2):
+        selector = EndpointSelector(sorted(LATENCIES), probe=counting_probe, cache=cache)
+        assert selector.current() == "https://b.example.com"
+    assert sorted(probed) == sorted(LATENCIES)
@@ -0,0 +1,21 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.filecache import FileCache
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def test_file_cache(tmpdir):
+    now = [1000.0]
+    cache = FileCache(str(tmpdir.join("cache")), clock=lambda: now[0])
+    assert cache.get(["types", "proj"], max_age=60) is None
+    cache.set(["types", "proj"], {"pg": {}})
+    assert cache.get(["types", "proj"], max_age=60) == {"pg": {}}
+    now[0] += 61
+    assert cache.get(["types", "proj"], max_age=60) is None
+    cache.delete(["types", "proj"])
+    assert cache.get(["types", "proj"], max_age=3600) is None
@@ -0,0 +1,81 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client import fileutil
+from aiven.client.argx import Config
+import json
+import os
+import pytest
+import stat
+import threading
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def test_write_atomic(tmpdir):
+    path = str(tmpdir.join("a", "b", "state.json"))
+    fileutil.write_atomic(path, "one")
+    fileutil.write_atomic(path, "two")
+    with open(path) as fp:
+        assert fp.read() == "two"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+    assert os.listdir(os.path.dirname(path)) == ["state.json"]
+    fileutil.makedirs(os.path.dirname(path))  # existing directories are fine
+
+
+def test_write_atomic_bytes(tmpdir):
+    path = str(tmpdir.join("data.bin"))
+    fileutil.write_atomic(path, b"\x00\xff", mode=0o644)
+    with open(path, "rb") as fp:
+        assert fp.read() == b"\x00\xff"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+
+def test_read_json_cache(tmpdir):
+    path = str(tmpdir.join("config.json"))
+    fileutil.write_atomic(path, json.dumps({"a": {"b": 1}}))
+    value = fileutil.read_json(path)
+    value["a"]["b"] = 2  # callers get their own copy
+    assert fileutil.read_json(path) == {"a": {"b": 1}}
+    fileutil.write_atomic(path, json.dumps({"a": {"b": 3}}))
+    assert fileutil.read_json(path) == {"a": {"b": 3}}
+
+
+def test_concurrent_config_saves(tmpdir):
+    path = str(tmpdir.join("avn", "aiven-client.json"))
+    errors = []
+
+    def switch(index):
+        try:
+            for _ in range(20):
+                config = Config(path)
+                config["default_project"] = "project-{}".format(index)
+                config.save()
+        except Exception as ex:  # pylint: disable=broad-except
+            errors.append(ex)
+
+    threads = [threading.Thread(target=switch, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert Config(path)["default_project"].startswith("project-")
+
+
+def test_config_save_merges_concurrent_changes(tmpdir):
+    path = str(tmpdir.join("aiven-client.json"))
+    first, second = Config(path), Config(path)
+    first["default_project"] = "proj1"
+    second["user_email"] = "user@example.com"
+    first.save()
+    second.save()
+    assert Config(path) == {"default_project": "proj1", "user_email": "user@example.com"}
+    assert second == {"default_project": "proj1", "user_email": "user@example.com"}
+
+    del second["user_email"]
+    second.save()
+    assert Config(path) == {"default_project": "proj1"}
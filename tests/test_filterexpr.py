@@ -0,0 +1,43 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.filterexpr import compile_filter, parse_fields, project, FilterError
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+SERVICES = [
+    {"service_name": "db1", "state": "RUNNING", "plan": "business-4", "user_config": {"pg_version": "9.5"}},
+    {"service_name": "db2", "state": "REBUILDING", "plan": "business-8", "user_config": {"pg_version": "9.4"}},
+    {"service_name": "kafka", "state": "POWEROFF", "plan": "startup-2", "user_config": {}, "node_count": 3},
+]
+
+
+def names(expr):
+    predicate = compile_filter(expr)
+    return [s["service_name"] for s in SERVICES if predicate(s)]
+
+
+def test_filter():
+    assert names("state!=RUNNING and plan~business-*") == ["db2"]
+    assert names("state=RUNNING or service_name=kafka") == ["db1", "kafka"]
+    assert names("not (plan~business-*)") == ["kafka"]
+    assert names("user_config.pg_version = '9.5'") == ["db1"]
+    assert names("plan!~business-*") == ["kafka"]
+    assert names("node_count>=3") == ["kafka"]
+    assert names("node_count<3") == []
+
+
+@pytest.mark.parametrize("expr", ["", "state", "state=", "(state=RUNNING", "state=RUNNING and", "a=b c"])
+def test_filter_invalid(expr):
+    with pytest.raises(FilterError):
+        compile_filter(expr)
+
+
+def test_project():
+    fields = parse_fields("service_name, user_config.pg_version")
+    assert fields == ["service_name", "user_config.pg_version"]
+    assert project(SERVICES[0], fields) == {"service_name": "db1", "user_config": {"pg_version": "9.5"}}
+    assert project(SERVICES[2], ["service_name", "user_config.*"]) == {"service_name": "kafka", "user_config": {}}
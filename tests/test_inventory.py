@@ -0,0 +1,58 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.inventory import Inventory
+import os
+import pytest
+import sqlite3
+import stat
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def service(name, plan, update_time, cloud="aws-eu-west-1", state="RUNNING"):
+    return {"service_name": name, "service_type": "pg", "state": state, "plan": plan, "cloud_name": cloud,
+            "user_config": {"pg_version": "9.6"}, "update_time": update_time}
+
+
+def test_incremental_sync(tmpdir):
+    inv = Inventory(str(tmpdir.join("inventory.sqlite")))
+    inv.sync_projects([{"project_name": "proj1"}, {"project_name": "proj2"}])
+    counts = inv.sync_services("proj1", [service("pg1", "startup-4", "t1"), service("pg2", "business-4", "t1")])
+    assert counts == {"added": 2, "updated": 0, "removed": 0, "unchanged": 0}
+    inv.sync_services("proj2", [service("pg1", "business-4", "t1", cloud="google-europe-west1")])
+
+    counts = inv.sync_services("proj1", [service("pg1", "business-4", "t2"), service("pg3", "startup-4", "t1")])
+    assert counts == {"added": 1, "updated": 1, "removed": 1, "unchanged": 0}
+    counts = inv.sync_services("proj1", [service("pg1", "business-4", "t2"), service("pg3", "startup-4", "t1")])
+    assert counts["unchanged"] == 2
+    # changes are detected also when the API did not touch update_time
+    counts = inv.sync_services("proj1", [service("pg1", "business-4", "t2", state="REBUILDING"),
+                                         service("pg3", "startup-4", "t1")])
+    assert counts == {"added": 0, "updated": 1, "removed": 0, "unchanged": 1}
+    _, rows = inv.query("SELECT state FROM services WHERE project = 'proj1' AND service_name = 'pg1'")
+    assert rows == [{"state": "REBUILDING"}]
+
+    columns, rows = inv.query("SELECT project, service_name FROM services WHERE plan = ? ORDER BY project",
+                              ["business-4"])
+    assert columns == ["project", "service_name"]
+    assert rows == [{"project": "proj1", "service_name": "pg1"}, {"project": "proj2", "service_name": "pg1"}]
+
+    inv.sync_projects([{"project_name": "proj1"}])
+    _, rows = inv.query("SELECT COUNT(*) AS n FROM services WHERE project = 'proj2'")
+    assert rows == [{"n": 0}]
+
+    with pytest.raises(sqlite3.Error):
+        inv.query("DELETE FROM services")
+    inv.close()
+
+
+def test_database_is_private(tmpdir):
+    path = str(tmpdir.join("inventory.sqlite"))
+    Inventory(path).close()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    os.chmod(path, 0o644)
+    Inventory(path).close()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
@@ -0,0 +1,36 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.jsonstream import ArrayScanner, StreamError
+import json
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+def test_array_scanner(chunk_size):
+    doc = {
+        "first": {"logs": ["not", "this"], "text": "a,]}\"\\["},
+        "logs": [{"msg": u"quoted \"]\" , } é", "time": "t{}".format(i), "nested": [i, {"a": None}]}
+                 for i in range(50)],
+        "error": None,
+    }
+    raw = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+    scanner = ArrayScanner("logs", capture=["error"])
+    items = []
+    for offset in range(0, len(raw), chunk_size):
+        items.extend(scanner.feed(raw[offset:offset + chunk_size]))
+    scanner.close()
+    assert items == doc["logs"]
+    assert scanner.found
+    assert scanner.captured == {"error": None}
+
+
+def test_array_scanner_truncated():
+    scanner = ArrayScanner("logs")
+    assert scanner.feed(b'{"logs": [1, 2, ') == [1, 2]
+    with pytest.raises(StreamError):
+        scanner.close()
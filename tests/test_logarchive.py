@@ -0,0 +1,54 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.logarchive import entry_time, LogArchive
+import pytest
+import re
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+DAY = 86400.0
+
+
+def log(day, second, msg):
+    return {"time": "1970-01-{:02d}T00:00:{:02d}.500000Z".format(day, second), "msg": msg}
+
+
+def test_entry_time():
+    assert entry_time("1970-01-02T00:00:01Z") == DAY + 1
+    assert entry_time("1970-01-02T00:00:01.250000Z") == DAY + 1.25
+
+
+def test_append_skips_archived_entries(tmpdir):
+    archive = LogArchive(str(tmpdir), "proj")
+    assert archive.last_batch() is None
+    assert archive.append([log(2, 1, "a"), log(2, 2, "b"), log(2, 2, "c")]) == 3
+    # the API returns the latest entries again, including ones with the same time as the last archived one
+    assert archive.append([log(2, 2, "b"), log(2, 2, "c"), log(2, 2, "d"), log(2, 3, "e")]) == 2
+    assert archive.append([log(2, 3, "e")]) == 0
+    assert archive.append([]) == 0
+    assert [batch["count"] for batch in archive.batches()] == [3, 2]
+    assert [entry["msg"] for entry in archive.search()] == ["a", "b", "c", "d", "e"]
+
+
+def test_search(tmpdir):
+    archive = LogArchive(str(tmpdir), "proj")
+    archive.append([log(2, 1, "connection refused"), log(2, 2, "checkpoint complete")])
+    archive.append([log(3, 1, "Connection reset"), log(3, 2, "vacuum \"t\" done")])
+    archive.append([log(4, 1, "connection refused")])
+    assert sorted(path.basename for path in tmpdir.join("proj").listdir("*.gz")) == \
+        ["19700102.gz", "19700103.gz", "19700104.gz"]
+
+    def search(**kwargs):
+        return [(entry["time"][8:10], entry["msg"]) for entry in archive.search(**kwargs)]
+
+    # day N starts at (N - 1) * DAY
+    assert search(since=DAY + 1.6, until=2 * DAY + 1.5) == [("02", "checkpoint complete"), ("03", "Connection reset")]
+    assert search(text="refused", match=lambda msg: "refused" in msg) == [("02", "connection refused"),
+                                                                          ("04", "connection refused")]
+    assert search(text='"t"', match=lambda msg: '"t"' in msg) == [("03", 'vacuum "t" done')]
+    starts_with_connection = re.compile("^connection", re.I).search
+    assert search(match=starts_with_connection, since=2 * DAY) == [("03", "Connection reset"),
+                                                                   ("04", "connection refused")]
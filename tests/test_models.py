@@ -0,0 +1,73 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+# pylint: disable=no-member
+from aiven.client.jsonstream import ArrayScanner
+from aiven.client.models import Service, ServiceType, split_object
+import json
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+SERVICE = {
+    "service_name": "pg1",
+    "service_type": "pg",
+    "state": "RUNNING",
+    "user_config": {"pg": {"max_connections": 100}, "ip_filter": ["10.0.0.0/8"]},
+    "components": [{"component": "pg", "host": "pg1.example.com", "port": 5432}],
+    "custom_field": {"a": [1, 2, "x\"}"]},
+    "acl": None,
+}
+
+
+def test_split_object():
+    members = split_object(' { "a" : 1, "b":{"c": [1, "]}"]}, "d\\"": null } ')
+    assert members == {"a": (1, "1"), "b": ({"c": [1, "]}"]}, '{"c": [1, "]}"]}'), 'd"': (None, "null")}
+    assert split_object("{}") == {}
+    for invalid in ["[]", '{"a" 1}', '{"a": 1', '{"a": 1 "b": 2}', '{"a": {"b": [}']:
+        with pytest.raises(ValueError):
+            split_object(invalid)
+        with pytest.raises(ValueError):
+            split_object(invalid, decode=())
+
+    # nested values of members not decoded are only located
+    members = split_object(' { "a" : 1, "b":{"c": [1, "]}\\""]}, "d": [{}]} ', decode=("d",))
+    assert members == {"a": (1, "1"), "b": (None, '{"c": [1, "]}\\""]}'), "d": ([{}], "[{}]")}
+
+
+def test_service_from_json():
+    service = Service.from_json(json.dumps(SERVICE))
+    assert service.service_name == "pg1"
+    assert service.plan is None
+    assert not hasattr(service, "__dict__")
+    assert not isinstance(service._user_config, dict)  # pylint: disable=protected-access
+
+    # lazy fields are decoded once, on first access
+    user_config = service.user_config
+    assert user_config == SERVICE["user_config"]
+    assert service.user_config is user_config
+    assert service.acl is None
+
+    assert service.get("custom_field") == SERVICE["custom_field"]
+    assert service.get("backups", []) == []
+    assert service.to_dict() == SERVICE
+    assert Service.from_dict(SERVICE).to_dict() == SERVICE
+
+
+def test_scanner_decode():
+    scanner = ArrayScanner("services", decode=Service.from_json)
+    services = scanner.feed(json.dumps({"services": [SERVICE, dict(SERVICE, service_name="pg2")]}))
+    scanner.close()
+    assert [service.service_name for service in services] == ["pg1", "pg2"]
+
+
+def test_service_type_plans():
+    service_type = ServiceType.from_dict({"description": "PostgreSQL", "user_config_schema": {"type": "object"},
+                                          "service_plans": [{"service_plan": "hobbyist", "node_count": 1,
+                                                             "regions": {"aws-eu-west-1": {"price_usd": "0.1"}}}]})
+    plan, = service_type.plans
+    assert plan.service_plan == "hobbyist"
+    assert plan.regions == {"aws-eu-west-1": {"price_usd": "0.1"}}
+    assert service_type.user_config_schema == {"type": "object"}
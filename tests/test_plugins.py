@@ -0,0 +1,93 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.cli import AivenCLI
+from aiven.client.plugins import PluginRegistry
+import pytest
+import sys
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+PLUGIN_SOURCE = '''
+from aiven.client import argx
+
+
+class ClientPlugin(argx.CommandLineTool):
+    def __init__(self):
+        argx.CommandLineTool.__init__(self, "avn")
+
+    def add_args(self, parser):
+        parser.add_argument("--fake-option")
+
+    @argx.arg("name")
+    def service_fake(self):
+        """Fake service command"""
+        return 42
+'''
+
+
+@pytest.fixture
+def plugin_registry(tmpdir, monkeypatch):
+    tmpdir.join("avn_fake_plugin.py").write(PLUGIN_SOURCE)
+    monkeypatch.syspath_prepend(str(tmpdir))
+    monkeypatch.setattr("aiven.client.plugins.entry_points", lambda group: [])
+    yield PluginRegistry(manifest_path=str(tmpdir.join("plugins.json")),
+                         legacy=[("fake", "avn_fake_plugin:ClientPlugin")])
+    sys.modules.pop("avn_fake_plugin", None)
+
+
+def test_manifest_is_cached(plugin_registry):
+    manifest = plugin_registry.manifest()
+    assert manifest["plugins"]["fake"]["commands"] == {"service_fake": "Fake service command"}
+    assert manifest["plugins"]["fake"]["options"] == ["--fake-option"]
+    sys.modules.pop("avn_fake_plugin")
+    assert plugin_registry.manifest() == manifest
+    assert "avn_fake_plugin" not in sys.modules
+
+
+def test_manifest_rebuilt_for_changed_module(plugin_registry, tmpdir):
+    plugin_registry.manifest()
+    # an upgrade adding a command, with no distribution version to tell it apart
+    tmpdir.join("avn_fake_plugin.py").write(PLUGIN_SOURCE + '''
+    @argx.arg()
+    def service_other(self):
+        """Other service command"""
+''')
+    sys.modules.pop("avn_fake_plugin")
+    assert set(plugin_registry.manifest()["plugins"]["fake"]["commands"]) == {"service_fake", "service_other"}
+
+
+def test_lazy_loading(plugin_registry):
+    plugin_registry.manifest()
+    sys.modules.pop("avn_fake_plugin")
+
+    cli = AivenCLI()
+    cli.plugins = plugin_registry
+    cli.parse_args(["service", "list"])
+    assert "avn_fake_plugin" not in sys.modules
+
+    cli = AivenCLI()
+    cli.plugins = plugin_registry
+    cli.parse_args(["service", "fake", "foo"])
+    assert "avn_fake_plugin" in sys.modules
+    assert cli.args.func() == 42
+
+
+def test_manifest_not_written_without_plugins(tmpdir, monkeypatch):
+    monkeypatch.setattr("aiven.client.plugins.entry_points", lambda group: [])
+    registry = PluginRegistry(manifest_path=str(tmpdir.join("plugins.json")), legacy=[])
+    assert registry.manifest()["plugins"] == {}
+    assert not tmpdir.join("plugins.json").exists()
+
+
+def test_failed_load_is_retried(plugin_registry, tmpdir):
+    tmpdir.join("avn_fake_plugin.py").write("raise ImportError('missing dependency')\n")
+    assert "missing dependency" in plugin_registry.manifest()["plugins"]["fake"]["error"]
+    assert not tmpdir.join("plugins.json").exists()
+
+    tmpdir.join("avn_fake_plugin.py").write(PLUGIN_SOURCE)
+    sys.modules.pop("avn_fake_plugin", None)
+    assert "error" not in plugin_registry.manifest()["plugins"]["fake"]
+    assert tmpdir.join("plugins.json").exists()
@@ -0,0 +1,56 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client import pretty
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def test_format_item():
+    assert pretty.format_item("name", "plain") == "plain"
+    assert pretty.format_item("name", 'with "quotes"') == '"with \\"quotes\\""'
+    assert pretty.format_item("name", "å") == '"\\u00e5"'
+    assert pretty.format_item("create_time", "2016-01-01T12:34:56.123456Z") == "2016-01-01T12:34:56Z"
+    assert pretty.format_item(None, [1, True, None, "x"]) == "1, true, null, x"
+    assert pretty.format_item(None, {"b": 1, "a": 0.5}) == '{"a": 0.5, "b": 1}'
+
+
+def test_flatten_and_select():
+    item = {"name": "pg", "user_config": {"pg": {"max_connections": 100}, "ip_filter": ["10.0.0.0/8"]}, "empty": {}}
+    assert pretty.flatten_item(item) == {
+        "name": "pg",
+        "user_config.pg.max_connections": "100",
+        "user_config.ip_filter": "10.0.0.0/8",
+    }
+    assert pretty.select_fields(item, ["name", "user_config.pg.max_connections", "user_config", "missing.x"]) == {
+        "name": "pg",
+        "user_config.pg.max_connections": "100",
+    }
+
+
+def test_print_table(capsys):
+    rows = [
+        {"name": "a", "state": "RUNNING", "config": {"x": 1, "long_name": 2}},
+        {"name": "bbb", "state": "OFF", "config": {"x": 3}},
+    ]
+    pretty.print_table(rows, table_layout=["name", "state"])
+    assert capsys.readouterr()[0].splitlines() == [
+        "NAME  STATE  ",
+        "====  =======",
+        "a     RUNNING",
+        "bbb   OFF    ",
+    ]
+    pretty.print_table(rows, table_layout=[["name"], "config.*"])
+    assert capsys.readouterr()[0].splitlines() == [
+        "NAME",
+        "====",
+        "a   ",
+        "    long_name = 2",
+        "    x         = 1",
+        "",
+        "bbb ",
+        "    x         = 3",
+    ]
@@ -0,0 +1,68 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.parallel import map_concurrently
+from aiven.client.progress import CountingReader, Progress
+import io
+import json
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def test_json_progress():
+    now = [100.0]
+    out = io.StringIO()
+    status = Progress("upload", items=4, total_bytes=4000, mode="json", stream=out, clock=lambda: now[0],
+                      ticker=False)
+    status.advance(1000)
+    status.done()
+    now[0] += 10
+    status.tick()
+    state = json.loads(out.getvalue())
+    assert state["items_done"] == 1 and state["bytes_done"] == 1000
+    assert state["bytes_per_second"] == 100.0
+    assert state["eta_seconds"] == 30.0
+    assert state["final"] is False
+
+    # a stall shows up as a falling rate rather than as silence
+    now[0] += 20
+    status.tick()
+    assert json.loads(out.getvalue().splitlines()[-1])["bytes_per_second"] == 0.0
+    status.close()
+    assert json.loads(out.getvalue().splitlines()[-1])["final"] is True
+
+
+def test_tty_progress():
+    out = io.StringIO()
+    status = Progress("terminate", items=3, mode="tty", stream=out, ticker=False)
+    status.done(failed=True)
+    status.tick()
+    assert out.getvalue().startswith("\rterminate: 1/3 items, 1 failed, elapsed 0:00")
+    status.clear_line()
+    assert out.getvalue().endswith("\r\x1b[K")
+    status.close()
+    assert out.getvalue().endswith("\n")
+
+
+def test_quiet_operations_print_nothing():
+    out = io.StringIO()
+    with Progress("fetch", items=2, mode="json", stream=out, interval=60) as status:
+        map_concurrently(lambda item: 1 / item, [1, 0], progress=status)
+    assert (status.items_done, status.items_failed) == (2, 1)
+    assert out.getvalue() == ""
+
+
+def test_counting_reader(tmpdir):
+    path = tmpdir.join("data")
+    path.write_binary(b"x" * 100)
+    counted = []
+    with open(str(path), "rb") as fp:
+        reader = CountingReader(fp, counted.append)
+        reader.read(60)
+        reader.seek(0, 2)  # looking up the size does not count
+        reader.seek(0)
+        reader.read()
+    assert counted == [60, -60, 100]
@@ -0,0 +1,98 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.provision import load_manifest, ManifestError, parse_services, Provisioner
+import json
+import pytest
+import threading
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+class FakeProject(object):
+    """Services become RUNNING after two polls; creating 'broken' fails, 'old' already exists"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.created = []
+        self.polls = {}
+
+    def create(self, spec):
+        with self.lock:
+            if spec["name"] == "broken":
+                raise ValueError("quota exceeded")
+            if spec["name"] == "old":
+                raise KeyError("exists")
+            self.created.append(spec["name"])
+            self.polls[spec["name"]] = 0
+
+    def list_services(self):
+        services = [{"service_name": "old", "state": "RUNNING"}]
+        for name in self.polls:
+            self.polls[name] += 1
+            services.append({"service_name": name, "state": "RUNNING" if self.polls[name] > 2 else "REBUILDING"})
+        return services
+
+
+def test_manifest_validation(tmpdir):
+    path = tmpdir.join("manifest.json")
+    path.write(json.dumps({"project": "test", "services": [
+        {"name": "kafka1", "service_type": "kafka:business-4"},
+        {"name": "connect1", "service_type": "kafka_connect", "plan": "startup-4", "depends_on": ["kafka1"]},
+    ]}))
+    project, specs = load_manifest(str(path))
+    assert project == "test"
+    assert [(s["name"], s["service_type"], s["plan"]) for s in specs] == [
+        ("kafka1", "kafka", "business-4"), ("connect1", "kafka_connect", "startup-4")]
+
+    with pytest.raises(ManifestError):
+        parse_services([{"name": "a", "service_type": "pg:x", "depends_on": ["missing"]}])
+    with pytest.raises(ManifestError):
+        parse_services([{"name": "a", "service_type": "pg:x", "depends_on": ["b"]},
+                        {"name": "b", "service_type": "pg:x", "depends_on": ["a"]}])
+
+
+def test_dependency_order():
+    specs = parse_services([
+        {"name": "connect1", "service_type": "kafka_connect:x", "depends_on": ["kafka1"]},
+        {"name": "kafka1", "service_type": "kafka:x"},
+        {"name": "pg1", "service_type": "pg:x"},
+        {"name": "broken", "service_type": "pg:x"},
+        {"name": "after-broken", "service_type": "pg:x", "depends_on": ["broken"]},
+        {"name": "old", "service_type": "pg:x"},
+    ])
+    fake = FakeProject()
+    sleeps = []
+    results = Provisioner(specs, create=fake.create, list_services=fake.list_services,
+                          exists=lambda ex: isinstance(ex, KeyError), no_fail_if_exists=True,
+                          sleep=sleeps.append).run()
+    assert sorted(fake.created[:2]) == ["kafka1", "pg1"]
+    assert fake.created[2] == "connect1"
+    assert results["connect1"] == "created"
+    assert results["old"] == "exists"
+    assert results["broken"].startswith("failed: ")
+    assert results["after-broken"] == "skipped: dependency broken failed"
+
+
+def test_waiting():
+    specs = parse_services([
+        {"name": "kafka1", "service_type": "kafka:x"},
+        {"name": "connect1", "service_type": "kafka_connect:x", "depends_on": ["kafka1"]},
+    ])
+
+    def list_services():
+        return [{"service_name": "kafka1", "state": "RUNNING"}, {"service_name": "connect1", "state": "REBUILDING"}]
+
+    # services nothing depends on are not waited for
+    results = Provisioner(specs, create=lambda spec: None, list_services=list_services, sleep=lambda _: None).run()
+    assert results == {"kafka1": "created", "connect1": "created"}
+
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    results = Provisioner(specs, create=lambda spec: None, list_services=list_services, wait=True, timeout=60,
+                          clock=lambda: now[0], sleep=sleep).run()
+    assert results == {"kafka1": "created", "connect1": "failed: timeout in state REBUILDING"}
@@ -0,0 +1,34 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.querystats import normalize_query, QueryStatsAggregate
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def test_normalize_query():
+    assert normalize_query("SELECT *  FROM t\n WHERE id = $1 AND name = 'foo' /* c */") == \
+        "SELECT * FROM t WHERE id = ? AND name = ?"
+    assert normalize_query("select 1 from t2 where x in (1, 2, 3);") == "select ? from t2 where x in (?)"
+
+
+def test_aggregate_top():
+    agg = QueryStatsAggregate()
+    agg.add("a", [{"query": "select $1", "calls": 10, "total_time": 100.0, "shared_blks_read": 5},
+                  {"query": "update t set x = $1", "calls": 1, "total_time": 50.0, "max_time": 50.0}])
+    agg.add("b", [{"query": "select   $1", "calls": 10, "total_time": 20.0, "shared_blks_read": 1}])
+    assert len(agg) == 2
+
+    top = agg.top(1, order_by="total_time")
+    assert top[0]["query"] == "select ?"
+    assert top[0]["services"] == 2
+    assert top[0]["calls"] == 20
+    assert top[0]["blocks_read"] == 6
+    assert top[0]["mean_time"] == 6.0
+
+    assert agg.top(1, order_by="mean_time")[0]["query"] == "update t set x = ?"
+    with pytest.raises(ValueError):
+        agg.top(1, order_by="foo")
@@ -0,0 +1,49 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.ratelimit import parse_retry_after, RateLimiter
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=2.0, clock=clock, sleep=clock.sleep)
+    delays = [limiter.acquire() for _ in range(4)]
+    assert delays[:2] == [0.0, 0.0]
+    assert delays[2] == pytest.approx(0.5)
+    assert limiter.stats()["requests"] == 4
+
+
+def test_throttling_adapts_rate():
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock, sleep=clock.sleep)
+    assert limiter.acquire() == 0.0
+    limiter.throttled(3.0)
+    assert limiter.stats()["current_rate"] == 10.0
+    assert limiter.acquire() == pytest.approx(3.0)
+    limiter.throttled(0.0)
+    assert limiter.rate == 5.0
+    for _ in range(200):
+        limiter.succeeded()
+    assert limiter.rate is None
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after(None, default=2.0) == 2.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
@@ -0,0 +1,52 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.schema import compile_schema, merge
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+USER_CONFIG_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+        "pg_version": {"type": "string", "enum": ["9.5", "9.6"]},
+        "ip_filter": {"type": "array", "maxItems": 2, "items": {"type": "string", "pattern": "^[0-9./]+$"}},
+        "pg": {
+            "type": "object",
+            "properties": {"max_connections": {"type": "integer", "minimum": 25, "maximum": 1000}},
+        },
+    },
+}
+
+
+def test_valid_config():
+    validate = compile_schema(USER_CONFIG_SCHEMA)
+    assert validate({"pg_version": "9.6", "pg": {"max_connections": 100}, "ip_filter": ["10.0.0.0/8"]}) == []
+
+
+def test_error_paths():
+    validate = compile_schema(USER_CONFIG_SCHEMA)
+    errors = validate({
+        "pg_version": "9.4",
+        "pg": {"max_connections": 10},
+        "ip_filter": ["10.0.0.0/8", "foo", "1.2.3.4"],
+        "unknown": True,
+    }, "user_config")
+    assert [path for path, _ in errors] == [
+        "user_config.ip_filter",
+        "user_config.ip_filter[1]",
+        "user_config.pg.max_connections",
+        "user_config.pg_version",
+        "user_config.unknown",
+    ]
+    assert validate({"pg": {"max_connections": "many"}}) == [("pg.max_connections", "expected integer, got 'many'")]
+
+
+def test_merge():
+    base = {"pg": {"max_connections": 100, "work_mem": 4}, "pg_version": "9.5"}
+    assert merge(base, {"pg": {"max_connections": 200}}) == {
+        "pg": {"max_connections": 200, "work_mem": 4}, "pg_version": "9.5"}
+    assert base["pg"]["max_connections"] == 100
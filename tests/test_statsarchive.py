@@ -0,0 +1,64 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.statsarchive import parse_time, QueryStatsArchive, stats_delta
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+DAY = 86400.0
+
+
+def test_parse_time():
+    assert parse_time("now", now=1000.0) == 1000.0
+    assert parse_time("2h", now=10000.0) == 10000.0 - 7200
+    assert parse_time("1970-01-02") == DAY
+    assert parse_time("1970-01-02T01:00:00Z") == DAY + 3600
+    with pytest.raises(ValueError):
+        parse_time("yesterday")
+
+
+def test_stats_delta():
+    previous = [{"queryid": 1, "query": "select 1", "calls": 10, "total_time": 100.0},
+                {"queryid": 2, "query": "select 2", "calls": 5, "total_time": 5.0}]
+    current = [{"queryid": 1, "query": "select 1", "calls": 15, "total_time": 160.0},
+               {"queryid": 2, "query": "select 2", "calls": 5, "total_time": 5.0},
+               {"queryid": 3, "query": "select 3", "calls": 1, "total_time": 1.0}]
+    delta = {entry["queryid"]: entry for entry in stats_delta(previous, current)}
+    assert sorted(delta) == [1, 3]
+    assert delta[1]["calls"] == 5 and delta[1]["total_time"] == 60.0
+    # counters that went down were reset in between
+    assert stats_delta(current, previous)[0]["calls"] == 10
+
+
+def test_archive_periods(tmpdir):
+    now = [0.0]
+    archive = QueryStatsArchive(str(tmpdir), clock=lambda: now[0])
+
+    def snapshot(timestamp, service, calls, reset=False):
+        now[0] = timestamp
+        entry = archive.append("proj", service, [{"queryid": 1, "query": "select $1", "calls": calls,
+                                                  "total_time": float(calls)}])
+        entry["reset"] = reset
+        archive.commit([entry])
+
+    snapshot(DAY, "pg1", 10)
+    snapshot(DAY, "pg2", 7, reset=True)
+    snapshot(2 * DAY, "pg1", 25)
+    snapshot(2 * DAY, "pg2", 3)
+    snapshot(3 * DAY, "pg1", 40)
+    assert sorted(path.basename for path in tmpdir.listdir("*.gz")) == ["19700102.gz", "19700103.gz", "19700104.gz"]
+    assert archive.load(archive.entries()[0])[0]["calls"] == 10
+
+    aggregate, count = archive.period(DAY, DAY)
+    assert count == 2 and aggregate.find("select ?")["calls"] == 17
+
+    # deltas from the last snapshot before the period, pg2 was reset after its first snapshot
+    aggregate, count = archive.period(1.5 * DAY, 3 * DAY)
+    assert count == 3 and aggregate.find("select ?")["calls"] == 15 + 3 + 15
+
+    aggregate, count = archive.period(1.5 * DAY, 3 * DAY, services={("proj", "pg2")})
+    assert count == 1 and aggregate.find("select ?")["calls"] == 3
+    assert archive.period(4 * DAY, 5 * DAY)[1] == 0
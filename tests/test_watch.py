@@ -0,0 +1,81 @@
+# Copyright 2015, Aiven, https://aiven.io/
+#
+# This file is under the Apache License, Version 2.0.
+# See the file `LICENSE` for details.
+
+from aiven.client.watch import CLEAR_SCREEN, HIGHLIGHT, WatchTable
+import io
+import pytest
+
+pytestmark = [pytest.mark.unittest, pytest.mark.all]
+
+
+def services(state):
+    return [
+        {"service_name": "pg-b", "state": state, "plan": "startup-4"},
+        {"service_name": "kafka-a", "state": "RUNNING", "plan": "business-4"},
+    ]
+
+
+def test_incremental_redraw():
+    stream = io.StringIO()
+    table = WatchTable(["service_name", "state", "plan"], key="service_name", highlight=["state"], stream=stream,
+                       ansi=True)
+    table.update(services("REBUILDING"))
+    first = stream.getvalue()
+    assert first.startswith(CLEAR_SCREEN)
+    assert first.index("kafka-a") < first.index("pg-b")
+
+    stream.truncate(0)
+    stream.seek(0)
+    table.update(services("RUNNING"))
+    second = stream.getvalue()
+    assert CLEAR_SCREEN not in second
+    assert HIGHLIGHT + "RUNNING   " in second
+    assert "kafka-a" not in second and "startup-4" not in second
+
+    stream.truncate(0)
+    stream.seek(0)
+    table.update(services("RUNNING"))
+    third = stream.getvalue()
+    assert HIGHLIGHT not in third
+    assert third.count("RUNNING") == 1  # previous highlight removed
+
+    stream.truncate(0)
+    stream.seek(0)
+    table.update(services("VERY_LONG_STATE_NAME"))
+    assert stream.getvalue().startswith(CLEAR_SCREEN)
+
+
+def test_inserted_row_is_not_highlighted():
+    stream = io.StringIO()
+    table = WatchTable(["service_name", "state", "plan"], key="service_name", highlight=["state"], stream=stream,
+                       ansi=True)
+    table.update(services("REBUILDING"))
+    stream.truncate(0)
+    stream.seek(0)
+    # a new first row moves the others down a line, only the changed state of pg-b is highlighted
+    table.update(services("RUNNING") + [{"service_name": "cassandra-a", "state": "RUNNING", "plan": "startup-4"}])
+    second = stream.getvalue()
+    assert CLEAR_SCREEN not in second
+    assert second.count(HIGHLIGHT) == 1
+    assert "cassandra-a" in second and "kafka-a" in second
+
+    stream.truncate(0)
+    stream.seek(0)
+    table.update(services("RUNNING"))
+    third = stream.getvalue()
+    assert HIGHLIGHT not in third
+    assert "cassandra-a" not in third
+
+
+def test_plain_output():
+    stream = io.StringIO()
+    table = WatchTable(["service_name", "state", "plan"], key="service_name", highlight=["state"], stream=stream)
+    table.update(services("REBUILDING"), status="first")
+    table.update(services("RUNNING"), status="second")
+    output = stream.getvalue()
+    assert "\x1b" not in output
+    assert output.count("SERVICE_NAME") == 2
+    assert output.splitlines()[0] == "first"
+    assert output.split("second\n")[1].count("RUNNING") == 2